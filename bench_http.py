@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark the scrape client backends against the CROUS search page
+
+Fetches several region URLs concurrently per cycle with each backend and
+reports bytes transferred (on the wire and decoded) and wall time per cycle.
+
+Usage: python bench_http.py [--cycles 5] [--backends requests httpx]
+"""
+
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from crous_checker.fetch import ResilientFetcher, make_session, wire_bytes, BROWSER_USER_AGENT
+
+REGION_URLS = [
+    # Nice
+    "https://trouverunlogement.lescrous.fr/tools/41/search?bounds=7.1819535_43.7607635_7.323912_43.6454189",
+    # Rennes
+    "https://trouverunlogement.lescrous.fr/tools/41/search?bounds=-1.7525876_48.1549705_-1.6244045_48.0769155",
+    # All of France
+    "https://trouverunlogement.lescrous.fr/tools/41/search",
+]
+
+
+def run_cycle(fetcher: ResilientFetcher, urls: list) -> dict:
+    """Fetch all URLs concurrently and return the cycle's transfer stats"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+        responses = list(pool.map(lambda url: fetcher.get(url), urls))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'wall_time': elapsed,
+        'wire_bytes': sum(wire_bytes(r) for r in responses),
+        'decoded_bytes': sum(len(r.content) for r in responses),
+        'http_version': getattr(responses[0], 'http_version', 'HTTP/1.1'),
+        'encoding': responses[0].headers.get('content-encoding', 'identity'),
+    }
+
+
+def bench_backend(backend: str, cycles: int, urls: list) -> dict:
+    session = make_session(backend)
+    session.headers.update({'User-Agent': BROWSER_USER_AGENT})
+    fetcher = ResilientFetcher(session, max_retries=1)
+
+    results = [run_cycle(fetcher, urls) for _ in range(cycles)]
+    times = [r['wall_time'] for r in results]
+    return {
+        'backend': type(session).__name__,
+        'http_version': results[-1]['http_version'],
+        'encoding': results[-1]['encoding'],
+        'wire_bytes': statistics.mean(r['wire_bytes'] for r in results),
+        'decoded_bytes': statistics.mean(r['decoded_bytes'] for r in results),
+        'wall_mean': statistics.mean(times),
+        'wall_min': min(times),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare scrape client backends")
+    parser.add_argument('--cycles', type=int, default=5, help="cycles per backend")
+    parser.add_argument('--backends', nargs='+', default=['requests', 'httpx'])
+    args = parser.parse_args()
+
+    print("🧪 Benchmarking CROUS scrape client backends...")
+    print(f"🌐 {len(REGION_URLS)} concurrent region fetches per cycle, {args.cycles} cycles")
+    print("=" * 60)
+
+    for backend in args.backends:
+        try:
+            r = bench_backend(backend, args.cycles, REGION_URLS)
+        except Exception as e:
+            print(f"❌ {backend}: {e}")
+            continue
+        print(f"📦 {backend} ({r['backend']}, {r['http_version']}, {r['encoding']})")
+        print(f"   Wire bytes/cycle:    {r['wire_bytes']:,.0f}")
+        print(f"   Decoded bytes/cycle: {r['decoded_bytes']:,.0f}")
+        print(f"   Wall time/cycle:     {r['wall_mean'] * 1000:.0f} ms (best {r['wall_min'] * 1000:.0f} ms)")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
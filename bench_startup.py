@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark: time from process spawn to the end of the first check
+
+Spawns a fresh interpreter that imports the checker package, loads config,
+preloads the parser (or not) and runs one check against a local stub page.
+With --importtime the slowest imports from `python -X importtime` are listed.
+
+Usage: python bench_startup.py [--runs 5] [--no-preload] [--importtime]
+"""
+
+import argparse
+import http.server
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from crous_checker.startup import SAMPLE_PAGE
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CHILD_CODE = r'''
+import json, sys, time
+t0 = time.perf_counter()
+from crous_checker.config import load_config
+from crous_checker.engine import CrousChecker
+from crous_checker.fetch import ResilientFetcher
+from crous_checker.notify import ConsoleNotifier
+from crous_checker.sources import CrousSource
+from crous_checker.startup import Preloader
+t_import = time.perf_counter()
+
+preloader = Preloader().start() if PRELOAD else None
+config = load_config()
+if preloader:
+    preloader.wait()
+t_ready = time.perf_counter()
+
+source = CrousSource(ResilientFetcher(), url=URL)
+checker = CrousChecker(source, ConsoleNotifier(quiet=True))
+result = checker.check_and_notify()
+t_check = time.perf_counter()
+
+print(json.dumps({
+    "import_ms": (t_import - t0) * 1000,
+    "ready_ms": (t_ready - t0) * 1000,
+    "check_ms": (t_check - t_ready) * 1000,
+    "rooms": result["total_count"],
+}))
+'''
+
+
+def serve_sample_page() -> str:
+    """Serve SAMPLE_PAGE on a local port and return its URL"""
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.end_headers()
+            self.wfile.write(SAMPLE_PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+def run_once(url: str, preload: bool, importtime: bool = False) -> dict:
+    code = f"URL = {url!r}\nPRELOAD = {preload!r}\n" + CHILD_CODE
+    args = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN='token', TELEGRAM_CHAT_IDS='0')
+
+    start = time.perf_counter()
+    proc = subprocess.run(args, cwd=HERE, env=env, capture_output=True, text=True, check=True)
+    total_ms = (time.perf_counter() - start) * 1000
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result['total_ms'] = total_ms
+    result['importtime'] = proc.stderr if importtime else ''
+    return result
+
+
+def slowest_imports(importtime_output: str, top: int = 10) -> list:
+    """Parse `-X importtime` output into (cumulative_us, module) pairs, slowest first"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us), module.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time-to-first-check")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--no-preload', action='store_true', help="skip the background preloader")
+    parser.add_argument('--importtime', action='store_true', help="list the slowest imports")
+    args = parser.parse_args()
+
+    url = serve_sample_page()
+    preload = not args.no_preload
+
+    print(f"🧪 Startup benchmark ({args.runs} runs, preload {'ON' if preload else 'OFF'})")
+    print("=" * 60)
+
+    results = [run_once(url, preload) for _ in range(args.runs)]
+    for key, label in [('import_ms', 'Import checker'), ('ready_ms', 'Ready (config + preload)'),
+                       ('check_ms', 'First check'), ('total_ms', 'Spawn to first check')]:
+        values = [r[key] for r in results]
+        print(f"⏱️  {label:<26} median {statistics.median(values):7.1f} ms   min {min(values):7.1f} ms")
+
+    if args.importtime:
+        print("\n🐢 Slowest imports (cumulative):")
+        for cumulative_us, module in slowest_imports(run_once(url, preload, importtime=True)['importtime']):
+            print(f"   {cumulative_us / 1000:7.1f} ms  {module}")
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+CROUS room availability checker
+
+Scrapes the CROUS housing search and notifies Telegram chats when new rooms
+appear. Run it with `python -m crous_checker run`, or embed the engine:
+
+    from crous_checker import CrousChecker, CrousSource, ResilientFetcher, TelegramBot
+"""
+
+import importlib
+
+# Public name -> module; imported on first access so `python -m crous_checker`
+# only loads what the command needs (requests alone takes ~100 ms)
+_EXPORTS = {
+    'load_config': 'config', 'ConfigError': 'config', 'ConfigWatcher': 'config',
+    'SeenStore': 'dedup',
+    'DriftDetector': 'drift',
+    'CrousChecker': 'engine',
+    'ResilientFetcher': 'fetch', 'CircuitOpenError': 'fetch',
+    'Room': 'models', 'RoomType': 'models',
+    'TelegramBot': 'notify', 'ConsoleNotifier': 'notify', 'format_room_message': 'notify',
+    'IntervalScheduler': 'scheduling',
+    'CrousSource': 'sources', 'SimulatedSource': 'sources', 'ReplaySource': 'sources',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{_EXPORTS[name]}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,273 @@
+"""
+Notification channels besides Telegram: email, Discord, Slack and ntfy
+
+A recipient is an address wherever a chat ID is accepted (regions,
+operator_chat_ids): a bare ID is a Telegram chat, other channels are named
+by a prefix:
+
+    mailto:me@example.org                           SMTP
+    discord:https://discord.com/api/webhooks/...    Discord webhook
+    slack:https://hooks.slack.com/services/...      Slack webhook
+    ntfy:crous-rennes                               ntfy topic
+
+Each channel offers the bot interface the DeliveryQueue drives
+(`send_to(address, message)`), plus its own pace: `rate_per_second`
+overall and `per_recipient_seconds` per address. The HTTP channels share
+the pooled ResilientFetcher (keep-alive connections, retries, breakers);
+SmtpChannel keeps one SMTP connection open and retries transient failures
+itself. Messages are written for Telegram's HTML and converted here.
+smtplib and the email package are imported when first used: every start
+reaches this module (through the config), few configure email.
+"""
+
+import abc
+import html
+import logging
+import re
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import requests
+
+from .fetch import ResilientFetcher
+
+logger = logging.getLogger(__name__)
+
+# Address prefix -> settings.channels key
+SCHEMES = {'mailto': 'email', 'discord': 'discord', 'slack': 'slack', 'ntfy': 'ntfy'}
+
+_LINK = re.compile(r"""<a\s+href=['"]([^'"]*)['"]\s*>(.*?)</a>""", re.S)
+_BOLD = re.compile(r'<b>(.*?)</b>', re.S)
+_CODE = re.compile(r'<code>(.*?)</code>', re.S)
+_TAG = re.compile(r'<[^>]+>')
+
+
+def split_address(address: str) -> Tuple[str, str]:
+    """('telegram', chat_id) or (channel, target) for a prefixed address"""
+    scheme, _, target = str(address).partition(':')
+    if target and scheme in SCHEMES:
+        return SCHEMES[scheme], target
+    return 'telegram', str(address)
+
+
+def convert_html(message: str, style: str = 'text') -> str:
+    """Telegram HTML to plain text ('text'), Markdown ('markdown') or Slack mrkdwn ('slack')"""
+    if style == 'markdown':
+        message = _LINK.sub(r'[\2](\1)', message)
+        message = _BOLD.sub(r'**\1**', message)
+        message = _CODE.sub(r'`\1`', message)
+    elif style == 'slack':
+        message = _LINK.sub(r'<\1|\2>', message)
+        message = _BOLD.sub(r'*\1*', message)
+        message = _CODE.sub(r'`\1`', message)
+    else:
+        message = _LINK.sub(r'\2: \1', message)
+    return html.unescape(_TAG.sub('', message) if style == 'text' else message)
+
+
+def title_of(message: str) -> str:
+    """First non-empty line as plain text (email subject, push title)"""
+    for line in convert_html(message).splitlines():
+        if line.strip():
+            return line.strip()
+    return 'CROUS Checker'
+
+
+class Channel(abc.ABC):
+    """Base of the non-Telegram channels"""
+
+    name = 'channel'
+    rate_per_second = 1.0
+    per_recipient_seconds = 1.0
+    # Messages waiting for the same address that may be sent as one (see DeliveryQueue)
+    max_batch = 1
+
+    def __init__(self, config: Dict[str, Any]):
+        self.recipients = [f"{self.prefix}:{target}" for target in config.get('recipients', [])]
+        self.rate_per_second = float(config.get('rate_per_second', self.rate_per_second))
+        self.per_recipient_seconds = float(config.get('per_recipient_seconds', self.per_recipient_seconds))
+        self.max_batch = int(config.get('max_batch', self.max_batch))
+
+    @property
+    def prefix(self) -> str:
+        return next(scheme for scheme, name in SCHEMES.items() if name == self.name)
+
+    def send_to(self, address: str, message: str) -> bool:
+        return self.send_batch(address, [message])
+
+    @abc.abstractmethod
+    def send_batch(self, address: str, messages: List[str]) -> bool:
+        """Send the messages to the address (as one, where the channel can); False if it failed"""
+
+    def close(self) -> None:
+        pass
+
+
+class SmtpChannel(Channel):
+    """
+    Email over one kept-open SMTP connection. A burst of alerts for the
+    same address goes out as one email (up to max_batch messages), since
+    per_recipient_seconds spaces emails a minute apart by default.
+    """
+
+    name = 'email'
+    rate_per_second = 2.0
+    per_recipient_seconds = 60.0
+    max_batch = 10
+    attempts = 3
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        self.host = config.get('host', 'localhost')
+        self.port = int(config.get('port', 465 if config.get('ssl') else 587 if config.get('starttls') else 25))
+        self.sender = config.get('sender', 'crous-checker@localhost')
+        self.username = config.get('username')
+        self.password = config.get('password')
+        self.starttls = bool(config.get('starttls', False))
+        self.ssl = bool(config.get('ssl', False))
+        self.timeout = float(config.get('timeout_seconds', 15))
+        # smtplib.SMTP, once connected
+        self._smtp: Optional[Any] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> Any:
+        import smtplib
+        if self.ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or '')
+        return smtp
+
+    def build(self, address: str, messages: List[str]) -> Any:
+        """The EmailMessage for a batch"""
+        from email.message import EmailMessage
+        email = EmailMessage()
+        email['From'] = self.sender
+        email['To'] = split_address(address)[1]
+        email['Subject'] = title_of(messages[0]) + (f" (+{len(messages) - 1} more)" if len(messages) > 1 else '')
+        email.set_content('\n\n---\n\n'.join(convert_html(message) for message in messages))
+        email.add_alternative('<hr>'.join(f"<p>{message.replace(chr(10), '<br>')}</p>" for message in messages),
+                              subtype='html')
+        return email
+
+    def send_batch(self, address: str, messages: List[str]) -> bool:
+        import smtplib
+        email = self.build(address, messages)
+        with self._lock:
+            for attempt in range(self.attempts):
+                try:
+                    if self._smtp is None:
+                        self._smtp = self._connect()
+                    self._smtp.send_message(email)
+                    logger.info("Email sent to %s (%s message(s))", email['To'], len(messages),
+                                extra={'stage': 'deliver'})
+                    return True
+                except smtplib.SMTPResponseException as e:
+                    self._drop_connection()
+                    if e.smtp_code < 400 or e.smtp_code >= 500:
+                        logger.error("Email to %s refused: %s %s", email['To'], e.smtp_code, e.smtp_error)
+                        return False
+                    error: Exception = e
+                except (smtplib.SMTPException, OSError) as e:
+                    # Server closed the idle connection, or is unreachable: reconnect and retry
+                    self._drop_connection()
+                    error = e
+                if attempt + 1 < self.attempts:
+                    time.sleep(2 ** attempt)
+            logger.error("Failed to send email to %s: %s", email['To'], error)
+            return False
+
+    def _drop_connection(self) -> None:
+        import smtplib
+        if self._smtp is not None:
+            try:
+                self._smtp.close()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def close(self) -> None:
+        import smtplib
+        with self._lock:
+            if self._smtp is not None:
+                try:
+                    self._smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._smtp = None
+
+
+class WebhookChannel(Channel):
+    """Discord or Slack incoming webhook (the address carries the webhook URL)"""
+
+    # Discord allows 30 messages a minute per webhook, Slack about one a second
+    LIMITS = {'discord': (2000, 'markdown', 'content', 2.0), 'slack': (40000, 'slack', 'text', 1.0)}
+
+    def __init__(self, name: str, config: Dict[str, Any], fetcher: ResilientFetcher):
+        self.name = name
+        self.max_length, self.style, self.field, self.per_recipient_seconds = self.LIMITS[name]
+        super().__init__(config)
+        self.fetcher = fetcher
+
+    def send_batch(self, address: str, messages: List[str]) -> bool:
+        url = split_address(address)[1]
+        text = '\n\n'.join(convert_html(message, self.style) for message in messages)[:self.max_length]
+        try:
+            response = self.fetcher.post(url, json={self.field: text}, budget=30)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Failed to post to the %s webhook: %s", self.name, e)
+            return False
+        logger.info("%s webhook message sent", self.name.capitalize(), extra={'stage': 'deliver'})
+        return True
+
+
+class NtfyChannel(Channel):
+    """Push notifications through an ntfy server (ntfy.sh or self-hosted)"""
+
+    name = 'ntfy'
+
+    def __init__(self, config: Dict[str, Any], fetcher: ResilientFetcher):
+        super().__init__(config)
+        self.server = config.get('server', 'https://ntfy.sh').rstrip('/')
+        self.token = config.get('token')
+        self.fetcher = fetcher
+
+    def send_batch(self, address: str, messages: List[str]) -> bool:
+        from email.header import Header
+        topic = split_address(address)[1]
+        text = convert_html('\n\n'.join(messages))
+        link = _LINK.search(messages[-1])
+        # RFC 2047, as ntfy expects for non-ASCII titles
+        headers = {'Title': Header(title_of(messages[0]), 'utf-8').encode(), 'Tags': 'house'}
+        if link:
+            headers['Click'] = link.group(1)
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        try:
+            response = self.fetcher.post(f"{self.server}/{topic}", data=text.encode('utf-8'),
+                                         headers=headers, budget=30)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Failed to push to ntfy topic %s: %s", topic, e)
+            return False
+        logger.info("ntfy notification sent to %s", topic, extra={'stage': 'deliver'})
+        return True
+
+
+def build_channels(settings: Dict[str, Any], fetcher: ResilientFetcher) -> Dict[str, Channel]:
+    """The channels configured in settings.channels, by name"""
+    channels: Dict[str, Channel] = {}
+    for name, config in settings['channels'].items():
+        if name == 'email':
+            channels[name] = SmtpChannel(config)
+        elif name in WebhookChannel.LIMITS:
+            channels[name] = WebhookChannel(name, config, fetcher)
+        elif name == 'ntfy':
+            channels[name] = NtfyChannel(config, fetcher)
+    return channels
@@ -0,0 +1,794 @@
+"""
+Command line interface
+
+    python -m crous_checker run [--profile local|cloud]   # check forever
+    python -m crous_checker once [--dry-run]              # single check
+    python -m crous_checker bench [--page FILE]           # per-stage timings
+    python -m crous_checker replay FILE|DIR [...]         # saved pages / recordings through the pipeline
+    python -m crous_checker profile [FILE ...]            # flame graph input for offline cycles
+    python -m crous_checker loadtest --json out.json      # cycle p50/p99, CPU, RSS as regions x subscribers grow
+    python -m crous_checker history DIR --max-rent 450    # recorded rooms by rent, surface and type
+    python -m crous_checker fake-update /status           # bot command to a local webhook
+"""
+
+import argparse
+import json
+import logging
+import os
+import signal
+import statistics
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Callable
+
+# Only what every command needs: the rest (requests, the channels, the web
+# service) is imported by the commands that use it, after the preloader started
+from .config import load_config, normalize, ConfigError, ConfigWatcher
+from .logging_setup import setup_logging, configure_from_settings
+from .startup import Preloader, warm_up, elapsed_ms
+
+if TYPE_CHECKING:
+    from .drift import DriftDetector
+    from .fetch import ResilientFetcher
+    from .recording import Recorder
+
+logger = logging.getLogger(__name__)
+
+# Where each deployment profile logs by default (settings.log_file overrides it)
+PROFILE_LOG_FILES = {
+    'local': 'crous_checker.log',
+    'cloud': None,  # Render collects stdout
+}
+
+LOGGING_KEYS = ('log_level', 'json_logs', 'log_max_bytes', 'log_backup_count', 'log_sample_every', 'log_file')
+
+WEBHOOK_KEYS = ('webhook_url', 'webhook_secret', 'keepalive_url')
+
+
+def create_sample_config() -> None:
+    """Create a sample configuration file"""
+    sample_config = {
+        "telegram": {
+            "bot_token": "YOUR_BOT_TOKEN_HERE",
+            "chat_ids": ["YOUR_CHAT_ID_HERE"]
+        },
+        "settings": {
+            "check_interval_minutes": 5,
+            "use_simulation": True,
+            "log_level": "INFO"
+        }
+    }
+
+    with open('config_sample.json', 'w') as f:
+        json.dump(sample_config, f, indent=4)
+
+    print("Sample configuration created as 'config_sample.json'")
+    print("Please copy it to 'config.json' and fill in your credentials.")
+
+
+def build_source(settings: Dict[str, Any], fetcher: 'ResilientFetcher', drift: Optional['DriftDetector'] = None,
+                 recorder: Optional['Recorder'] = None):
+    """The simulation or the real CROUS scraper, depending on settings.use_simulation"""
+    from .sources import CrousSource, SimulatedSource
+
+    if settings['use_simulation']:
+        return SimulatedSource()
+    return CrousSource.from_settings(fetcher, settings, drift=drift, recorder=recorder)
+
+
+def _int_list(value: str) -> List[int]:
+    """argparse type for comma-separated integers, e.g. 1,10,50"""
+    try:
+        return [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected comma-separated integers, got {value!r}") from None
+
+
+def _log_file(settings: Dict[str, Any], profile: str) -> Optional[str]:
+    return settings['log_file'] or PROFILE_LOG_FILES[profile]
+
+
+def _close_source(source) -> None:
+    """Stop a source's worker threads and processes, if it has any"""
+    if hasattr(source, 'close'):
+        source.close()
+
+
+def _settings_for_offline_use(args) -> Dict[str, Any]:
+    """Settings from the configuration (no credentials needed), defaults if it is unusable"""
+    try:
+        return load_config(args.config, require_credentials=False)['settings']
+    except (ConfigError, json.JSONDecodeError) as e:
+        logger.warning("Ignoring invalid configuration %s: %s", args.config, e)
+        return normalize({})['settings']
+
+
+def cmd_run(args) -> int:
+    """Check forever at the configured interval"""
+    profile = args.profile
+    # Import and warm the HTML parser in the background while configuration loads
+    preloader = Preloader().start()
+    from .clustering import ClusterIndex
+    from .dedup import SeenStore
+    from .delivery import ChannelDeliveries, DigestCoalescer
+    from .drift import DriftDetector
+    from .engine import CrousChecker
+    from .fetch import ResilientFetcher
+    from .geo import RegionRouter
+    from .lifecycle import Lifecycle
+    from .memory import MemoryWatch
+    from .normalization import RoomFilter
+    from .notify import TelegramBot
+    from .priority import PriorityLane
+    from .recording import Recorder
+    from .scheduling import IntervalScheduler
+    from .snapshot import Snapshot, StateSaver
+    from .tracing import TRACER
+    from .web import StatusServer, KeepAlive, ManualTrigger, add_checker_routes
+    from .webhook import BotCommands, TelegramWebhook, webhook_secret
+
+    logger.info("🏠 CROUS Room Availability Checker Starting...")
+    logger.info("=" * 50)
+
+    # Load configuration (config.json, overridden by environment variables)
+    try:
+        config = load_config(args.config, profile=profile)
+    except FileNotFoundError as e:
+        logger.error("❌ No configuration found: %s", e)
+        if profile == 'local':
+            create_sample_config()
+        return 1
+    except (ConfigError, json.JSONDecodeError) as e:
+        logger.error("❌ Please configure your Telegram credentials in %s (%s)", args.config, e)
+        return 1
+
+    telegram_config = config['telegram']
+    settings = config['settings']
+    log_file = _log_file(settings, profile)
+    configure_from_settings(settings, log_file=log_file)
+    TRACER.apply_settings(settings)
+
+    # Initialize components (one pooled fetcher shared by scraper and Telegram client)
+    fetcher = ResilientFetcher.from_settings(settings)
+    telegram_bot = TelegramBot(telegram_config['bot_token'], telegram_config['chat_ids'], fetcher)
+    # Every message (alerts, startup/shutdown notices) goes through a rate-limited queue per channel
+    deliveries = ChannelDeliveries.from_settings(telegram_bot, settings, fetcher).start()
+    # Bursts of new rooms: first alert at once, follow-ups merged into one digest per chat
+    digests = DigestCoalescer(deliveries, settings['coalesce_window_seconds']).start()
+    # Layout-drift alerts go to the operators (all recipients unless configured)
+    drift = DriftDetector(settings['drift_state_file'],
+                          alert=lambda text: deliveries.submit(
+                              text, chat_ids=watcher.current['settings']['operator_chat_ids'] or None))
+    if args.record:
+        settings['record_dir'] = args.record
+    recorder = Recorder.from_settings(settings)
+
+    check_interval = settings['check_interval_minutes']
+    scheduler = IntervalScheduler(check_interval * 60)
+
+    # Warm restart: notified rooms, clusters, check schedule and drift counters from the last snapshot
+    snapshot = Snapshot.load(settings['snapshot_file']) if settings['snapshot_file'] else None
+    if snapshot:
+        seen = snapshot.restore(scheduler=scheduler, drift=drift, max_seen=settings['max_seen_rooms'])
+        logger.info("♻️ Restored %s notified room(s) from %s", len(seen), snapshot.path)
+    else:
+        seen = SeenStore(max_size=settings['max_seen_rooms'])
+    clusters = ClusterIndex.from_settings(settings, snapshot.clusters if snapshot else None)
+    saver = StateSaver(settings['snapshot_file'], seen, scheduler, drift,
+                       settings['snapshot_interval_seconds'], clusters, snapshot) if settings['snapshot_file'] else None
+
+    # One wide search; each room goes to the chats whose regions contain it
+    router = RegionRouter.from_settings(settings, fetcher, lambda: deliveries.chat_ids)
+    if settings['regions']:
+        logger.info("🗺️ Routing rooms to %s region(s)", len(router.index))
+    # Urgent filters: matching rooms skip the queue and the digest, on a connection kept warm
+    priority = PriorityLane.from_settings(settings, deliveries, telegram_bot, lambda: deliveries.chat_ids).start()
+    priority.warm_up()
+    checker = CrousChecker(build_source(settings, fetcher, drift, recorder), digests, seen=seen,
+                           area_name=settings['area_name'], router=router,
+                           room_filter=RoomFilter.from_config(settings['room_filter']), clusters=clusters,
+                           priority=priority)
+
+    # SIGTERM (Render deploys) and Ctrl+C stop the loop; the check in progress finishes
+    lifecycle = Lifecycle(grace_seconds=settings['shutdown_grace_seconds'])
+    lifecycle.on_stop(scheduler.stop)
+    lifecycle.on_stop(fetcher.stop_retrying)
+    lifecycle.on_force(deliveries.abort_drain)
+
+    # Apply config.json edits to the running checker without a restart (between checks)
+    watcher = ConfigWatcher(config, path=args.config, poll_seconds=settings['config_poll_seconds'],
+                            profile=profile)
+    webhook = None
+    memory_watch = MemoryWatch.from_settings(settings)
+    if settings['low_memory']:
+        logger.info("🧠 Low-memory mode: streaming parse, %s fetch worker(s), at most %s seen room(s), "
+                    "%s MB budget", settings['fetch_workers'], settings['max_seen_rooms'],
+                    settings['memory_budget_mb'])
+
+    def apply_config(new_config: Dict[str, Any], old_config: Dict[str, Any]) -> None:
+        nonlocal log_file
+        new_settings = new_config['settings']
+        old_settings = old_config['settings']
+        telegram_bot.set_credentials(new_config['telegram']['bot_token'], new_config['telegram']['chat_ids'])
+        if new_settings['use_simulation'] != old_settings['use_simulation']:
+            logger.info("🎮 Simulation mode %s", 'ON' if new_settings['use_simulation'] else 'OFF')
+            old_source, checker.source = checker.source, build_source(new_settings, fetcher, drift, recorder)
+            _close_source(old_source)
+        checker.apply_settings(new_settings)
+        fetcher.apply_settings(new_settings)
+        TRACER.apply_settings(new_settings)
+        deliveries.apply_settings(new_settings)
+        memory_watch.apply_settings(new_settings)
+        digests.window_seconds = new_settings['coalesce_window_seconds']
+        lifecycle.grace_seconds = new_settings['shutdown_grace_seconds']
+        if new_settings['check_interval_minutes'] != old_settings['check_interval_minutes']:
+            logger.info("⏰ Check interval changed to %s minutes", new_settings['check_interval_minutes'])
+            scheduler.set_interval(new_settings['check_interval_minutes'] * 60)
+        if any(new_settings[k] != old_settings[k] for k in LOGGING_KEYS):
+            log_file = _log_file(new_settings, profile)
+            configure_from_settings(new_settings, log_file=log_file)
+        public_url = new_settings['webhook_url'] or new_settings['keepalive_url']
+        if webhook and public_url and (new_config['telegram']['bot_token'] != old_config['telegram']['bot_token']
+                                       or any(new_settings[k] != old_settings[k] for k in WEBHOOK_KEYS)):
+            # Telegram must learn the new secret (or, with a new token, about the webhook at all)
+            webhook.register(telegram_bot, public_url)
+
+    watcher.subscribe(apply_config)
+    watcher.start()
+
+    # Render web services must bind $PORT; the service also answers health checks and manual triggers
+    server = keepalive = None
+    if args.port is not None:
+        settings['http_port'] = args.port
+    if settings['http_port']:
+        server = StatusServer(settings['http_port'], settings['http_host'])
+        trigger = ManualTrigger(scheduler)
+        add_checker_routes(server, checker, scheduler, deliveries, lifecycle,
+                           settings=lambda: watcher.current['settings'], trigger=trigger)
+        if settings['telegram_webhook']:
+            # Bot commands arrive as POSTs from Telegram: no polling connection between them
+            commands = BotCommands(checker, scheduler, deliveries, lambda: telegram_bot.chat_ids, trigger)
+            webhook = TelegramWebhook(server, commands, secret=lambda: webhook_secret(
+                watcher.current['settings'], telegram_bot.bot_token))
+        try:
+            server.start()
+        except OSError as e:
+            logger.error("❌ Cannot listen on port %s: %s", settings['http_port'], e)
+            server = webhook = None
+        if server and settings['keepalive_url']:
+            keepalive = KeepAlive(fetcher, settings['keepalive_url'].rstrip('/') + '/healthz',
+                                  settings['keepalive_minutes'] * 60).start()
+    if webhook:
+        public_url = settings['webhook_url'] or settings['keepalive_url']
+        if public_url:
+            webhook.register(telegram_bot, public_url)
+        else:
+            logger.warning("⚠️ Telegram webhook enabled but no public URL: set webhook_url")
+    elif settings['telegram_webhook']:
+        logger.warning("⚠️ Telegram webhook needs the HTTP service: set http_port (or $PORT)")
+
+    use_simulation = settings['use_simulation']
+    logger.info("✅ Bot initialized successfully!")
+    logger.info("👥 Recipients: %s user(s)", len(deliveries.chat_ids))
+    logger.info("⏰ Check interval: %s minutes", check_interval)
+    logger.info("🎮 Simulation mode: %s", 'ON' if use_simulation else 'OFF')
+    logger.info("=" * 50)
+
+    # Send startup notification
+    started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if profile == 'cloud':
+        startup_message = f"""
+🤖 <b>CROUS Checker Started on Render!</b>
+
+👥 Notifying: {len(deliveries.chat_ids)} user(s)
+⏰ Check interval: {check_interval} minutes
+🎯 Monitoring: {settings['area_name']} area only
+📅 Started at: {started_at}
+☁️ Running on: Render Cloud
+
+I'll notify you when rooms become available! 🏠
+        """
+    else:
+        startup_message = f"""
+🤖 <b>CROUS Checker Started!</b>
+
+⏰ Check interval: {check_interval} minutes
+🎮 Mode: {'Simulation' if use_simulation else 'Real checking'}
+📅 Started at: {started_at}
+
+I'll notify you when rooms become available! 🏠
+        """
+    deliveries.submit(startup_message.strip())
+
+    # Make sure the first (time-critical) check does not pay for parser setup
+    preloader.wait()
+    if drift.selector:
+        warm_up(drift.selector)
+    if hasattr(checker.source, 'warm_up'):
+        checker.source.warm_up()
+    logger.info("🚀 Ready for first check %.0f ms after start", elapsed_ms())
+
+    lifecycle.install()
+    if hasattr(signal, 'SIGUSR1'):
+        # kill -USR1 <pid> logs the recent cycle timings (from a thread: logging takes locks)
+        signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(
+            target=TRACER.log_dump, name='trace-dump', daemon=True).start())
+    exit_code = 0
+    try:
+        while scheduler.wait_next():
+            watcher.apply_pending()
+            checker.check_and_notify()
+            if saver:
+                saver.maybe_save()
+            memory_watch.check()
+
+            if not lifecycle.stop_requested.is_set():
+                # Wait for the specified interval
+                logger.info("Waiting %s minutes before next check...", scheduler.interval_seconds / 60)
+
+        logger.info("🛑 Stopping CROUS checker...")
+        shutdown_message = f"""
+🛑 <b>CROUS Checker Stopped</b>
+
+Stopped at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+Service has been terminated. 👋
+        """
+        deliveries.submit(shutdown_message.strip())
+
+    except KeyboardInterrupt:
+        logger.warning("🛑 Stopping immediately (second signal)")
+        exit_code = 130
+
+    except Exception as e:
+        logger.error("Unexpected error: %s", e)
+        error_message = f"❌ <b>CROUS Checker Error</b>\n\nError: {str(e)}\nTime: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        deliveries.submit(error_message)
+        exit_code = 1
+
+    finally:
+        lifecycle.finishing()
+        if keepalive:
+            keepalive.stop()
+        if server:
+            server.stop()
+        scheduler.stop()
+        fetcher.stop_retrying()
+        watcher.stop()
+        _close_source(checker.source)
+        priority.close(timeout=lifecycle.remaining())
+        digests.close()
+        # In-flight and queued messages get what is left of the grace period;
+        # the rest is saved and sent after the next start
+        left = deliveries.close(timeout=lifecycle.remaining() if exit_code != 130 else 0)
+        if saver:
+            saver.save()
+        if recorder:
+            recorder.close()
+        logger.info("👋 Shutdown complete (%s message(s) deferred to next start)", left)
+    return exit_code
+
+
+def cmd_once(args) -> int:
+    """Run a single check; with --dry-run the message is printed instead of sent"""
+    from .clustering import ClusterIndex
+    from .delivery import ChannelDeliveries
+    from .drift import DriftDetector
+    from .engine import CrousChecker
+    from .fetch import ResilientFetcher
+    from .geo import RegionRouter
+    from .normalization import RoomFilter
+    from .notify import TelegramBot, ConsoleNotifier
+    from .priority import PriorityLane
+    from .recording import Recorder
+
+    if args.dry_run:
+        settings = _settings_for_offline_use(args)
+        notifier = ConsoleNotifier()
+    else:
+        try:
+            config = load_config(args.config)
+        except (ConfigError, FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("❌ No valid configuration found: %s", e)
+            return 1
+        settings = config['settings']
+        notifier = None
+    configure_from_settings(settings)
+    if args.url:
+        settings['crous_url'] = args.url
+    if args.simulate:
+        settings['use_simulation'] = True
+    if args.record:
+        settings['record_dir'] = args.record
+
+    fetcher = ResilientFetcher.from_settings(settings)
+    bot = None
+    if notifier is None:
+        bot = TelegramBot(config['telegram']['bot_token'], config['telegram']['chat_ids'], fetcher)
+        notifier = ChannelDeliveries.from_settings(bot, settings, fetcher).start()
+    drift = DriftDetector(settings['drift_state_file']) if not args.dry_run else None
+    recorder = Recorder.from_settings(settings)
+    recipients = getattr(notifier, 'chat_ids', None) or ['console']
+    router = RegionRouter.from_settings(settings, fetcher, lambda: recipients)
+    priority = PriorityLane.from_settings(settings, notifier, bot, lambda: recipients)
+    checker = CrousChecker(build_source(settings, fetcher, drift, recorder), notifier,
+                           area_name=settings['area_name'], router=router,
+                           room_filter=RoomFilter.from_config(settings['room_filter']),
+                           clusters=ClusterIndex.from_settings(settings), priority=priority)
+    result = checker.check_and_notify()
+    _close_source(checker.source)
+    if isinstance(notifier, ChannelDeliveries):
+        notifier.close(timeout=settings['shutdown_grace_seconds'])
+    if recorder:
+        recorder.close()
+    print(f"📊 {result['total_count']} room(s) found"
+          + (f" ({result.get('error') or result.get('note')})" if result.get('error') or result.get('note') else ''))
+    return 0 if 'error' not in result else 1
+
+
+def cmd_replay(args) -> int:
+    """
+    Feed saved pages or recordings through extraction, dedup and notification
+    as fast as possible, one page per check, and report the throughput
+    """
+    from .clustering import ClusterIndex
+    from .engine import CrousChecker
+    from .fetch import ResilientFetcher
+    from .normalization import RoomFilter
+    from .notify import TelegramBot, ConsoleNotifier
+    from .sources import ReplaySource
+
+    settings = _settings_for_offline_use(args)
+    configure_from_settings(settings)
+    if args.quiet:
+        # Per-room logging would dominate the timings
+        logging.getLogger().setLevel(logging.WARNING)
+    if args.send:
+        try:
+            config = load_config(args.config)
+        except (ConfigError, FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("❌ --send needs valid Telegram credentials: %s", e)
+            return 1
+        notifier = TelegramBot(config['telegram']['bot_token'], config['telegram']['chat_ids'],
+                               ResilientFetcher.from_settings(settings))
+    else:
+        notifier = ConsoleNotifier(quiet=args.quiet)
+
+    source = ReplaySource(args.files, area_name=settings['area_name'], streaming=args.streaming)
+    checker = CrousChecker(source, notifier, area_name=settings['area_name'],
+                           room_filter=RoomFilter.from_config(settings['room_filter']),
+                           clusters=ClusterIndex.from_settings(settings))
+    start = time.perf_counter()
+    while not source.exhausted():
+        checker.check_and_notify()
+    elapsed = max(time.perf_counter() - start, 1e-9)
+
+    stats = source.stats
+    print(f"🔁 Replayed {stats['cycles']} cycle(s) in {elapsed * 1000:.1f} ms: "
+          f"{stats['cycles'] / elapsed:.1f} cycles/s, {stats['bytes'] / elapsed / 1e6:.2f} MB/s")
+    print(f"🏠 {stats['rooms']} room(s) extracted, {len(checker.seen)} distinct, "
+          f"{len(notifier.sent) if isinstance(notifier, ConsoleNotifier) else '?'} notification(s)")
+    if checker.clusters is not None and checker.clusters.merged:
+        print(f"🧬 {checker.clusters.merged} card(s) recognized as near-duplicates of an earlier room")
+    if stats['failed_fetches']:
+        print(f"⚠️  {stats['failed_fetches']} recorded cycle(s) had failed fetches")
+    if stats['mismatches']:
+        print(f"⚠️  {stats['mismatches']} cycle(s) extracted differently than when recorded")
+    return 0
+
+
+def _time_stage(func: Callable[[], Any], iterations: int) -> List[float]:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def cmd_bench(args) -> int:
+    """Time each pipeline stage in isolation on a saved or synthetic page"""
+    from bs4 import BeautifulSoup
+    from .dedup import SeenStore
+    from .extraction import iter_rooms_from_soup, iter_rooms_streaming
+    from .loadtest import synthetic_page
+    from .notify import format_room_message
+
+    # Per-room logging would dominate the timings
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.page:
+        with open(args.page, 'rb') as f:
+            body = f.read()
+    else:
+        body = synthetic_page(args.cards)
+    url = 'https://trouverunlogement.lescrous.fr/'
+    soup = BeautifulSoup(body, 'html.parser')
+    rooms = list(iter_rooms_from_soup(soup, url))
+    chunks = [body[i:i + 16384] for i in range(0, len(body), 16384)]
+
+    def dedup():
+        seen = SeenStore()
+        seen.mark(seen.filter_new(rooms))
+
+    stages = [
+        ('parse', lambda: BeautifulSoup(body, 'html.parser')),
+        ('extract', lambda: list(iter_rooms_from_soup(soup, url))),
+        ('stream', lambda: list(iter_rooms_streaming(chunks, url))),
+        ('dedup', dedup),
+        ('format', lambda: format_room_message(rooms)),
+    ]
+
+    print(f"🧪 Stage benchmark: {len(body)} bytes, {len(rooms)} room(s), {args.iterations} iterations")
+    print("=" * 60)
+    for name, func in stages:
+        samples = _time_stage(func, args.iterations)
+        print(f"⏱️  {name:<8} median {statistics.median(samples):8.3f} ms   min {min(samples):8.3f} ms")
+    print("=" * 60)
+    return 0
+
+
+def cmd_profile(args) -> int:
+    """
+    Run offline cycles under a profiler: a stack sampler writing folded
+    stacks for flame graphs, or cProfile with --cprofile. Prints the
+    per-stage timings the tracer collected along the way.
+    """
+    import cProfile
+    import tempfile
+    from .dedup import SeenStore
+    from .engine import CrousChecker
+    from .loadtest import synthetic_page
+    from .notify import ConsoleNotifier
+    from .sources import ReplaySource
+    from .tracing import TRACER, StackSampler
+
+    settings = _settings_for_offline_use(args)
+    configure_from_settings(settings)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    paths = args.files
+    if not paths:
+        page = tempfile.NamedTemporaryFile(prefix='crous-profile-', suffix='.html', delete=False)
+        with page:
+            page.write(synthetic_page(args.cards))
+        paths = [page.name]
+
+    TRACER.apply_settings(dict(settings, trace_cycles=args.cycles, trace_log=False))
+    notifier = ConsoleNotifier(quiet=True)
+    checker = CrousChecker(ReplaySource(paths, area_name=settings['area_name'], streaming=args.streaming),
+                           notifier, area_name=settings['area_name'])
+
+    def run_cycles() -> None:
+        for _ in range(args.cycles):
+            if checker.source.exhausted():
+                checker.source = ReplaySource(paths, area_name=settings['area_name'], streaming=args.streaming)
+            # Forget notified rooms so every cycle formats and sends
+            checker.seen = SeenStore()
+            checker.check_and_notify()
+
+    start = time.perf_counter()
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        profiler.runcall(run_cycles)
+        profiler.dump_stats(args.cprofile)
+        print(f"📝 cProfile stats written to {args.cprofile} (python -m pstats {args.cprofile})")
+    else:
+        sampler = StackSampler(interval=args.interval / 1000).start()
+        try:
+            run_cycles()
+        finally:
+            sampler.stop()
+        samples = sampler.write_folded(args.out)
+        print(f"🔥 {samples} stack sample(s) written to {args.out} (flamegraph.pl {args.out} > profile.svg)")
+    elapsed = time.perf_counter() - start
+
+    traces = TRACER.traces()
+    print(f"⏱️  {len(traces)} cycle(s) in {elapsed * 1000:.1f} ms")
+    print("=" * 60)
+    stages: Dict[str, List[float]] = {}
+    for trace in traces:
+        for name, ms in trace.stages().items():
+            stages.setdefault(name, []).append(ms)
+    for name, samples in stages.items():
+        print(f"   {name:<10} median {statistics.median(samples):8.3f} ms   max {max(samples):8.3f} ms")
+    print("=" * 60)
+    if not args.files:
+        os.remove(paths[0])
+    return 0
+
+
+def cmd_loadtest(args) -> int:
+    """Time full check cycles on synthetic regions and subscribers, at each scale point"""
+    from . import loadtest
+    from .memory import apply_low_memory
+
+    settings = _settings_for_offline_use(args)
+    if args.low_memory:
+        settings = apply_low_memory(dict(settings, low_memory=True))
+    configure_from_settings(settings)
+    # Per-room and per-message logging would dominate the timings (and the undrained-queue warnings the table)
+    logging.getLogger().setLevel(logging.ERROR)
+    interval_ms = settings['check_interval_minutes'] * 60 * 1000
+
+    print(f"🧪 Load test: {args.cards} listing(s) per area, {args.churn:.0%} new per cycle, "
+          f"{args.cycles} cycle(s) per point")
+    print("=" * 100)
+    print(f"{'regions':>7} {'subs':>6} {'searches':>8} {'rooms':>6} {'p50 ms':>9} {'p99 ms':>9} {'cycles/s':>9} "
+          f"{'rooms/s':>9} {'CPU ms':>8} {'RSS MB':>7} {'msgs':>6} {'drain s':>7}")
+    results = []
+    for regions in args.regions:
+        for subscribers in args.subscribers:
+            point = loadtest.run_point(settings, regions, subscribers, args.cycles, args.cards,
+                                       churn=args.churn, latency=args.latency / 1000, seed=args.seed,
+                                       drain_timeout=args.drain_timeout)
+            results.append(point)
+            print(f"{regions:>7} {subscribers:>6} {point['searches']:>8} {point['rooms_per_cycle']:>6.0f} "
+                  f"{point['p50_ms']:>9.1f} {point['p99_ms']:>9.1f} {point['cycles_per_second']:>9.1f} "
+                  f"{point['rooms_per_second']:>9.0f} {point['cpu_ms_per_cycle']:>8.1f} {point['rss_mb']:>7.1f} "
+                  f"{point['messages']:>6} {point['drain_seconds']:>6.1f}{' ' if point['drained'] else '+'}"
+                  + ("  ⚠️ over check interval" if point['p99_ms'] > interval_ms else ''))
+    print("=" * 100)
+    slowest = max(results, key=lambda point: point['p99_ms'])
+    stages = sorted(slowest['stages_ms'].items(), key=lambda item: -item[1])[:5]
+    print(f"🐢 Slowest point ({slowest['regions']} x {slowest['subscribers']}), median per stage: "
+          + ', '.join(f"{name} {ms:.1f} ms" for name, ms in stages))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'created_at': datetime.now().isoformat(timespec='seconds'), 'cards': args.cards,
+                       'churn': args.churn, 'latency_ms': args.latency, 'results': results}, f, indent=2)
+        print(f"📝 Results written to {args.json}")
+    if args.baseline:
+        found = loadtest.regressions(results, loadtest.load_results(args.baseline))
+        for line in found:
+            print(f"📉 Regression: {line}")
+        if found:
+            return 1
+        print(f"✅ No p99 regression against {args.baseline}")
+    return 0
+
+
+def cmd_history(args) -> int:
+    """List the distinct rooms of recordings that pass a numeric filter, cheapest first"""
+    from .models import Room
+    from .normalization import RoomFilter
+    from .recording import iter_recording
+
+    options = {'min_rent': args.min_rent, 'max_rent': args.max_rent, 'min_area': args.min_area,
+               'max_area': args.max_area, 'types': args.type, 'min_confidence': args.min_confidence}
+    if args.charges_included is not None:
+        options['charges_included'] = args.charges_included == 'yes'
+    try:
+        room_filter = RoomFilter.from_config({key: value for key, value in options.items() if value is not None})
+    except ValueError as e:
+        logger.error("❌ %s", e)
+        return 1
+
+    first_seen: Dict[int, tuple] = {}
+    for path in args.recordings:
+        for entry in iter_recording(path):
+            for data in entry['rooms']:
+                if data['fingerprint'] not in first_seen:
+                    first_seen[data['fingerprint']] = (entry['ts'], Room.from_dict(data))
+    matches = [(ts, room) for ts, room in first_seen.values() if room_filter is None or room_filter.matches(room)]
+    matches.sort(key=lambda item: (item[1].rent_cents, item[0]))
+    for ts, room in matches:
+        area = f"{room.area_m2:g} m²" if room.area_m2 is not None else '?'
+        charges = {True: 'CC', False: 'HC', None: ''}[room.charges_included]
+        print(f"{ts}  {room.rent:>13} {charges:2}  {area:>8}  {room.type.label:11}  {room.location}")
+    print(f"📊 {len(matches)} of {len(first_seen)} room(s) match")
+    return 0
+
+
+def cmd_fake_update(args) -> int:
+    """Post a message to a running checker's Telegram webhook, as Telegram would"""
+    from .webhook import FakeTelegram, WEBHOOK_PATH, webhook_secret
+
+    try:
+        config = load_config(args.config, require_credentials=False)
+    except (ConfigError, FileNotFoundError, json.JSONDecodeError) as e:
+        logger.error("❌ No valid configuration found: %s", e)
+        return 1
+    bot_token = config['telegram']['bot_token']
+    if not args.secret and not config['settings']['webhook_secret'] and not bot_token:
+        logger.error("❌ The webhook secret comes from the bot token: configure it or pass --secret")
+        return 1
+    secret = args.secret or webhook_secret(config['settings'], bot_token or '')
+    chat_id = args.chat_id or (config['telegram']['chat_ids'] or ['123456789'])[0]
+    fake = FakeTelegram(f"http://{args.host}:{args.port}{WEBHOOK_PATH}", secret)
+    fake.update_id = int(time.time())
+    try:
+        status = fake.send(args.text, chat_id)
+    except OSError as e:
+        logger.error("❌ No checker listening on %s:%s: %s", args.host, args.port, e)
+        return 1
+    print(f"{args.text} from chat {chat_id}: HTTP {status}")
+    return 0 if status == 200 else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='crous_checker', description="CROUS room availability checker")
+    parser.add_argument('--config', default='config.json', help="configuration file (default: config.json)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="check forever at the configured interval")
+    run.add_argument('--profile', choices=sorted(PROFILE_LOG_FILES), default='local',
+                     help="local: log to crous_checker.log; cloud: console only (Render)")
+    run.add_argument('--record', metavar='DIR', help="record every fetched page to DIR (see replay)")
+    run.add_argument('--port', type=int, help="serve /healthz, /status and /trigger on this port (default: $PORT)")
+    run.set_defaults(func=cmd_run)
+
+    once = commands.add_parser('once', help="run a single check")
+    once.add_argument('--dry-run', action='store_true', help="print the message instead of sending it")
+    once.add_argument('--simulate', action='store_true', help="use the random simulation source")
+    once.add_argument('--url', help="search URL to check instead of the configured one")
+    once.add_argument('--record', metavar='DIR', help="record the fetched page to DIR")
+    once.set_defaults(func=cmd_once)
+
+    bench = commands.add_parser('bench', help="time each pipeline stage")
+    bench.add_argument('--page', help="saved search page (default: synthetic page)")
+    bench.add_argument('--cards', type=int, default=50, help="room cards on the synthetic page")
+    bench.add_argument('--iterations', type=int, default=20)
+    bench.set_defaults(func=cmd_bench)
+
+    replay = commands.add_parser('replay', help="run saved pages or recordings through the pipeline")
+    replay.add_argument('files', nargs='+', help="saved HTML pages, recording files or recording directories")
+    replay.add_argument('--streaming', action='store_true', help="use the streaming parser")
+    replay.add_argument('--send', action='store_true', help="send notifications to Telegram")
+    replay.add_argument('--quiet', action='store_true', help="only print the summary (for benchmarking)")
+    replay.set_defaults(func=cmd_replay)
+
+    profile = commands.add_parser('profile', help="profile offline cycles and write a flame graph input")
+    profile.add_argument('files', nargs='*', help="saved pages or recordings (default: synthetic page)")
+    profile.add_argument('--cycles', type=int, default=50)
+    profile.add_argument('--cards', type=int, default=50, help="room cards on the synthetic page")
+    profile.add_argument('--streaming', action='store_true', help="use the streaming parser")
+    profile.add_argument('--out', default='profile.folded', help="folded stacks output (default: profile.folded)")
+    profile.add_argument('--interval', type=float, default=1.0, help="sampling interval in ms (default: 1)")
+    profile.add_argument('--cprofile', metavar='FILE', help="use cProfile and write pstats to FILE instead")
+    profile.set_defaults(func=cmd_profile)
+
+    load = commands.add_parser('loadtest', help="scaling benchmark of full check cycles on synthetic subscribers")
+    load.add_argument('--regions', type=_int_list, default=[1, 10, 50], help="areas to try (default: 1,10,50)")
+    load.add_argument('--subscribers', type=_int_list, default=[10, 100, 1000],
+                      help="subscribers to try (default: 10,100,1000)")
+    load.add_argument('--cards', type=int, default=40, help="listings per area (default: 40)")
+    load.add_argument('--churn', type=float, default=0.1, help="share of listings new each cycle (default: 0.1)")
+    load.add_argument('--cycles', type=int, default=20, help="timed cycles per point (default: 20)")
+    load.add_argument('--latency', type=float, default=0.0, help="stub response delay in ms (default: 0)")
+    load.add_argument('--drain-timeout', type=float, default=30.0,
+                      help="seconds to wait for the delivery queue after the cycles (default: 30)")
+    load.add_argument('--low-memory', action='store_true', help="run with the low_memory settings")
+    load.add_argument('--seed', type=int, default=1)
+    load.add_argument('--json', metavar='FILE', help="write the results as JSON")
+    load.add_argument('--baseline', metavar='FILE', help="earlier --json results; exit 1 on a p99 regression")
+    load.set_defaults(func=cmd_loadtest)
+
+    history = commands.add_parser('history', help="search the rooms of recordings by rent, surface and type")
+    history.add_argument('recordings', nargs='+', help="recording files or directories")
+    history.add_argument('--min-rent', type=float, help="euros")
+    history.add_argument('--max-rent', type=float, help="euros")
+    history.add_argument('--min-area', type=float, help="m²")
+    history.add_argument('--max-area', type=float, help="m²")
+    history.add_argument('--type', action='append', help="Studio, Chambre, T1 ... T5+ (repeatable)")
+    history.add_argument('--charges-included', choices=['yes', 'no'])
+    history.add_argument('--min-confidence', type=float, help="below it a parsed value counts as unknown (default: 0.5)")
+    history.set_defaults(func=cmd_history)
+
+    fake = commands.add_parser('fake-update', help="send a bot command to a local checker's Telegram webhook")
+    fake.add_argument('text', help="message text, e.g. /status")
+    fake.add_argument('--chat-id', help="sender chat ID (default: the first configured chat ID)")
+    fake.add_argument('--port', type=int, default=8080)
+    fake.add_argument('--host', default='127.0.0.1')
+    fake.add_argument('--secret', help="webhook secret (default: webhook_secret, or derived from the bot token)")
+    fake.set_defaults(func=cmd_fake_update)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    # Console logging until the configuration says otherwise
+    setup_logging(level='INFO', log_file=PROFILE_LOG_FILES['local'] if args.command == 'run'
+                  and args.profile == 'local' else None)
+    return args.func(args)
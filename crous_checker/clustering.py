@@ -0,0 +1,223 @@
+"""
+Near-duplicate clustering of room listings
+
+A room's fingerprint hashes the first 100 characters of its card, so a
+listing whose text changes slightly between cycles ("disponible le 15/09"
+becoming "le 16/09"), or a residence shown as two cards, looks like a new
+room and is alerted again. Here each card gets a 64-bit SimHash of its
+normalized words plus its type, rent, surface and location; cards whose
+SimHashes differ in at most `max_distance` bits and whose rent and type
+are the same belong to the same cluster.
+
+ClusterIndex finds candidates with LSH: the SimHash is cut into
+max_distance + 1 bands, and two signatures within max_distance bits agree
+on at least one whole band (pigeonhole), so a lookup only compares the
+signatures sharing a band instead of every signature seen.
+
+A cluster is named after the fingerprint of its first room, and
+`collapse()` hands each cluster's first room on with that fingerprint, so
+SeenStore, digests and routing dedup clusters without knowing about them,
+and rooms notified before clustering existed keep their fingerprints.
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections import OrderedDict
+from dataclasses import replace
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
+
+from .models import Room, RoomType
+
+SIMHASH_BITS = 64
+# Each bit gets a 16-bit counter lane in one big integer (see simhash())
+_LANE = 16
+_LANE_MASK = (1 << _LANE) - 1
+
+# Dates and times change from cycle to cycle without making it another listing
+_VOLATILE = re.compile(r'\d{1,2}[/.-]\d{1,2}(?:[/.-]\d{2,4})?|\d{4}-\d{2}-\d{2}|\d{1,2}h\d{0,2}')
+_WORD = re.compile(r'[a-z0-9]+')
+
+# Fields outweigh any single word; the residence most of all, as it tells listings apart
+FIELD_WEIGHT = 6
+LOCATION_WEIGHT = 16
+
+# An indexed card: (SimHash, rent cents, type label)
+Member = Tuple[int, int, str]
+
+
+def card_words(text: str) -> List[str]:
+    """Lowercase words of a card without accents, numbers, dates or times"""
+    text = unicodedata.normalize('NFKD', _VOLATILE.sub(' ', text.lower()))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    # Rent and surface count as fields; read as words "18,5 m²" would also weigh "18" and "5"
+    return [word for word in _WORD.findall(text) if len(word) > 1 and not word.isdigit()]
+
+
+def card_features(text: str, room_type: RoomType, rent_cents: int, area_m2: Optional[float],
+                  location: str) -> Dict[str, int]:
+    """Weighted features of a card: its words and word pairs, plus its fields"""
+    features: Dict[str, int] = {}
+    words = card_words(text)
+    for word in words:
+        features[word] = features.get(word, 0) + 1
+    for pair in zip(words, words[1:]):
+        key = ' '.join(pair)
+        features[key] = features.get(key, 0) + 1
+    features[f"type={room_type.label}"] = FIELD_WEIGHT
+    features[f"rent={rent_cents}"] = FIELD_WEIGHT
+    if area_m2 is not None:
+        features[f"area={round(area_m2)}"] = FIELD_WEIGHT
+    features[f"location={' '.join(card_words(location))}"] = LOCATION_WEIGHT
+    return features
+
+
+@lru_cache(maxsize=8192)
+def _spread(feature: str) -> int:
+    """The feature's 64-bit hash with bit i moved to the bottom of counter lane i"""
+    bits = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+    spread = 0
+    for i in range(SIMHASH_BITS):
+        if bits >> i & 1:
+            spread |= 1 << (i * _LANE)
+    return spread
+
+
+def simhash(features: Dict[str, int]) -> int:
+    """
+    64-bit SimHash: bit i is set when the features whose hash has bit i set
+    outweigh half the total. The per-bit counts are summed in one big integer
+    (one addition per feature rather than 64).
+    """
+    counts = 0
+    total = 0
+    for feature, weight in features.items():
+        counts += weight * _spread(feature)
+        total += weight
+    total = min(total, _LANE_MASK)
+    signature = 0
+    for i in range(SIMHASH_BITS):
+        if 2 * (counts >> (i * _LANE) & _LANE_MASK) > total:
+            signature |= 1 << i
+    return signature
+
+
+def room_simhash(room: Room) -> int:
+    """The room's SimHash (from its fields alone when extraction gave none)"""
+    return room.simhash or simhash(card_features('', room.type, room.rent_cents, room.area_m2, room.location))
+
+
+class ClusterIndex:
+    """
+    SimHash LSH index of the rooms seen so far, mapping each signature (with
+    its rent and type) to its cluster. The oldest signatures are forgotten past `max_signatures`.
+    """
+
+    def __init__(self, max_distance: int = 6, max_signatures: int = 20000):
+        if not 0 <= max_distance < 8:
+            raise ValueError("max_distance must be between 0 and 7")
+        self.max_distance = max_distance
+        self.max_signatures = max_signatures
+        self._band_bits = SIMHASH_BITS // (max_distance + 1)
+        # (signature, rent cents, type label) -> cluster, oldest first: cards at different rents
+        # can share a signature when their text is a template, and are still different rooms
+        self._members: 'OrderedDict[Member, int]' = OrderedDict()
+        # (band bits, rent cents) -> members: rents must match anyway, and keying buckets by
+        # rent keeps them small when cards share a template and their signatures are alike
+        self._bands: List[Dict[Tuple[int, int], List[Member]]] = [{} for _ in range(max_distance + 1)]
+        self.merged = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], state: Optional[List[list]] = None) -> Optional['ClusterIndex']:
+        """An index restored from snapshot state, or None if settings.near_duplicates is off"""
+        if not settings['near_duplicates']:
+            return None
+        index = cls(settings['near_duplicate_bits'], settings['max_clusters'])
+        if state:
+            index.restore(state)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def _band_keys(self, signature: int, rent_cents: int) -> List[Tuple[int, int]]:
+        mask = (1 << self._band_bits) - 1
+        return [(signature >> (i * self._band_bits) & mask, rent_cents) for i in range(len(self._bands))]
+
+    def _add(self, member: Member, cluster: int) -> None:
+        if member in self._members:
+            self._members.move_to_end(member)
+            return
+        self._members[member] = cluster
+        for band, key in zip(self._bands, self._band_keys(member[0], member[1])):
+            band.setdefault(key, []).append(member)
+        while len(self._members) > self.max_signatures:
+            self._forget(next(iter(self._members)))
+
+    def _forget(self, member: Member) -> None:
+        del self._members[member]
+        for band, key in zip(self._bands, self._band_keys(member[0], member[1])):
+            bucket = band[key]
+            bucket.remove(member)
+            if not bucket:
+                del band[key]
+
+    @staticmethod
+    def _compatible(room: Room, rent_cents: int, type_label: str) -> bool:
+        # Two rooms of a residence at different rents are two rooms, however alike their cards
+        if room.rent_cents != rent_cents:
+            return False
+        return type_label == room.type.label or RoomType.LOGEMENT.label in (type_label, room.type.label)
+
+    def _nearest(self, room: Room, signature: int) -> Optional[int]:
+        best = None
+        best_distance = self.max_distance + 1
+        for band, key in zip(self._bands, self._band_keys(signature, room.rent_cents)):
+            for candidate in band.get(key, ()):
+                distance = (candidate[0] ^ signature).bit_count()
+                if distance < best_distance and self._compatible(room, *candidate[1:]):
+                    best, best_distance = candidate, distance
+        return None if best is None else self._members[best]
+
+    def cluster_of(self, room: Room) -> int:
+        """The room's cluster (its own fingerprint if it starts a new one); indexes the room"""
+        member = (room_simhash(room), room.rent_cents, room.type.label)
+        cluster = self._members.get(member)
+        if cluster is None:
+            cluster = self._nearest(room, member[0])
+        if cluster is None:
+            cluster = room.fingerprint
+        elif cluster != room.fingerprint:
+            self.merged += 1
+        self._add(member, cluster)
+        return cluster
+
+    def collapse(self, rooms: List[Room], known: Optional[Dict[int, int]] = None) -> List[Room]:
+        """
+        The first room of each cluster, in order, carrying the cluster as its
+        fingerprint. `known` maps fingerprints to the clusters already found
+        this cycle (and is filled in), so a room is only indexed once.
+        """
+        collapsed = []
+        clusters = set()
+        for room in rooms:
+            cluster = known.get(room.fingerprint) if known is not None else None
+            if cluster is None:
+                cluster = self.cluster_of(room)
+                if known is not None:
+                    known[room.fingerprint] = cluster
+            if cluster in clusters:
+                continue
+            clusters.add(cluster)
+            collapsed.append(room if cluster == room.fingerprint else replace(room, fingerprint=cluster))
+        return collapsed
+
+    def state(self) -> List[list]:
+        """[signature, cluster, rent cents, type] rows, oldest first (for the snapshot)"""
+        return [[signature, cluster, rent_cents, type_label]
+                for (signature, rent_cents, type_label), cluster in self._members.items()]
+
+    def restore(self, rows: List[list]) -> None:
+        for signature, cluster, rent_cents, type_label in rows:
+            self._add((signature, rent_cents, type_label), cluster)
@@ -0,0 +1,365 @@
+"""
+Configuration loading, validation and hot reload
+
+Values come from config.json and are overridden by environment variables
+(for cloud deployments). Every value is checked against SCHEMA and missing
+settings get their defaults. ConfigWatcher polls the file's mtime and hands
+each new, valid configuration to its subscribers at the start of the next
+check; invalid edits are logged and ignored so a typo never takes the
+running checker down.
+"""
+
+import copy
+import json
+import logging
+import os
+import re
+import threading
+from collections import namedtuple
+from typing import Optional, Dict, Any, Callable, List
+
+from .geo import parse_regions
+from .memory import apply_low_memory
+from .normalization import RoomFilter
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = 'config.json'
+
+# Defaults of each deployment profile, where they differ from SCHEMA's
+PROFILE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    'local': {},
+    # A cloud deployment checks the real site unless its config.json asks for the simulation
+    'cloud': {'use_simulation': False},
+}
+
+PLACEHOLDERS = {'YOUR_BOT_TOKEN_HERE', 'YOUR_CHAT_ID_HERE', 'FRIEND_CHAT_ID_HERE', 'ANOTHER_FRIEND_CHAT_ID_HERE'}
+
+# Notification channels besides Telegram (see channels.py)
+CHANNELS = ('email', 'discord', 'slack', 'ntfy')
+
+Field = namedtuple('Field', ['types', 'default', 'check', 'hint'])
+
+
+def _positive(value) -> bool:
+    return value > 0
+
+
+def _non_negative(value) -> bool:
+    return value >= 0
+
+
+def _valid_channels(value) -> bool:
+    return all(name in CHANNELS and isinstance(options, dict) and isinstance(options.get('recipients', []), list)
+               for name, options in value.items())
+
+
+def _valid_filter(value) -> bool:
+    try:
+        RoomFilter.from_config(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def _valid_urgent_alerts(value) -> bool:
+    # Imported here: priority sends through the channels, which would put requests on the config import path
+    from .priority import parse_urgent_alerts
+    try:
+        parse_urgent_alerts(value)
+    except (KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _valid_regions(value) -> bool:
+    try:
+        parse_regions(value)
+    except (KeyError, TypeError, ValueError):
+        return False
+    return True
+
+
+SCHEMA = {
+    'telegram': {
+        'bot_token': Field(str, None, lambda v: v not in PLACEHOLDERS, "must be your bot token"),
+        'chat_ids': Field(list, [], lambda v: bool(v) and not PLACEHOLDERS & set(v), "must list at least one chat ID"),
+    },
+    'settings': {
+        'check_interval_minutes': Field((int, float), 5, _positive, "must be > 0"),
+        'crous_url': Field(str, None, lambda v: v.startswith('http'), "must be an http(s) URL"),
+        'area_name': Field(str, 'Rennes', None, ""),
+        'regions': Field(list, [], _valid_regions,
+                         "must list regions with a name and bounds, bbox or polygon"),
+        'room_filter': Field(dict, {}, _valid_filter,
+                             "must use min_rent, max_rent, min_area, max_area, types, charges_included, min_confidence"),
+        'urgent_alerts': Field(list, [], _valid_urgent_alerts,
+                               "must list alerts with a filter, and optionally a name and chat_ids"),
+        'near_duplicates': Field(bool, True, None, ""),
+        'near_duplicate_bits': Field(int, 6, lambda v: 0 <= v <= 7, "must be between 0 and 7"),
+        'max_clusters': Field(int, 20000, _positive, "must be > 0"),
+        'max_query_span_degrees': Field((int, float), 0.5, _positive, "must be > 0"),
+        'search_result_cap': Field(int, 100, _non_negative, "must be >= 0"),
+        'fetch_workers': Field(int, 4, _positive, "must be > 0"),
+        'parse_processes': Field(int, 2, _non_negative, "must be >= 0"),
+        'pipeline_buffer': Field(int, 4, _positive, "must be > 0"),
+        'geocoding': Field(bool, True, None, ""),
+        'geocode_cache_file': Field(str, 'geocode_cache.json', None, ""),
+        'use_simulation': Field(bool, True, None, ""),
+        'log_level': Field(str, 'INFO', lambda v: v.upper() in ('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+                           "must be DEBUG, INFO, WARNING or ERROR"),
+        'log_file': Field(str, None, None, ""),
+        'json_logs': Field(bool, False, None, ""),
+        'log_max_bytes': Field(int, 5 * 1024 * 1024, _positive, "must be > 0"),
+        'log_backup_count': Field(int, 3, _non_negative, "must be >= 0"),
+        'log_sample_every': Field(dict, {'extract': 10}, None, ""),
+        'http_backend': Field(str, 'requests', lambda v: v in ('requests', 'httpx'), "must be 'requests' or 'httpx'"),
+        'streaming_parse': Field(bool, False, None, ""),
+        'connect_timeout_seconds': Field((int, float), 5, _positive, "must be > 0"),
+        'read_timeout_seconds': Field((int, float), 15, _positive, "must be > 0"),
+        'max_retries': Field(int, 4, _non_negative, "must be >= 0"),
+        'retry_budget_seconds': Field((int, float), 60, _positive, "must be > 0"),
+        'breaker_failure_threshold': Field(int, 5, _positive, "must be > 0"),
+        'breaker_reset_seconds': Field((int, float), 120, _positive, "must be > 0"),
+        'drift_state_file': Field(str, 'drift_state.json', None, ""),
+        'snapshot_file': Field(str, 'checker_state.snap', None, ""),
+        'snapshot_interval_seconds': Field((int, float), 300, _positive, "must be > 0"),
+        'delivery_rate_per_second': Field((int, float), 25, _positive, "must be > 0"),
+        'delivery_per_chat_seconds': Field((int, float), 1.0, _non_negative, "must be >= 0"),
+        'delivery_max_attempts': Field(int, 12, _positive, "must be > 0"),
+        'delivery_retry_max_seconds': Field((int, float), 300, _positive, "must be > 0"),
+        'pending_deliveries_file': Field(str, 'pending_deliveries.json', None, ""),
+        'channels': Field(dict, {}, _valid_channels,
+                          "must map email, discord, slack or ntfy to their options and recipients"),
+        'coalesce_window_seconds': Field((int, float), 60, _non_negative, "must be >= 0"),
+        'shutdown_grace_seconds': Field((int, float), 25, _positive, "must be > 0"),
+        'record_dir': Field(str, None, None, ""),
+        'record_max_bytes': Field(int, 20 * 1024 * 1024, _positive, "must be > 0"),
+        'record_max_files': Field(int, 5, _positive, "must be > 0"),
+        'trace_cycles': Field(int, 50, _non_negative, "must be >= 0"),
+        'trace_log': Field(bool, False, None, ""),
+        'http_port': Field(int, 0, lambda v: 0 <= v < 65536, "must be a port number (0: no HTTP service)"),
+        'http_host': Field(str, '0.0.0.0', None, ""),
+        'trigger_token': Field(str, None, None, ""),
+        'keepalive_url': Field(str, None, lambda v: v.startswith('http'), "must be an http(s) URL"),
+        'keepalive_minutes': Field((int, float), 10, _positive, "must be > 0"),
+        'telegram_webhook': Field(bool, False, None, ""),
+        'webhook_url': Field(str, None, lambda v: v.startswith('https://'), "must be an https URL"),
+        'webhook_secret': Field(str, None, lambda v: bool(re.fullmatch(r'[A-Za-z0-9_-]{1,256}', v)),
+                                "must be 1-256 letters, digits, _ or -"),
+        'operator_chat_ids': Field(list, [], None, ""),
+        'config_poll_seconds': Field((int, float), 5, _positive, "must be > 0"),
+        'low_memory': Field(bool, False, None, ""),
+        'max_seen_rooms': Field(int, 0, _non_negative, "must be >= 0 (0: unbounded)"),
+        'memory_budget_mb': Field((int, float), 0, _non_negative, "must be >= 0 (0: no budget)"),
+    },
+}
+
+
+class ConfigError(ValueError):
+    """Raised when a configuration fails validation"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def _split_ids(value: str) -> List[str]:
+    return [id.strip() for id in value.split(',') if id.strip()]
+
+
+def _env_overrides() -> Dict[str, Dict[str, Any]]:
+    """Configuration values set through environment variables (cloud deployment)"""
+    telegram, settings = {}, {}
+
+    if os.getenv('TELEGRAM_BOT_TOKEN'):
+        telegram['bot_token'] = os.getenv('TELEGRAM_BOT_TOKEN')
+    if os.getenv('TELEGRAM_CHAT_IDS'):
+        # Multiple chat IDs, comma-separated
+        telegram['chat_ids'] = _split_ids(os.getenv('TELEGRAM_CHAT_IDS'))
+    elif os.getenv('TELEGRAM_CHAT_ID'):
+        # Single chat ID (backward compatibility)
+        telegram['chat_ids'] = [os.getenv('TELEGRAM_CHAT_ID')]
+
+    if os.getenv('CHECK_INTERVAL_MINUTES'):
+        settings['check_interval_minutes'] = float(os.getenv('CHECK_INTERVAL_MINUTES'))
+    if os.getenv('LOG_LEVEL'):
+        settings['log_level'] = os.getenv('LOG_LEVEL')
+    if os.getenv('LOG_FORMAT'):
+        settings['json_logs'] = os.getenv('LOG_FORMAT').lower() == 'json'
+    if os.getenv('PORT'):
+        # Render web services must bind $PORT
+        settings['http_port'] = int(os.getenv('PORT'))
+    if os.getenv('RENDER_EXTERNAL_URL'):
+        settings['keepalive_url'] = os.getenv('RENDER_EXTERNAL_URL')
+    if os.getenv('TRIGGER_TOKEN'):
+        settings['trigger_token'] = os.getenv('TRIGGER_TOKEN')
+    if os.getenv('TELEGRAM_WEBHOOK'):
+        settings['telegram_webhook'] = os.getenv('TELEGRAM_WEBHOOK').lower() in ('1', 'true', 'yes')
+    if os.getenv('TELEGRAM_WEBHOOK_SECRET'):
+        settings['webhook_secret'] = os.getenv('TELEGRAM_WEBHOOK_SECRET')
+    if os.getenv('OPERATOR_CHAT_IDS'):
+        settings['operator_chat_ids'] = _split_ids(os.getenv('OPERATOR_CHAT_IDS'))
+    if os.getenv('LOW_MEMORY'):
+        settings['low_memory'] = os.getenv('LOW_MEMORY').lower() in ('1', 'true', 'yes')
+    if os.getenv('MEMORY_BUDGET_MB'):
+        settings['memory_budget_mb'] = float(os.getenv('MEMORY_BUDGET_MB'))
+    if telegram:
+        # Credentials from the environment mean a cloud deployment: always check the real site
+        settings.setdefault('use_simulation', False)
+
+    return {'telegram': telegram, 'settings': settings}
+
+
+def normalize(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill in defaults and convert legacy shapes (single chat_id, string chat_ids)"""
+    config = copy.deepcopy(raw)
+    for section, fields in SCHEMA.items():
+        values = config.setdefault(section, {})
+        if section == 'telegram':
+            if 'chat_id' in values and 'chat_ids' not in values:
+                values['chat_ids'] = [values.pop('chat_id')]
+            if isinstance(values.get('chat_ids'), (str, int)):
+                values['chat_ids'] = [values['chat_ids']]
+            values['chat_ids'] = [str(id) for id in values.get('chat_ids', [])]
+        for name, field in fields.items():
+            if name not in values:
+                values[name] = copy.deepcopy(field.default)
+    return config
+
+
+def validate(config: Dict[str, Any]) -> List[str]:
+    """Return a list of human-readable problems (empty if the configuration is valid)"""
+    errors = []
+    for section, fields in SCHEMA.items():
+        values = config.get(section, {})
+        for name, field in fields.items():
+            value = values.get(name)
+            if value is None:
+                if field.default is None and section == 'telegram':
+                    errors.append(f"{section}.{name} is required")
+                continue
+            if isinstance(value, bool) and field.types is not bool:
+                errors.append(f"{section}.{name} has the wrong type")
+            elif not isinstance(value, field.types):
+                errors.append(f"{section}.{name} has the wrong type")
+            elif field.check and not field.check(value):
+                errors.append(f"{section}.{name} {field.hint}")
+    return errors
+
+
+def load_config(path: str = CONFIG_FILE, use_env: bool = True, require_credentials: bool = True,
+                profile: str = 'local') -> Dict[str, Any]:
+    """
+    Load, merge and validate the configuration. Raises ConfigError if it is
+    invalid and FileNotFoundError if there is neither a file nor environment
+    credentials. Offline tools pass require_credentials=False to only need
+    valid settings. Settings left unset get the profile's defaults.
+    """
+    raw: Dict[str, Any] = {}
+    if os.path.exists(path):
+        logger.info("Loading configuration from %s", path)
+        with open(path, 'r') as f:
+            raw = json.load(f)
+
+    if use_env:
+        overrides = _env_overrides()
+        if overrides['telegram']:
+            logger.info("Applying configuration from environment variables")
+        elif not raw and require_credentials:
+            raise FileNotFoundError("No configuration found. Set environment variables or create config.json")
+        for section, values in overrides.items():
+            raw.setdefault(section, {}).update(values)
+    elif not raw and require_credentials:
+        raise FileNotFoundError(f"{path} not found")
+    for name, value in PROFILE_DEFAULTS[profile].items():
+        raw.setdefault('settings', {}).setdefault(name, value)
+
+    config = normalize(raw)
+    errors = validate(config)
+    if not require_credentials:
+        errors = [error for error in errors if not error.startswith('telegram.')]
+    if errors:
+        raise ConfigError(errors)
+    apply_low_memory(config['settings'])
+    return config
+
+
+class ConfigWatcher:
+    """
+    Polls the config file's mtime and queues each new valid configuration;
+    apply_pending(), called by the check loop between cycles, makes it
+    `current` and publishes it, so a reload never changes components under a
+    running check. Subscribers receive (new_config, old_config); the swap of
+    `current` is atomic, so readers always see one complete configuration.
+    """
+
+    def __init__(self, config: Dict[str, Any], path: str = CONFIG_FILE, poll_seconds: float = 5.0,
+                 profile: str = 'local'):
+        self.current = config
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.profile = profile
+        self._subscribers: List[Callable[[Dict[str, Any], Dict[str, Any]], None]] = []
+        # The latest reloaded configuration not yet applied (several edits coalesce)
+        self._pending: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._mtime = self._read_mtime()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _read_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def subscribe(self, callback: Callable[[Dict[str, Any], Dict[str, Any]], None]) -> None:
+        self._subscribers.append(callback)
+
+    def poll(self) -> bool:
+        """Reload if the file changed; returns True if a new configuration was queued"""
+        mtime = self._read_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            new_config = load_config(self.path, profile=self.profile)
+        except (ConfigError, json.JSONDecodeError, OSError, ValueError) as e:
+            logger.error("Ignoring invalid configuration change in %s: %s", self.path, e)
+            return False
+        with self._lock:
+            if new_config == (self._pending or self.current):
+                return False
+            # Back to the configuration in use: nothing to apply
+            self._pending = new_config if new_config != self.current else None
+        logger.info("Configuration reloaded from %s, applying it before the next check", self.path)
+        return True
+
+    def apply_pending(self) -> bool:
+        """Publish the queued configuration, if any (call between checks); True if there was one"""
+        with self._lock:
+            new_config, self._pending = self._pending, None
+        if new_config is None:
+            return False
+        old_config, self.current = self.current, new_config
+        logger.info("Applying the configuration reloaded from %s", self.path)
+        for callback in self._subscribers:
+            try:
+                callback(new_config, old_config)
+            except Exception as e:
+                logger.error("Error applying configuration change: %s", e)
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            self.poll()
+
+    def start(self) -> 'ConfigWatcher':
+        self._thread = threading.Thread(target=self._run, name='config-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
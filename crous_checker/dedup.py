@@ -0,0 +1,93 @@
+"""
+Tracking of already-notified rooms so each one is announced only once
+"""
+
+import heapq
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Iterable, List, Sequence
+
+from .models import Room
+
+
+class SeenStore:
+    """
+    Set of fingerprints of rooms that have already been notified. `base` is a
+    sorted, read-only sequence (such as a memory-mapped snapshot) searched in
+    place; rooms marked since then are kept in a set.
+
+    With `max_size`, everything is kept in insertion order instead and the
+    rooms not listed for the longest are forgotten past that many (a room
+    that comes back after being forgotten is announced again).
+    """
+
+    def __init__(self, fingerprints: Iterable[int] = (), base: Sequence[int] = (), max_size: int = 0):
+        self.max_size = max_size
+        # Bumped whenever a new fingerprint is added, so callers can tell if a save is due
+        self.version = 0
+        if max_size:
+            self._base: Sequence[int] = ()
+            self._seen = OrderedDict()
+            self._add(base)
+            self.version = 0
+        else:
+            self._base = base
+            self._seen = set()
+        self._add(fingerprints)
+
+    def _in_base(self, fingerprint: int) -> bool:
+        i = bisect_left(self._base, fingerprint)
+        return i < len(self._base) and self._base[i] == fingerprint
+
+    def _has(self, fingerprint: int) -> bool:
+        return fingerprint in self._seen or self._in_base(fingerprint)
+
+    def _add(self, fingerprints: Iterable[int]) -> None:
+        for fingerprint in fingerprints:
+            if not self._has(fingerprint):
+                if self.max_size:
+                    self._seen[fingerprint] = None
+                    if len(self._seen) > self.max_size:
+                        self._seen.popitem(last=False)
+                else:
+                    self._seen.add(fingerprint)
+                self.version += 1
+
+    def __contains__(self, room: Room) -> bool:
+        return self._has(room.fingerprint)
+
+    def has_fingerprint(self, fingerprint: int) -> bool:
+        return self._has(fingerprint)
+
+    def __len__(self) -> int:
+        return len(self._base) + len(self._seen)
+
+    def filter_new(self, rooms: Iterable[Room]) -> List[Room]:
+        """Rooms that have not been notified yet, in their original order"""
+        rooms = list(rooms)
+        new = [room for room in rooms if not self._has(room.fingerprint)]
+        if self.max_size:
+            # Rooms still listed are the ones worth remembering
+            for room in rooms:
+                if room.fingerprint in self._seen:
+                    self._seen.move_to_end(room.fingerprint)
+        return new
+
+    def mark(self, rooms: Iterable[Room]) -> None:
+        """Remember these rooms as notified"""
+        self._add(room.fingerprint for room in rooms)
+
+    def rebase(self, base: Sequence[int]) -> None:
+        """
+        Search `base`, which must hold all fingerprints sorted (as returned
+        by fingerprints()), instead of the current base and set; the store
+        then no longer reads from the old base (a mapped snapshot).
+        Kept-in-order stores have nothing to rebase.
+        """
+        if not self.max_size:
+            self._base = base
+            self._seen = set()
+
+    def fingerprints(self) -> List[int]:
+        """All fingerprints, sorted"""
+        return list(heapq.merge(self._base, sorted(self._seen)))
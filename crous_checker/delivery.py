@@ -0,0 +1,462 @@
+"""
+Rate-limited background delivery of notifications
+
+Checks hand messages to the DeliveryQueue and carry on; a worker thread sends
+them one recipient at a time within Telegram's limits (about 30 messages per
+second overall and one per second per chat). A send that fails goes back in
+the queue with exponential backoff, up to `max_attempts` tries, so an outage
+of a few minutes delays alerts rather than losing them. On shutdown the
+queue is drained up to a deadline and whatever is still pending (retries
+included) is written to disk and sent after the next start, so a deploy
+neither cuts a fan-out in half nor loses it. ChannelDeliveries runs one such queue per notification
+channel. DigestCoalescer sits in front and merges bursts of room alerts
+into one digest per chat.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable
+
+from .channels import build_channels, split_address
+from .models import Room
+from .notify import format_room_message
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryQueue:
+    """
+    Queue in front of a bot with `chat_ids` and `send_to(chat_id, message)`.
+    Offers the notifier interface (`send_message`), which returns as soon as
+    the message is queued. Failed sends are retried after `retry_base`,
+    twice that, and so on up to `retry_max` seconds apart; `failed` counts
+    the messages given up on after `max_attempts`.
+    """
+
+    # Queued messages are delivered later: a notifier returning True has not sent anything yet
+    asynchronous = True
+
+    def __init__(self, bot, rate_per_second: float = 25.0, per_chat_interval: float = 1.0,
+                 pending_file: Optional[str] = None, max_attempts: int = 12,
+                 retry_base: float = 2.0, retry_max: float = 300.0):
+        self.bot = bot
+        self.rate_per_second = rate_per_second
+        self.per_chat_interval = per_chat_interval
+        self.pending_file = pending_file
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.counters = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+        self._heap: List[tuple] = []  # (ready_at, seq, chat_id, message, attempts so far)
+        self._seq = itertools.count()
+        self._chat_slots: Dict[str, float] = {}
+        self._next_send_at = 0.0
+        self._in_flight = 0
+        self._stopped = False
+        self._abort_drain = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='delivery', daemon=True)
+
+    @classmethod
+    def from_settings(cls, bot, settings: Dict[str, Any]) -> 'DeliveryQueue':
+        return cls(bot, rate_per_second=float(settings['delivery_rate_per_second']),
+                   per_chat_interval=float(settings['delivery_per_chat_seconds']),
+                   pending_file=settings['pending_deliveries_file'] or None,
+                   max_attempts=settings['delivery_max_attempts'],
+                   retry_max=float(settings['delivery_retry_max_seconds']))
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        with self._cond:
+            self.rate_per_second = float(settings['delivery_rate_per_second'])
+            self.per_chat_interval = float(settings['delivery_per_chat_seconds'])
+        self.apply_retry_settings(settings)
+
+    def apply_retry_settings(self, settings: Dict[str, Any]) -> None:
+        with self._cond:
+            self.max_attempts = settings['delivery_max_attempts']
+            self.retry_max = float(settings['delivery_retry_max_seconds'])
+
+    def start(self) -> 'DeliveryQueue':
+        """Start the worker, first re-queueing deliveries left over by the last shutdown"""
+        for item in self._load_pending():
+            self._enqueue(item['chat_id'], item['message'])
+        self._thread.start()
+        return self
+
+    def _enqueue(self, chat_id: str, message: str) -> None:
+        with self._cond:
+            now = time.monotonic()
+            # Space messages to the same chat; order per chat is preserved
+            ready_at = max(now, self._chat_slots.get(chat_id, 0.0))
+            self._chat_slots[chat_id] = ready_at + self.per_chat_interval
+            heapq.heappush(self._heap, (ready_at, next(self._seq), chat_id, message, 0))
+            self.counters['queued'] += 1
+            self._cond.notify_all()
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+
+    def _failed(self, chat_id: str, messages: List[str], attempts: int) -> None:
+        """Put a failed batch back in the queue, or give up on it (caller holds the lock)"""
+        if attempts >= self.max_attempts:
+            self.counters['failed'] += len(messages)
+            logger.error("Giving up on %s message(s) to %s after %s attempt(s)", len(messages), chat_id, attempts)
+            return
+        delay = self._retry_delay(attempts)
+        ready_at = time.monotonic() + delay
+        # Later messages to the chat wait for the retry, so they do not overtake it
+        self._chat_slots[chat_id] = max(self._chat_slots.get(chat_id, 0.0), ready_at + self.per_chat_interval)
+        for message in messages:
+            heapq.heappush(self._heap, (ready_at, next(self._seq), chat_id, message, attempts))
+        self.counters['retried'] += len(messages)
+        logger.warning("Delivery of %s message(s) to %s failed, retrying in %.0fs (attempt %s of %s)",
+                       len(messages), chat_id, delay, attempts + 1, self.max_attempts)
+
+    @property
+    def chat_ids(self) -> list:
+        return self.bot.chat_ids
+
+    def submit(self, message: str, chat_ids: Optional[list] = None) -> bool:
+        """Queue a message for all configured chat IDs (or only the given ones)"""
+        for chat_id in chat_ids or self.bot.chat_ids:
+            self._enqueue(str(chat_id), message)
+        return True
+
+    send_message = submit
+
+    def pending(self) -> int:
+        """Deliveries queued or being sent"""
+        with self._cond:
+            return len(self._heap) + self._in_flight
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    if self._heap:
+                        wait = max(self._heap[0][0], self._next_send_at) - time.monotonic()
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                _, _, chat_id, message, attempts = heapq.heappop(self._heap)
+                messages = [message]
+                max_batch = getattr(self.bot, 'max_batch', 1)
+                if max_batch > 1:
+                    messages += self._take_queued(chat_id, max_batch - 1)
+                self._in_flight += len(messages)
+                self._next_send_at = time.monotonic() + 1.0 / self.rate_per_second
+
+            try:
+                if len(messages) > 1:
+                    ok = self.bot.send_batch(chat_id, messages)
+                else:
+                    ok = self.bot.send_to(chat_id, message)
+            except Exception as e:
+                logger.error("Delivery to %s failed: %s", chat_id, e)
+                ok = False
+
+            with self._cond:
+                self._in_flight -= len(messages)
+                if ok:
+                    self.counters['sent'] += len(messages)
+                else:
+                    self._failed(chat_id, messages, attempts + 1)
+                self._cond.notify_all()
+
+    def _take_queued(self, chat_id: str, limit: int) -> List[str]:
+        """Remove up to `limit` more messages queued for `chat_id`, oldest first (caller holds the lock)"""
+        taken = sorted(item for item in self._heap if item[2] == chat_id)[:limit]
+        if taken:
+            self._heap = [item for item in self._heap if item not in taken]
+            heapq.heapify(self._heap)
+            # Their reserved send slots are used up by this batch
+            self._chat_slots[chat_id] = time.monotonic() + self.per_chat_interval
+        return [item[3] for item in taken]
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued has been sent; False if the timeout expired first"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self._heap or self._in_flight:
+                if self._abort_drain:
+                    return False
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def abort_drain(self) -> None:
+        """Make a drain in progress give up now"""
+        with self._cond:
+            self._abort_drain = True
+            self._cond.notify_all()
+
+    def close(self, timeout: Optional[float] = None) -> int:
+        """
+        Drain up to `timeout` seconds, stop the worker and save what is still
+        queued for the next start. Returns the number of deliveries left over.
+        """
+        left = self.stop(timeout)
+        if left:
+            self._save_pending(left)
+        return len(left)
+
+    def stop(self, timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        """Drain up to `timeout` seconds and stop the worker; returns the deliveries still queued"""
+        if getattr(self.bot, 'max_batch', 1) > 1:
+            # Batching channels space messages widely to collect them: send the batches now
+            with self._cond:
+                now = time.monotonic()
+                self._heap = [(min(item[0], now),) + item[1:] for item in self._heap]
+                heapq.heapify(self._heap)
+                self._cond.notify_all()
+        drained = self.drain(timeout)
+        with self._cond:
+            self._stopped = True
+            left = [{'chat_id': item[2], 'message': item[3]} for item in sorted(self._heap)]
+            self._heap.clear()
+            self._cond.notify_all()
+        if not drained:
+            logger.warning("Delivery deadline reached with %s message(s) pending", len(left) + self._in_flight)
+        if hasattr(self.bot, 'close'):
+            self.bot.close()
+        return left
+
+    def _save_pending(self, items: List[Dict[str, str]]) -> None:
+        if not self.pending_file:
+            logger.warning("Dropping %s undelivered message(s)", len(items))
+            return
+        try:
+            with open(self.pending_file, 'w') as f:
+                json.dump(items, f)
+            logger.info("Saved %s undelivered message(s) to %s", len(items), self.pending_file)
+        except OSError as e:
+            logger.error("Could not save undelivered messages: %s", e)
+
+    def _load_pending(self) -> List[Dict[str, str]]:
+        if not self.pending_file or not os.path.exists(self.pending_file):
+            return []
+        try:
+            with open(self.pending_file, 'r') as f:
+                items = json.load(f)
+            os.remove(self.pending_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable pending deliveries %s: %s", self.pending_file, e)
+            return []
+        logger.info("Re-sending %s message(s) left over from the last shutdown", len(items))
+        return items
+
+
+class ChannelDeliveries:
+    """
+    A DeliveryQueue per channel (Telegram, email, Discord, Slack, ntfy)
+    behind the DeliveryQueue interface, each retrying its own failures. Messages are split by recipient
+    address; every channel has its own worker and pace, so a slow SMTP
+    server or a rate-limited webhook never holds up a Telegram alert.
+    """
+
+    def __init__(self, queues: Dict[str, DeliveryQueue], recipients: Callable[[], list],
+                 pending_file: Optional[str] = None, channel_settings: Optional[Dict[str, Any]] = None):
+        self.queues = queues
+        # Callable returning every address (Telegram chat IDs change on config reload)
+        self.recipients = recipients
+        self.pending_file = pending_file
+        self.channel_settings = channel_settings or {}
+        self._unknown: set = set()
+
+    @classmethod
+    def from_settings(cls, bot, settings: Dict[str, Any], fetcher) -> 'ChannelDeliveries':
+        retries = {'max_attempts': settings['delivery_max_attempts'],
+                   'retry_max': float(settings['delivery_retry_max_seconds'])}
+        telegram = DeliveryQueue(bot, rate_per_second=float(settings['delivery_rate_per_second']),
+                                 per_chat_interval=float(settings['delivery_per_chat_seconds']), **retries)
+        queues = {'telegram': telegram}
+        channels = build_channels(settings, fetcher)
+        for name, channel in channels.items():
+            queues[name] = DeliveryQueue(channel, channel.rate_per_second, channel.per_recipient_seconds, **retries)
+        if channels:
+            logger.info("📨 Notification channels: %s", ', '.join(queues))
+        extra = [address for channel in channels.values() for address in channel.recipients]
+        return cls(queues, lambda: list(bot.chat_ids) + extra, settings['pending_deliveries_file'] or None,
+                   settings['channels'])
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        self.queues['telegram'].apply_settings(settings)
+        for queue in self.queues.values():
+            queue.apply_retry_settings(settings)
+        if settings['channels'] != self.channel_settings:
+            logger.warning("Changes to notification channels apply after a restart")
+
+    @property
+    def chat_ids(self) -> list:
+        return self.recipients()
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        totals = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+        for queue in self.queues.values():
+            for name, count in queue.counters.items():
+                totals[name] += count
+        return totals
+
+    def channel_stats(self) -> Dict[str, Dict[str, int]]:
+        return {name: dict(queue.counters, pending=queue.pending()) for name, queue in self.queues.items()}
+
+    def start(self) -> 'ChannelDeliveries':
+        """Start every channel's worker, first re-queueing what the last shutdown left over"""
+        for item in self._load_pending():
+            self.submit(item['message'], chat_ids=[item['chat_id']])
+        for queue in self.queues.values():
+            queue.start()
+        return self
+
+    def submit(self, message: str, chat_ids: Optional[list] = None) -> bool:
+        """Queue a message for all recipients (or only the given ones), on each one's channel"""
+        by_channel: Dict[str, list] = {}
+        for address in chat_ids or self.recipients():
+            by_channel.setdefault(split_address(address)[0], []).append(str(address))
+        for name, addresses in by_channel.items():
+            queue = self.queues.get(name)
+            if queue is None:
+                if name not in self._unknown:
+                    self._unknown.add(name)
+                    logger.warning("No '%s' channel configured, dropping messages for %s", name, addresses[0])
+                continue
+            queue.submit(message, chat_ids=addresses)
+        return True
+
+    send_message = submit
+
+    def pending(self) -> int:
+        return sum(queue.pending() for queue in self.queues.values())
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        return all([queue.drain(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+                    for queue in self.queues.values()])
+
+    def abort_drain(self) -> None:
+        for queue in self.queues.values():
+            queue.abort_drain()
+
+    def close(self, timeout: Optional[float] = None) -> int:
+        """Drain every channel within one deadline, then save what is left for the next start"""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        left: List[Dict[str, str]] = []
+        # The channels drain side by side: each wait only uses what is left of the deadline
+        for queue in self.queues.values():
+            left += queue.stop(max(0.0, deadline - time.monotonic()) if deadline is not None else None)
+        if left:
+            self._save_pending(left)
+        return len(left)
+
+    asynchronous = True
+
+    _save_pending = DeliveryQueue._save_pending
+    _load_pending = DeliveryQueue._load_pending
+
+
+class DigestCoalescer:
+    """
+    Per-subscriber coalescing of room alerts. The first new room for a chat
+    is sent at once and opens a window of `window_seconds`; rooms found for
+    that chat while the window is open are merged into a single digest sent
+    when it closes. A burst of publications then costs each chat one alert
+    plus one digest per window instead of one message per cycle.
+    """
+
+    asynchronous = True
+
+    def __init__(self, deliveries: DeliveryQueue, window_seconds: float = 60.0, recipients=None):
+        self.deliveries = deliveries
+        self.window_seconds = window_seconds
+        # Callable returning the current chat IDs (they change on config reload)
+        self.recipients = recipients or (lambda: deliveries.chat_ids)
+        self.counters = {'alerts': 0, 'digests': 0, 'coalesced_rooms': 0}
+
+        self._window_end: Dict[str, float] = {}
+        self._pending: Dict[str, Dict[int, Room]] = {}
+        self._area: Dict[str, str] = {}
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='digest', daemon=True)
+
+    def start(self) -> 'DigestCoalescer':
+        self._thread.start()
+        return self
+
+    def notify_rooms(self, rooms: List[Room], area_name: str = 'Rennes', chat_ids: Optional[list] = None) -> bool:
+        """Alert each chat now, or fold the rooms into its pending digest"""
+        now = time.monotonic()
+        immediate = []
+        with self._cond:
+            for chat_id in chat_ids or self.recipients():
+                chat_id = str(chat_id)
+                if self.window_seconds <= 0 or now >= self._window_end.get(chat_id, 0.0):
+                    self._window_end[chat_id] = now + self.window_seconds
+                    immediate.append(chat_id)
+                else:
+                    pending = self._pending.setdefault(chat_id, {})
+                    for room in rooms:
+                        pending[room.fingerprint] = room
+                    self._area[chat_id] = area_name
+                    self.counters['coalesced_rooms'] += len(rooms)
+            self._cond.notify_all()
+
+        if immediate:
+            self.counters['alerts'] += len(immediate)
+            self.deliveries.submit(format_room_message(rooms, area_name), chat_ids=immediate)
+        return True
+
+    def _due(self, now: float, flush_all: bool = False) -> List[tuple]:
+        """Pop the digests whose window has closed (caller holds the lock)"""
+        due = []
+        for chat_id in list(self._pending):
+            if flush_all or now >= self._window_end[chat_id]:
+                rooms = list(self._pending.pop(chat_id).values())
+                due.append((chat_id, rooms, self._area.pop(chat_id)))
+                # Rooms keep arriving: the digest opens the next window
+                self._window_end[chat_id] = now + self.window_seconds
+        return due
+
+    def _send(self, due: List[tuple]) -> None:
+        for chat_id, rooms, area_name in due:
+            self.counters['digests'] += 1
+            self.deliveries.submit(format_room_message(rooms, area_name, digest=True), chat_ids=[chat_id])
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    now = time.monotonic()
+                    due = self._due(now)
+                    if due:
+                        break
+                    ends = [self._window_end[chat_id] for chat_id in self._pending]
+                    self._cond.wait(min(ends) - now if ends else None)
+            self._send(due)
+
+    def flush(self) -> None:
+        """Send every pending digest now (shutdown)"""
+        with self._cond:
+            due = self._due(time.monotonic(), flush_all=True)
+        self._send(due)
+
+    def close(self) -> None:
+        self.flush()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
@@ -0,0 +1,223 @@
+"""
+Layout-drift detection for the CROUS search page
+
+Fingerprints the structure around the results region so a site redesign is
+reported to operators instead of looking like "no rooms available", and
+relearns the room-card selector from repeated, price-bearing sibling subtrees.
+The learned selector is cached on disk and tried first on every cycle.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional, Dict, Any, Callable, List
+
+from .extraction import CONTAINER_KEYWORDS, PRICE_PATTERNS, class_matches
+
+logger = logging.getLogger(__name__)
+
+# How deep below <body> the page frame is fingerprinted
+FRAME_DEPTH = 4
+
+# A redesign must be seen this many cycles in a row before operators are alerted
+CONFIRM_CYCLES = 2
+
+
+def _class_tokens(elem) -> List[str]:
+    """Class names without digits, so generated suffixes like 'card-123' do not count as drift"""
+    classes = elem.get('class') or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    return sorted({re.sub(r'\d+', '', c) for c in classes if c})
+
+
+def element_signature(elem) -> str:
+    """Compact 'tag.class.class' signature of an element"""
+    return '.'.join([elem.name] + _class_tokens(elem))
+
+
+def find_results_container(soup):
+    return soup.find(['div', 'section'], class_=lambda x: class_matches(x, CONTAINER_KEYWORDS))
+
+
+def frame_fingerprint(soup) -> str:
+    """
+    Hash of the page frame: the element signatures near the top of <body>
+    and the ancestor chain of the results container. The container's contents
+    are excluded so the fingerprint does not change with the number of rooms.
+    """
+    body = soup.body or soup
+    container = find_results_container(soup)
+    signatures = set()
+
+    def walk(elem, depth):
+        for child in elem.find_all(True, recursive=False):
+            if child is container:
+                continue
+            signatures.add(f"{depth}:{element_signature(child)}")
+            if depth < FRAME_DEPTH:
+                walk(child, depth + 1)
+
+    walk(body, 0)
+    if container is not None:
+        path = [element_signature(p) for p in reversed(list(container.parents)) if p.name != '[document]']
+        signatures.add('container:' + '>'.join(path + [element_signature(container)]))
+    else:
+        signatures.add('container:none')
+
+    return hashlib.sha1('\n'.join(sorted(signatures)).encode('utf-8')).hexdigest()[:16]
+
+
+def _has_price(text: str) -> bool:
+    return any(pattern.search(text) for pattern in PRICE_PATTERNS)
+
+
+def learn_selector(soup) -> Optional[str]:
+    """
+    Find the most likely room-card selector: the largest group of sibling
+    elements sharing a tag and class list where most members carry a price.
+    Returns a simple 'tag.class1.class2' selector, or None.
+    """
+    best_selector, best_score = None, 0
+
+    for parent in soup.find_all(True):
+        groups = defaultdict(list)
+        for child in parent.find_all(True, recursive=False):
+            classes = child.get('class') or []
+            # Only classes usable in a plain 'tag.class' CSS selector
+            if classes and all(re.fullmatch(r'[A-Za-z_][\w-]*', c) for c in classes):
+                groups[(child.name, tuple(sorted(classes)))].append(child)
+
+        for (tag, classes), members in groups.items():
+            if len(members) < 2:
+                continue
+            priced = sum(1 for m in members if _has_price(m.get_text(' ', strip=True)))
+            if priced * 2 < len(members):
+                continue
+            # Prefer more cards, then tighter cards (less surrounding text per card)
+            score = priced * 1000 - min(999, sum(len(m.get_text()) for m in members) // len(members))
+            if score > best_score:
+                best_score = score
+                best_selector = '.'.join([tag] + list(classes))
+
+    return best_selector
+
+
+class DriftDetector:
+    """Tracks the page frame across cycles and keeps the learned card selector"""
+
+    def __init__(self, state_file: str = 'drift_state.json',
+                 alert: Optional[Callable[[str], Any]] = None):
+        self.state_file = state_file
+        self.alert = alert
+        self.state: Dict[str, Any] = {'frame': None, 'learned_selector': None}
+        self._pending_frame = None
+        self._pending_count = 0
+        self._unrecognized_count = 0
+        self._load()
+
+    @property
+    def selector(self) -> Optional[str]:
+        return self.state.get('learned_selector')
+
+    def _load(self) -> None:
+        try:
+            with open(self.state_file, 'r') as f:
+                self.state.update(json.load(f))
+            if self.selector:
+                logger.info("Using cached room selector: %s", self.selector)
+        except FileNotFoundError:
+            pass
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning("Ignoring unreadable drift state %s: %s", self.state_file, e)
+
+    def _save(self) -> None:
+        self.state['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        try:
+            with open(self.state_file, 'w') as f:
+                json.dump(self.state, f, indent=2)
+        except OSError as e:
+            logger.warning("Could not save drift state: %s", e)
+
+    def snapshot_state(self) -> Dict[str, Any]:
+        """Persisted state plus the in-memory confirmation counters, for the state snapshot"""
+        return {
+            'state': dict(self.state),
+            'pending_frame': self._pending_frame,
+            'pending_count': self._pending_count,
+            'unrecognized_count': self._unrecognized_count,
+        }
+
+    def restore_state(self, snapshot: Dict[str, Any]) -> None:
+        """Resume the confirmation counters (and state, unless the state file is newer)"""
+        state = snapshot.get('state') or {}
+        if state.get('updated_at', '') >= self.state.get('updated_at', ''):
+            self.state.update(state)
+        self._pending_frame = snapshot.get('pending_frame')
+        self._pending_count = snapshot.get('pending_count', 0)
+        self._unrecognized_count = snapshot.get('unrecognized_count', 0)
+
+    def _send_alert(self, message: str) -> None:
+        logger.warning(message.replace('<b>', '').replace('</b>', ''))
+        if self.alert:
+            try:
+                self.alert(message)
+            except Exception as e:
+                logger.error("Failed to send drift alert: %s", e)
+
+    def observe(self, soup, recognized: bool) -> Dict[str, Any]:
+        """
+        Record this cycle's page frame. `recognized` is False when the page had
+        neither rooms nor an explicit "no results" message. Returns a report
+        with the frame fingerprint and whether drift was confirmed.
+        """
+        return self.observe_frame(frame_fingerprint(soup), recognized)
+
+    def observe_frame(self, frame: str, recognized: bool) -> Dict[str, Any]:
+        """observe() for a frame fingerprint computed elsewhere (a parse worker)"""
+        report = {'frame': frame, 'drift': False}
+
+        if self.state.get('frame') is None:
+            self.state['frame'] = frame
+            self._save()
+        elif frame != self.state['frame']:
+            if frame == self._pending_frame:
+                self._pending_count += 1
+            else:
+                self._pending_frame, self._pending_count = frame, 1
+            if self._pending_count >= CONFIRM_CYCLES:
+                report['drift'] = True
+                self._send_alert(
+                    f"⚠️ <b>CROUS page layout changed</b>\n\n"
+                    f"Frame {self.state['frame']} → {frame}\n"
+                    f"Rooms recognized: {'yes' if recognized else 'NO'}"
+                )
+                self.state['frame'] = frame
+                self._pending_frame, self._pending_count = None, 0
+                self._save()
+        else:
+            self._pending_frame, self._pending_count = None, 0
+
+        self._unrecognized_count = 0 if recognized else self._unrecognized_count + 1
+        if self._unrecognized_count == CONFIRM_CYCLES:
+            self._send_alert(
+                f"⚠️ <b>CROUS page not recognized</b>\n\n"
+                f"No rooms and no 'no results' message for {CONFIRM_CYCLES} checks in a row. "
+                f"The website structure may have changed."
+            )
+        return report
+
+    def relearn(self, soup) -> Optional[str]:
+        """Try to learn a new card selector from the page; cache it if found"""
+        return self.adopt_selector(learn_selector(soup))
+
+    def adopt_selector(self, selector: Optional[str]) -> Optional[str]:
+        """Cache a selector learned elsewhere (a parse worker)"""
+        if selector and selector != self.selector:
+            logger.warning("Learned new room selector: %s", selector)
+            self.state['learned_selector'] = selector
+            self._save()
+        return selector
@@ -0,0 +1,198 @@
+"""
+The check engine: source -> dedup -> notifier
+"""
+
+import logging
+import time
+from typing import Optional, Dict, Any, List, Set, Iterator
+
+from . import tracing
+from .clustering import ClusterIndex
+from .dedup import SeenStore
+from .models import Room
+from .normalization import RoomFilter
+from .notify import format_room_message
+from .priority import PriorityLane
+from .sources import empty_result, merge_results
+
+logger = logging.getLogger(__name__)
+
+
+class CrousChecker:
+    """CROUS room availability checker"""
+
+    def __init__(self, source, notifier, seen: Optional[SeenStore] = None, area_name: str = 'Rennes',
+                 router=None, room_filter: Optional[RoomFilter] = None, clusters: Optional[ClusterIndex] = None,
+                 priority: Optional[PriorityLane] = None):
+        self.source = source
+        self.notifier = notifier
+        # Fingerprints of previously found rooms, to avoid duplicate notifications
+        self.seen = seen if seen is not None else SeenStore()
+        self.area_name = area_name
+        # Splits one wide-area result between subscriber regions (geo.RegionRouter)
+        self.router = router
+        # Numeric filter every new room must pass before it is alerted (settings.room_filter)
+        self.room_filter = room_filter
+        # Near-duplicate clusters: one alert per cluster rather than per card text
+        self.clusters = clusters
+        # Urgent filters, checked on each room as it is extracted and alerted ahead of everything else
+        self.priority = priority
+        # Cluster fingerprint -> chats already alerted through the priority lane this cycle
+        self._urgent_sent: Dict[int, Set[str]] = {}
+        # fingerprint -> cluster of the rooms seen this cycle
+        self._room_clusters: Dict[int, int] = {}
+        # Summary of the last cycle, for the status endpoint
+        self.stats: Dict[str, Any] = {'cycles': 0, 'last_check_at': None, 'last_duration_ms': None,
+                                      'last_rooms': 0, 'last_error': None, 'notified_rooms': 0, 'urgent_rooms': 0}
+
+    def _notify(self, rooms: List[Room], area_name: str, chat_ids: Optional[list] = None) -> bool:
+        if any(room.fingerprint in self._urgent_sent for room in rooms):
+            # Chats already alerted through the priority lane only get the other rooms
+            groups: Dict[tuple, tuple] = {}
+            for chat_id in chat_ids or self.priority.all_chat_ids():
+                rest = [room for room in rooms if str(chat_id) not in self._urgent_sent.get(room.fingerprint, ())]
+                if rest:
+                    groups.setdefault(tuple(room.fingerprint for room in rest), (rest, []))[1].append(chat_id)
+            sent = True
+            for rest, group_chat_ids in groups.values():
+                sent = self._send_rooms(rest, area_name, group_chat_ids) and sent
+            return sent
+        return self._send_rooms(rooms, area_name, chat_ids)
+
+    def _send_rooms(self, rooms: List[Room], area_name: str, chat_ids: Optional[list] = None) -> bool:
+        if hasattr(self.notifier, 'notify_rooms'):
+            # Coalescing notifier: formats per chat (alert or digest)
+            return self.notifier.notify_rooms(rooms, area_name, chat_ids=chat_ids)
+        return self.notifier.send_message(format_room_message(rooms, area_name), chat_ids=chat_ids)
+
+    def _notify_new_rooms(self, rooms: List[Room], query_boxes=None) -> bool:
+        if self.room_filter is not None:
+            matching = [room for room in rooms if self.room_filter.matches(room)]
+            if len(matching) < len(rooms):
+                logger.info("%s of %s new room(s) left out by room_filter", len(rooms) - len(matching), len(rooms))
+            if not matching:
+                return True
+            rooms = matching
+        if self.router is None or not len(self.router.index):
+            return self._notify(rooms, self.area_name)
+        sent = True
+        with tracing.span('route'):
+            deliveries = self.router.route(rooms, self.area_name, query_boxes)
+        for area_name, region_rooms, chat_ids in deliveries:
+            sent = self._notify(region_rooms, area_name, chat_ids) and sent
+        return sent
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        """Apply reloaded settings to the running checker"""
+        self.area_name = settings['area_name']
+        self.room_filter = RoomFilter.from_config(settings['room_filter'])
+        self.source.apply_settings(settings)
+        if self.router is not None:
+            self.router.apply_settings(settings)
+        if self.priority is not None:
+            self.priority.apply_settings(settings)
+
+    def _check_urgent(self, room: Room) -> None:
+        """Alert a room matching an urgent filter right away (called as rooms are extracted)"""
+        chats = self.priority.recipients(room)
+        if not chats or (self.room_filter is not None and not self.room_filter.matches(room)):
+            return
+        # Indexed now, so a near-duplicate card further down the page joins its cluster
+        cluster = self._cluster_of(room)
+        if cluster in self._urgent_sent or self.seen.has_fingerprint(cluster):
+            return
+        with tracing.span('urgent'):
+            self.priority.send(room, chats)
+        self._urgent_sent[cluster] = set(chats)
+        self.stats['urgent_rooms'] += 1
+        logger.info("🚨 Priority alert: %s at %s for %s chat(s)", room.type.label, room.location, len(chats))
+
+    def _cluster_of(self, room: Room) -> int:
+        """The room's cluster, computed once per cycle"""
+        if self.clusters is None:
+            return room.fingerprint
+        cluster = self._room_clusters.get(room.fingerprint)
+        if cluster is None:
+            cluster = self._room_clusters[room.fingerprint] = self.clusters.cluster_of(room)
+        return cluster
+
+    def check_and_notify(self) -> Dict[str, Any]:
+        """Check for room availability and send notifications if found"""
+        started_at = time.time()
+        start = time.perf_counter()
+        with tracing.TRACER.cycle():
+            result = self._check_and_notify()
+        self.stats.update(cycles=self.stats['cycles'] + 1, last_check_at=started_at,
+                          last_duration_ms=round((time.perf_counter() - start) * 1000, 1),
+                          last_rooms=result['total_count'], last_error=result.get('error'))
+        return result
+
+    def _check_and_notify(self) -> Dict[str, Any]:
+        results = []
+        self._urgent_sent = {}
+        self._room_clusters = {}
+        if hasattr(self.source, 'on_room'):
+            self.source.on_room = self._check_urgent if self.priority is not None else None
+        if self.priority is not None:
+            self.priority.warm_up()
+        try:
+            logger.info("Checking CROUS room availability...")
+
+            # Sources with several searches hand over each one's rooms as soon as they are parsed
+            fetch_iter = getattr(self.source, 'fetch_iter', None)
+            partials = fetch_iter() if fetch_iter else self._fetch_once()
+            while True:
+                with tracing.span('fetch'):
+                    result = next(partials, None)
+                if result is None:
+                    break
+                results.append(result)
+                self._handle_result(result)
+
+            fetcher = getattr(self.source, 'fetcher', None)
+            if fetcher is not None:
+                logger.debug("Fetch stats: %s", fetcher.stats())
+
+        except Exception as e:
+            logger.error("Error during availability check: %s", e)
+        return merge_results(results) if results else empty_result()
+
+    def _fetch_once(self) -> Iterator[Dict[str, Any]]:
+        """The single fetch of sources without fetch_iter, made when the 'fetch' span asks for it"""
+        yield self.source.fetch()
+
+    def _handle_result(self, result: Dict[str, Any]) -> None:
+        """Notify the new rooms of one (partial) result"""
+        if result['available'] and result['rooms']:
+            rooms = result['rooms']
+            if self.priority is not None:
+                # Sources without an extraction hook (and parse processes) hand rooms over here
+                for room in rooms:
+                    self._check_urgent(room)
+            if self.clusters is not None:
+                with tracing.span('cluster'):
+                    rooms = self.clusters.collapse(rooms, self._room_clusters)
+                if len(rooms) < len(result['rooms']):
+                    logger.debug("%s card(s) are near-duplicates of another", len(result['rooms']) - len(rooms))
+
+            # Check for new rooms to avoid duplicate notifications
+            with tracing.span('dedup'):
+                new_rooms = self.seen.filter_new(rooms)
+
+            if new_rooms:
+                with tracing.span('notify'):
+                    sent = self._notify_new_rooms(new_rooms, result.get('query_boxes'))
+
+                if sent:
+                    # A queueing notifier has only accepted the alert: it retries the send on its own
+                    logger.info("Found %s new room(s), notification %s!", len(new_rooms),
+                                'queued' if getattr(self.notifier, 'asynchronous', False) else 'sent')
+                    self.stats['notified_rooms'] += len(new_rooms)
+                    with tracing.span('mark'):
+                        self.seen.mark(rooms)
+                else:
+                    logger.error("Failed to send notification")
+            else:
+                logger.info("Found %s room(s), but all were already notified", len(result['rooms']))
+        else:
+            logger.info("No rooms available")
@@ -0,0 +1,355 @@
+"""
+Room extraction from CROUS search result pages
+
+Two front-ends share the same per-card parsing:
+- iter_rooms_from_soup: walks a fully built BeautifulSoup DOM
+- iter_rooms_streaming: feeds body chunks to lxml's HTMLPullParser and yields
+  each room as soon as its card closes, stopping once the results container ends
+
+Both are generators so callers can act on the first room before the page is done.
+"""
+
+import codecs
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple
+
+from . import tracing
+from .clustering import card_features, simhash
+from .models import Room, make_fingerprint
+from .normalization import normalize_card
+
+logger = logging.getLogger(__name__)
+
+# Class keywords for each way of locating room cards, in order of preference
+CARD_KEYWORDS = ['logement', 'accommodation', 'room', 'residence', 'housing']
+ROW_KEYWORDS = ['logement', 'result', 'row']
+ITEM_KEYWORDS = ['logement', 'accommodation', 'result']
+CONTAINER_KEYWORDS = ['results', 'resultats', 'listings', 'accommodations']
+
+SKIP_WORDS = [
+    'navigation', 'menu', 'header', 'footer', 'cookies', 'rgpd',
+    'filtrer', 'recherche', 'tri', 'page', 'résultat'
+]
+
+NO_RESULTS_INDICATORS = [
+    'aucun résultat', 'no results', 'pas de logement', 'aucun logement',
+    'recherche vide', 'aucune offre'
+]
+
+# Price-like text: how drift detection recognizes room cards (extraction uses normalization.py)
+PRICE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'(\d{2,4})\s*€',
+    r'(\d{2,4})\s*euros?',
+    r'€\s*(\d{2,4})',
+    r'prix.*?(\d{2,4})',
+    r'loyer.*?(\d{2,4})'
+]]
+
+RESIDENCE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in [
+    r'(résidence[^0-9€\n]+)',
+    r'(campus[^0-9€\n]+)',
+    r'(\d+\s+[^0-9€\n]{10,50})',
+    r'([A-Z][a-z]+\s+[A-Z][a-z]+)'
+]]
+
+# Attribute pairs that carry a card's map position (the search page's map markers)
+COORDINATE_ATTRIBUTES = [('data-lat', 'data-lng'), ('data-lat', 'data-lon'), ('data-latitude', 'data-longitude')]
+
+
+def class_matches(class_value: Optional[str], keywords: list) -> bool:
+    """True if any keyword appears in the (lower-cased) class attribute"""
+    if not class_value:
+        return False
+    class_value = class_value.lower()
+    return any(keyword in class_value for keyword in keywords)
+
+
+def selector_matches(selector: str, tag: str, class_value: Optional[str]) -> bool:
+    """Check a learned 'tag.class1.class2' selector against an element's tag and class attribute"""
+    sel_tag, *sel_classes = selector.split('.')
+    if tag != sel_tag:
+        return False
+    classes = set((class_value or '').split())
+    return all(c in classes for c in sel_classes)
+
+
+def has_no_results(page_text: str) -> bool:
+    """True if the page explicitly says there are no accommodations"""
+    page_text = page_text.lower()
+    return any(indicator in page_text for indicator in NO_RESULTS_INDICATORS)
+
+
+def element_coordinates(elem) -> Optional[Tuple[float, float]]:
+    """(lon, lat) from map-marker attributes on a card or its descendants (BeautifulSoup or lxml)"""
+    descendants = elem.find_all(True) if hasattr(elem, 'find_all') else elem.iterdescendants()
+    for node in (elem, *descendants):
+        for lat_attr, lon_attr in COORDINATE_ATTRIBUTES:
+            lat, lon = node.get(lat_attr), node.get(lon_attr)
+            if lat and lon:
+                try:
+                    return float(lon), float(lat)
+                except ValueError:
+                    continue
+    return None
+
+
+def card_texts(parts: Iterable[str]) -> Tuple[str, str]:
+    """
+    (text, key) of a card from its stripped text nodes. The text keeps the
+    nodes apart ("Studio 16 m² 301 €") so words and numbers stay separate for
+    parsing; the key joins them as get_text(strip=True) did, which is what
+    fingerprints have always been computed from.
+    """
+    parts = list(parts)
+    return ' '.join(parts), ''.join(parts)
+
+
+def parse_room_text(room_text: str, url: str, default_location: str = 'Rennes',
+                    coordinates: Optional[Tuple[float, float]] = None,
+                    key: Optional[str] = None) -> Optional[Room]:
+    """
+    Turn the text of one room card into a Room, or None if it is not a
+    listing. `key` is the text the fingerprint is computed from (default: the
+    text itself).
+    """
+    # Skip empty or very short elements
+    if len(room_text) < 20:
+        return None
+
+    # Skip navigation, menu, or header elements
+    lowered = room_text.lower()
+    if any(skip_word in lowered for skip_word in SKIP_WORDS):
+        return None
+
+    # Rent range, surface and type as numbers (rooms should have prices)
+    fields = normalize_card(room_text)
+
+    # If no price found, this might not be a room listing
+    if not fields.rent_min_cents:
+        return None
+
+    # Create a unique identifier based on price and card text
+    fingerprint = make_fingerprint((room_text if key is None else key)[:100])
+    unique_id = f"{fields.rent_min_cents // 100}_{fingerprint % 10000}"
+
+    # Extract location (look for residence names or addresses)
+    location = default_location
+    for pattern in RESIDENCE_PATTERNS:
+        location_match = pattern.search(room_text)
+        if location_match:
+            potential_location = location_match.group(1).strip()
+            if len(potential_location) > 5 and '€' not in potential_location:
+                location = potential_location[:50]
+                break
+
+    signature = simhash(card_features(room_text, fields.type, fields.rent_min_cents, fields.area_m2, location))
+    return Room(
+        id=unique_id,
+        type=fields.type,
+        location=location,
+        rent_cents=fields.rent_min_cents,
+        available_date=datetime.now().strftime('%Y-%m-%d'),
+        url=url,
+        fingerprint=fingerprint,
+        region=default_location,
+        lon=coordinates[0] if coordinates else None,
+        lat=coordinates[1] if coordinates else None,
+        rent_max_cents=fields.rent_max_cents if fields.rent_max_cents > fields.rent_min_cents else 0,
+        charges_included=fields.charges_included,
+        area_m2=fields.area_m2,
+        rent_confidence=fields.rent_confidence,
+        area_confidence=fields.area_confidence,
+        type_confidence=fields.type_confidence,
+        simhash=signature
+    )
+
+
+def _unique_rooms(cards: Iterable[Tuple[str, Optional[Tuple[float, float]], str]], url: str,
+                  default_location: str) -> Iterator[Room]:
+    """Parse (text, coordinates, key) cards and yield each distinct room once"""
+    fingerprints_seen = set()
+    for i, (room_text, coordinates, key) in enumerate(cards):
+        start = time.perf_counter_ns()
+        try:
+            room = parse_room_text(room_text, url, default_location, coordinates, key)
+        except Exception as e:
+            logger.warning("Error parsing room element %s: %s", i, e)
+            continue
+        finally:
+            tracing.add('regex', time.perf_counter_ns() - start)
+        if room is None or room.fingerprint in fingerprints_seen:
+            continue
+        fingerprints_seen.add(room.fingerprint)
+        logger.info("Found unique room: %s in %s for %s", room.type.label, room.location, room.rent,
+                    extra={'stage': 'extract'})
+        yield room
+
+
+def find_room_elements(soup, selector: Optional[str] = None) -> list:
+    """Locate candidate room cards in a parsed page, trying each layout in turn"""
+    # Fast path: the selector learned by the drift detector after a redesign
+    if selector:
+        room_elements = soup.select(selector)
+        if room_elements:
+            return room_elements
+
+    # Method 1: accommodation cards/items
+    room_elements = soup.find_all(['div', 'article'], class_=lambda x: class_matches(x, CARD_KEYWORDS))
+
+    # Method 2: table rows with accommodation data
+    if not room_elements:
+        room_elements = soup.find_all('tr', class_=lambda x: class_matches(x, ROW_KEYWORDS))
+
+    # Method 3: list items
+    if not room_elements:
+        room_elements = soup.find_all('li', class_=lambda x: class_matches(x, ITEM_KEYWORDS))
+
+    # Method 4: every block inside the results container
+    if not room_elements:
+        results_container = soup.find(['div', 'section'], class_=lambda x: class_matches(x, CONTAINER_KEYWORDS))
+        if results_container:
+            room_elements = results_container.find_all(['div', 'article', 'li'])
+
+    return room_elements
+
+
+def iter_rooms_from_soup(soup, url: str, stats: Optional[Dict[str, Any]] = None,
+                         default_location: str = 'Rennes', selector: Optional[str] = None) -> Iterator[Room]:
+    """Yield rooms from a fully parsed BeautifulSoup document"""
+    stats = stats if stats is not None else {}
+    with tracing.span('page_text'):
+        page_text = soup.get_text()
+        stats['page_text_length'] = len(page_text)
+        stats['no_results'] = has_no_results(page_text)
+        # The generator lives until its last card: do not hold the whole page's text meanwhile
+        del page_text
+
+    with tracing.span('select'):
+        room_elements = find_room_elements(soup, selector)
+    stats['elements'] = len(room_elements)
+    logger.info("Found %s potential room elements", len(room_elements))
+
+    yield from _unique_rooms((soup_card(elem) for elem in room_elements), url, default_location)
+
+
+def soup_card(elem) -> Tuple[str, Optional[Tuple[float, float]], str]:
+    """(text, coordinates, key) of a BeautifulSoup card element"""
+    text, key = card_texts(elem.stripped_strings)
+    return text, element_coordinates(elem), key
+
+
+def _element_card(elem) -> Tuple[str, Optional[Tuple[float, float]], str]:
+    """soup_card() for an lxml element"""
+    text, key = card_texts(t.strip() for t in elem.itertext() if t.strip())
+    return text, element_coordinates(elem), key
+
+
+def iter_rooms_streaming(chunks: Iterable[bytes], url: str, stats: Optional[Dict[str, Any]] = None,
+                         default_location: str = 'Rennes', encoding: str = 'utf-8',
+                         selector: Optional[str] = None) -> Iterator[Room]:
+    """
+    Yield rooms while the body is still downloading.
+
+    Cards matching the primary layout are emitted as soon as their closing tag
+    is parsed. Rows, list items and the results container are kept as fallbacks
+    for when the page has no primary cards. Elements outside any card or
+    container are discarded as soon as they close to keep the tree small.
+    Stops reading chunks once the results container closes. A learned
+    selector, when given, is treated as one more primary card pattern.
+    """
+    from lxml import etree
+
+    stats = stats if stats is not None else {}
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+    fallback_rows, fallback_items = [], []
+    results_container = None
+    open_keep = 0  # number of currently open cards/containers whose subtree we must keep
+    card_count = 0
+    bytes_read = 0
+    no_results = False
+    tail = ''
+    # Incremental: a character split across two chunks is decoded once both are in
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+    def cards():
+        nonlocal results_container, open_keep, card_count, bytes_read, no_results, tail
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # Look for "no results" messages in the raw text (with overlap across chunks)
+            decoded = tail + decoder.decode(chunk)
+            no_results = no_results or has_no_results(decoded)
+            tail = decoded[-32:]
+            bytes_read += len(chunk)
+
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                tag = elem.tag if isinstance(elem.tag, str) else ''
+                class_value = elem.get('class')
+                is_card = (
+                    (tag in ('div', 'article') and class_matches(class_value, CARD_KEYWORDS))
+                    or (selector is not None and selector_matches(selector, tag, class_value))
+                )
+                keep = (
+                    is_card
+                    or (tag == 'tr' and class_matches(class_value, ROW_KEYWORDS))
+                    or (tag == 'li' and class_matches(class_value, ITEM_KEYWORDS))
+                    or (results_container is None and tag in ('div', 'section')
+                        and class_matches(class_value, CONTAINER_KEYWORDS))
+                )
+
+                if event == 'start':
+                    if keep:
+                        open_keep += 1
+                    continue
+
+                if not keep:
+                    if open_keep == 0:
+                        # Outside any card: free the subtree and any processed siblings
+                        elem.clear()
+                        parent = elem.getparent()
+                        while parent is not None and elem.getprevious() is not None:
+                            del parent[0]
+                    continue
+
+                open_keep -= 1
+                if is_card:
+                    card_count += 1
+                    yield _element_card(elem)
+                elif tag == 'tr':
+                    fallback_rows.append(_element_card(elem))
+                elif tag == 'li':
+                    fallback_items.append(_element_card(elem))
+
+                if tag in ('div', 'section') and class_matches(class_value, CONTAINER_KEYWORDS) \
+                        and results_container is None:
+                    results_container = elem
+                    stats['stopped_early'] = True
+                    return
+
+        parser.close()
+
+    yield from _unique_rooms(cards(), url, default_location)
+
+    if card_count == 0:
+        # Same fallback order as find_room_elements
+        if fallback_rows:
+            fallback = fallback_rows
+        elif fallback_items:
+            fallback = fallback_items
+        elif results_container is not None:
+            fallback = [_element_card(e) for e in results_container.iter('div', 'article', 'li')
+                        if e is not results_container]
+        else:
+            fallback = []
+        card_count = len(fallback)
+        yield from _unique_rooms(fallback, url, default_location)
+
+    stats['elements'] = card_count
+    stats['bytes_read'] = bytes_read
+    stats['no_results'] = no_results
+    stats.setdefault('stopped_early', False)
+    logger.info("Found %s potential room elements (streaming)", card_count)
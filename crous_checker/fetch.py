@@ -0,0 +1,375 @@
+"""
+Resilient HTTP fetch layer shared by the CROUS scraper and the Telegram client
+
+Wraps a pooled requests.Session with jittered exponential retries bounded by a
+time budget, and a circuit breaker per host so we stop hammering a site that is down.
+An optional httpx backend adds HTTP/2 multiplexing and brotli/zstd decoding.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying: rate limiting and transient server/proxy failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Methods safe to send twice. Other requests (a Telegram sendMessage POST) may have reached the
+# server when the response times out or the connection drops, so they are only retried when the
+# connection never opened (see never_sent())
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'TRACE'}
+
+BROWSER_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/141.0.0.0 Safari/537.36'
+)
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised when a request is refused because the host's circuit breaker is open"""
+
+
+class ConnectFailed(requests.exceptions.ConnectionError):
+    """The connection could not be opened (httpx backend): nothing was sent"""
+
+
+def never_sent(error: Exception) -> bool:
+    """
+    True if the request failed before reaching the server: a connect timeout,
+    a DNS failure or a refused connection (urllib3's NewConnectionError,
+    NameResolutionError is a subclass), so resending it cannot duplicate it
+    """
+    if isinstance(error, (requests.exceptions.ConnectTimeout, ConnectFailed)):
+        return True
+    cause = error.args[0] if error.args else None
+    # requests wraps the urllib3 error in a MaxRetryError whose reason is the cause
+    return isinstance(getattr(cause, 'reason', cause), NewConnectionError)
+
+
+class HttpxResponse:
+    """Minimal requests.Response look-alike around an httpx.Response"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    @property
+    def content(self) -> bytes:
+        return self._response.content
+
+    @property
+    def text(self) -> str:
+        return self._response.text
+
+    def json(self) -> Any:
+        return self._response.json()
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"{self.status_code} for url: {self.url}", response=self)
+
+    def iter_content(self, chunk_size: int = 16384):
+        return self._response.iter_bytes(chunk_size)
+
+    def close(self) -> None:
+        self._response.close()
+
+    @property
+    def wire_bytes(self) -> int:
+        return self._response.num_bytes_downloaded
+
+
+class HttpxSession:
+    """
+    requests.Session-compatible wrapper around an HTTP/2 httpx.Client.
+
+    Concurrent requests to the same host share one multiplexed connection, and
+    brotli/zstd bodies are decoded when the matching packages are installed.
+    httpx errors are re-raised as their requests equivalents so the retry
+    logic and callers only ever deal with one exception hierarchy.
+    """
+
+    def __init__(self, http2: bool = True):
+        import httpx
+        self._httpx = httpx
+        # httpx logs every request at INFO, which would drown out the checker's own logs
+        logging.getLogger('httpx').setLevel(logging.WARNING)
+        self.client = httpx.Client(http2=http2, follow_redirects=True)
+        self.headers = self.client.headers
+
+    def request(self, method: str, url: str, timeout=None, stream: bool = False, **kwargs) -> HttpxResponse:
+        httpx = self._httpx
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        try:
+            request = self.client.build_request(method, url, timeout=timeout, **kwargs)
+            return HttpxResponse(self.client.send(request, stream=stream))
+        except httpx.ConnectTimeout as e:
+            raise requests.exceptions.ConnectTimeout(str(e))
+        except httpx.ConnectError as e:
+            raise ConnectFailed(str(e))
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        except httpx.HTTPError as e:
+            raise requests.exceptions.RequestException(str(e))
+
+    def close(self) -> None:
+        self.client.close()
+
+
+def make_session(backend: str = 'requests'):
+    """Create the HTTP session for the given backend ('requests' or 'httpx')"""
+    if backend == 'httpx':
+        try:
+            return HttpxSession(http2=True)
+        except ImportError as e:
+            logger.warning("httpx backend unavailable (%s), falling back to requests. "
+                           "Install it with: pip install -r requirements-fast.txt", e)
+    return requests.Session()
+
+
+def wire_bytes(response) -> int:
+    """Bytes actually transferred for a response body (before decompression)"""
+    if isinstance(response, HttpxResponse):
+        return response.wire_bytes
+    raw = getattr(response, 'raw', None)
+    if raw is not None and hasattr(raw, 'tell'):
+        try:
+            return raw.tell()
+        except (OSError, ValueError):
+            pass
+    return len(response.content)
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker (closed -> open -> half-open -> closed). Half-open
+    lets one probe request through at a time; a probe that never reports back
+    is given up on after `reset_timeout`.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 120.0,
+                 on_transition=None):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.on_transition = on_transition
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # When the half-open probe in flight was let through (None: no probe in flight)
+        self.probe_started: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str) -> None:
+        if state == self.state:
+            return
+        old_state, self.state = self.state, state
+        logger.warning("Circuit breaker for %s: %s -> %s", self.host, old_state, state)
+        if self.on_transition:
+            self.on_transition(self.host, old_state, state)
+
+    def allow(self) -> bool:
+        """Return True if a request to this host may be attempted now"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            elif self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+                # Half-open with a probe in flight: the others wait for its outcome
+                return False
+            self.probe_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.probe_started = None
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.probe_started = None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+
+class ResilientFetcher:
+    """HTTP client with retries, backoff, timeouts and per-host circuit breakers"""
+
+    def __init__(self, session=None,
+                 connect_timeout: float = 5.0, read_timeout: float = 15.0,
+                 max_retries: int = 4, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 120.0):
+        self.session = session or requests.Session()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._no_more_retries = threading.Event()
+        self.counters = {
+            'requests': 0,
+            'retries': 0,
+            'failures': 0,
+            'circuit_rejections': 0,
+            'breaker_transitions': 0,
+        }
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> 'ResilientFetcher':
+        """Build a fetcher from the 'settings' section of the configuration"""
+        return cls(
+            session=make_session(settings.get('http_backend', 'requests')),
+            connect_timeout=float(settings.get('connect_timeout_seconds', 5)),
+            read_timeout=float(settings.get('read_timeout_seconds', 15)),
+            max_retries=int(settings.get('max_retries', 4)),
+            failure_threshold=int(settings.get('breaker_failure_threshold', 5)),
+            reset_timeout=float(settings.get('breaker_reset_seconds', 120)),
+        )
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        """Apply reloaded timeout/retry settings (a backend change needs a restart)"""
+        self.connect_timeout = float(settings.get('connect_timeout_seconds', self.connect_timeout))
+        self.read_timeout = float(settings.get('read_timeout_seconds', self.read_timeout))
+        self.max_retries = int(settings.get('max_retries', self.max_retries))
+        self.failure_threshold = int(settings.get('breaker_failure_threshold', self.failure_threshold))
+        self.reset_timeout = float(settings.get('breaker_reset_seconds', self.reset_timeout))
+        with self._lock:
+            for breaker in self._breakers.values():
+                breaker.failure_threshold = self.failure_threshold
+                breaker.reset_timeout = self.reset_timeout
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += amount
+
+    def _on_transition(self, host: str, old_state: str, new_state: str) -> None:
+        self._count('breaker_transitions')
+
+    def breaker_for(self, url: str) -> CircuitBreaker:
+        """Return the circuit breaker for the host of the given URL"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(host, self.failure_threshold, self.reset_timeout,
+                                         on_transition=self._on_transition)
+                self._breakers[host] = breaker
+            return breaker
+
+    def _backoff_delay(self, attempt: int, response) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when present"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, budget: Optional[float] = None, **kwargs):
+        """
+        Send a request, retrying transient failures until max_retries or the
+        time budget (in seconds) runs out. Retryable HTTP statuses are returned
+        as-is after the last attempt so callers can still raise_for_status().
+        Non-idempotent methods (POST) are only retried when the request never left: the
+        connection could not be opened (timeout, DNS failure, refused).
+        """
+        breaker = self.breaker_for(url)
+        deadline = time.monotonic() + budget if budget else None
+        last_error: Optional[Exception] = None
+        explicit_timeout = kwargs.pop('timeout', None)
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                self._count('circuit_rejections')
+                raise CircuitOpenError(f"Circuit open for {breaker.host}, skipping request")
+
+            read_timeout = self.read_timeout
+            if deadline is not None:
+                read_timeout = max(1.0, min(read_timeout, deadline - time.monotonic()))
+            timeout = explicit_timeout or (self.connect_timeout, read_timeout)
+
+            response = None
+            retryable = True
+            self._count('requests')
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+                last_error = requests.exceptions.HTTPError(
+                    f"{response.status_code} for url: {url}", response=response)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last_error = e
+                retryable = method.upper() in IDEMPOTENT_METHODS or never_sent(e)
+
+            self._count('failures')
+            breaker.record_failure()
+
+            if not retryable:
+                logger.warning("Not retrying %s %s after %s: it may have been received", method, url, last_error)
+                break
+            if attempt == self.max_retries:
+                break
+            delay = self._backoff_delay(attempt, response)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                logger.warning("Retry budget exhausted for %s after %s attempt(s)", url, attempt + 1)
+                break
+
+            self._count('retries')
+            logger.info("Transient error on %s %s (%s), retrying in %.1fs", method, url, last_error, delay)
+            if response is not None:
+                # A streamed body holds its pooled connection until closed
+                response.close()
+                response = None
+            if self._no_more_retries.wait(delay):
+                logger.info("Shutting down, not retrying %s", url)
+                break
+
+        if response is not None:
+            return response
+        raise last_error
+
+    def stop_retrying(self) -> None:
+        """Shutdown: finish the attempts in progress but make no further retries"""
+        self._no_more_retries.set()
+
+    def get(self, url: str, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry counters and the current state of every breaker"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['breakers'] = {host: b.state for host, b in self._breakers.items()}
+        return stats
@@ -0,0 +1,466 @@
+"""
+Geographic regions, a spatial index over them, and geocoding of listings
+
+Subscribers describe the area they care about as a bounding box (the CROUS
+`bounds=` format or [west, south, east, north]) or a polygon. Overlapping and
+nearby areas are merged into a few covering searches; each listing is placed on the map once, from the
+coordinates on its card or by geocoding its residence name, and a grid index
+finds every region that contains it.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple, Callable, Iterable
+from urllib.parse import urlsplit, parse_qs
+
+from .models import Room
+from .normalization import RoomFilter
+
+logger = logging.getLogger(__name__)
+
+SEARCH_URL = 'https://trouverunlogement.lescrous.fr/tools/41/search'
+
+GEOCODER_URL = 'https://api-adresse.data.gouv.fr/search/'
+
+# Geocoder matches scoring below this are treated as "not found"
+MIN_GEOCODE_SCORE = 0.4
+
+Point = Tuple[float, float]  # (lon, lat)
+
+
+class BBox(NamedTuple):
+    """Axis-aligned box in degrees"""
+    west: float
+    south: float
+    east: float
+    north: float
+
+    @classmethod
+    def from_bounds(cls, bounds: str) -> 'BBox':
+        """Parse the CROUS 'lon_lat_lon_lat' bounds parameter (two opposite corners)"""
+        lon1, lat1, lon2, lat2 = (float(v) for v in bounds.split('_'))
+        return cls(min(lon1, lon2), min(lat1, lat2), max(lon1, lon2), max(lat1, lat2))
+
+    def to_bounds(self) -> str:
+        """The CROUS bounds parameter: north-west corner, then south-east corner"""
+        return f"{self.west:.7f}_{self.north:.7f}_{self.east:.7f}_{self.south:.7f}"
+
+    @property
+    def width(self) -> float:
+        return max(0.0, self.east - self.west)
+
+    @property
+    def height(self) -> float:
+        return max(0.0, self.north - self.south)
+
+    @property
+    def area(self) -> float:
+        return self.width * self.height
+
+    def contains(self, lon: float, lat: float) -> bool:
+        return self.west <= lon <= self.east and self.south <= lat <= self.north
+
+    def intersects(self, other: 'BBox') -> bool:
+        return not (other.west > self.east or other.east < self.west
+                    or other.south > self.north or other.north < self.south)
+
+    def contains_box(self, other: 'BBox') -> bool:
+        return (self.west <= other.west and other.east <= self.east
+                and self.south <= other.south and other.north <= self.north)
+
+    def union(self, other: 'BBox') -> 'BBox':
+        return BBox(min(self.west, other.west), min(self.south, other.south),
+                    max(self.east, other.east), max(self.north, other.north))
+
+    def intersection_area(self, other: 'BBox') -> float:
+        width = min(self.east, other.east) - max(self.west, other.west)
+        height = min(self.north, other.north) - max(self.south, other.south)
+        return width * height if width > 0 and height > 0 else 0.0
+
+    def quadrants(self) -> List['BBox']:
+        lon = (self.west + self.east) / 2
+        lat = (self.south + self.north) / 2
+        return [BBox(self.west, lat, lon, self.north), BBox(lon, lat, self.east, self.north),
+                BBox(self.west, self.south, lon, lat), BBox(lon, self.south, self.east, lat)]
+
+    @property
+    def bbox(self) -> 'BBox':
+        return self
+
+
+class Polygon:
+    """Simple polygon given as (lon, lat) vertices"""
+
+    __slots__ = ('points', 'bbox')
+
+    def __init__(self, points: Iterable[Point]):
+        self.points = [(float(lon), float(lat)) for lon, lat in points]
+        if len(self.points) < 3:
+            raise ValueError("a polygon needs at least 3 points")
+        lons = [p[0] for p in self.points]
+        lats = [p[1] for p in self.points]
+        self.bbox = BBox(min(lons), min(lats), max(lons), max(lats))
+
+    def contains(self, lon: float, lat: float) -> bool:
+        """Even-odd ray casting"""
+        if not self.bbox.contains(lon, lat):
+            return False
+        inside = False
+        points = self.points
+        j = len(points) - 1
+        for i in range(len(points)):
+            xi, yi = points[i]
+            xj, yj = points[j]
+            if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+                inside = not inside
+            j = i
+        return inside
+
+
+# Areas that can be referred to by name alone in the configuration
+KNOWN_AREAS = {
+    'nice': BBox.from_bounds('7.1819535_43.7607635_7.323912_43.6454189'),
+    'rennes': BBox.from_bounds('-1.7525876_48.1549705_-1.6244045_48.0769155'),
+}
+
+
+class Region:
+    """A named area, the chats subscribed to it (empty: every recipient) and their room filter"""
+
+    __slots__ = ('name', 'shape', 'chat_ids', 'filter')
+
+    def __init__(self, name: str, shape, chat_ids: Optional[List[str]] = None,
+                 filter: Optional[RoomFilter] = None):
+        self.name = name
+        self.shape = shape
+        self.chat_ids = [str(id) for id in chat_ids or []]
+        self.filter = filter
+
+    @property
+    def bbox(self) -> BBox:
+        return self.shape.bbox
+
+    def contains(self, lon: float, lat: float) -> bool:
+        return self.shape.contains(lon, lat)
+
+    @classmethod
+    def from_config(cls, data: Dict[str, Any]) -> 'Region':
+        """
+        {"name": ..., "chat_ids": [...], and one of "bounds": "lon_lat_lon_lat",
+        "bbox": [west, south, east, north] or "polygon": [[lon, lat], ...]};
+        a known area ("Nice", "Rennes") needs only its name. An optional
+        "filter" ({"max_rent": 450, ...}, see RoomFilter) narrows its rooms.
+        """
+        name = data['name']
+        if 'polygon' in data:
+            shape = Polygon(data['polygon'])
+        elif 'bbox' in data:
+            shape = BBox(*(float(v) for v in data['bbox']))
+        elif 'bounds' in data:
+            shape = BBox.from_bounds(data['bounds'])
+        elif name.lower() in KNOWN_AREAS:
+            shape = KNOWN_AREAS[name.lower()]
+        else:
+            raise ValueError(f"region {name!r} needs bounds, bbox or polygon")
+        if shape.bbox.west > shape.bbox.east or shape.bbox.south > shape.bbox.north:
+            raise ValueError(f"region {name!r} has an empty box")
+        return cls(name, shape, data.get('chat_ids'), RoomFilter.from_config(data.get('filter')))
+
+    def __repr__(self) -> str:
+        return f"Region({self.name!r}, {self.bbox.to_bounds()})"
+
+
+def parse_regions(items: List[Any]) -> List[Region]:
+    """Regions from the configuration; a plain string names a known area"""
+    return [Region.from_config({'name': item} if isinstance(item, str) else item) for item in items]
+
+
+def plan_queries(regions: Iterable[Region], max_span: float = 0.5, min_fill: float = 0.5) -> List[BBox]:
+    """
+    Merge the regions' boxes into few search boxes. Boxes inside another are
+    dropped; then the pair whose union is best filled by actual regions is
+    merged, as long as the union spans at most `max_span` degrees each way (so
+    one search stays under the site's result cap) and at least `min_fill` of
+    it is region rather than empty space in between. The number of searches
+    then follows the covered area, not the number of subscribers.
+    """
+    boxes: List[BBox] = []
+    for box in sorted({region.bbox for region in regions}, key=lambda b: -b.area):
+        if not any(kept.contains_box(box) for kept in boxes):
+            boxes.append(box)
+    # Area of each box that actually belongs to regions (overlaps counted once, pairwise)
+    useful = [box.area for box in boxes]
+
+    while len(boxes) > 1:
+        best = None
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                union = boxes[i].union(boxes[j])
+                if union.width > max_span or union.height > max_span:
+                    continue
+                covered = useful[i] + useful[j] - boxes[i].intersection_area(boxes[j])
+                fill = covered / union.area if union.area else 1.0
+                if fill >= min_fill and (best is None or fill > best[0]):
+                    best = (fill, i, j, union, covered)
+        if best is None:
+            break
+        _, i, j, union, covered = best
+        for index in (j, i):
+            del boxes[index], useful[index]
+        # The union may now swallow other boxes
+        for index in reversed(range(len(boxes))):
+            if union.contains_box(boxes[index]):
+                covered += useful[index] - boxes[index].area
+                del boxes[index], useful[index]
+        boxes.append(union)
+        useful.append(min(covered, union.area))
+    return boxes
+
+
+def bounds_from_url(url: str) -> Optional[BBox]:
+    bounds = parse_qs(urlsplit(url).query).get('bounds')
+    return BBox.from_bounds(bounds[0]) if bounds else None
+
+
+def search_url(bbox: BBox) -> str:
+    return f"{SEARCH_URL}?bounds={bbox.to_bounds()}"
+
+
+class GridIndex:
+    """
+    Uniform grid over lon/lat: each region is listed in every cell its box
+    overlaps, so a point lookup only tests the few regions in its cell
+    """
+
+    def __init__(self, regions: Iterable[Region] = (), cell_size: float = 0.05):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[Region]] = {}
+        self.regions: List[Region] = []
+        for region in regions:
+            self.insert(region)
+
+    def _cell(self, lon: float, lat: float) -> Tuple[int, int]:
+        return int(lon // self.cell_size), int(lat // self.cell_size)
+
+    def insert(self, region: Region) -> None:
+        self.regions.append(region)
+        box = region.bbox
+        x0, y0 = self._cell(box.west, box.south)
+        x1, y1 = self._cell(box.east, box.north)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                self._cells.setdefault((x, y), []).append(region)
+
+    def query(self, lon: float, lat: float) -> List[Region]:
+        """Regions containing the point"""
+        return [region for region in self._cells.get(self._cell(lon, lat), ()) if region.contains(lon, lat)]
+
+    def __len__(self) -> int:
+        return len(self.regions)
+
+
+class Geocoder:
+    """
+    Places listings on the map: card coordinates when present, otherwise the
+    residence name is geocoded once (api-adresse.data.gouv.fr) and the
+    answer, found or not, cached on disk. locate(wait=False) never waits for
+    the geocoder: a name not in the cache yet is geocoded in a background
+    thread, for the next time it is seen.
+    """
+
+    def __init__(self, fetcher=None, cache_file: Optional[str] = 'geocode_cache.json', enabled: bool = True):
+        self.fetcher = fetcher
+        self.cache_file = cache_file
+        self.enabled = enabled and fetcher is not None
+        self._cache: Dict[str, Optional[List[float]]] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        # Names waiting for the background thread (each queued once)
+        self._jobs: 'queue.Queue[str]' = queue.Queue()
+        self._queued = set()
+        self._thread: Optional[threading.Thread] = None
+        self._load()
+
+    def _load(self) -> None:
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                self._cache = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable geocode cache %s: %s", self.cache_file, e)
+
+    def save(self) -> None:
+        """Write the cache if it changed (from the geocoder thread: lookups do not wait for the disk)"""
+        with self._lock:
+            if not self._dirty or not self.cache_file:
+                return
+            cache, self._dirty = dict(self._cache), False
+        try:
+            with open(self.cache_file, 'w') as f:
+                json.dump(cache, f, ensure_ascii=False)
+        except OSError as e:
+            logger.warning("Could not save geocode cache: %s", e)
+            with self._lock:
+                self._dirty = True
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return ' '.join(query.lower().split())
+
+    def geocode(self, query: str) -> Optional[Point]:
+        key = self._key(query)
+        with self._lock:
+            if key in self._cache:
+                cached = self._cache[key]
+                return tuple(cached) if cached else None
+        if not self.enabled:
+            return None
+
+        point = None
+        try:
+            response = self.fetcher.get(GEOCODER_URL, params={'q': query, 'limit': 1}, budget=10)
+            response.raise_for_status()
+            features = response.json().get('features') or []
+            if features and features[0]['properties'].get('score', 0) >= MIN_GEOCODE_SCORE:
+                lon, lat = features[0]['geometry']['coordinates']
+                point = (float(lon), float(lat))
+        except Exception as e:
+            # Not cached: try again next cycle
+            logger.warning("Geocoding %r failed: %s", query, e)
+            return None
+
+        logger.info("Geocoded %r -> %s", query, point)
+        with self._lock:
+            self._cache[key] = list(point) if point else None
+            self._dirty = True
+        return point
+
+    def geocode_later(self, query: str) -> Optional[Point]:
+        """The cached point of `query`; if it is not cached, None now and geocoded in the background"""
+        key = self._key(query)
+        with self._lock:
+            if key in self._cache:
+                cached = self._cache[key]
+                return tuple(cached) if cached else None
+            if not self.enabled or key in self._queued:
+                return None
+            self._queued.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='geocoder', daemon=True)
+                self._thread.start()
+        self._jobs.put(query)
+        return None
+
+    def _run(self) -> None:
+        while True:
+            query = self._jobs.get()
+            try:
+                self.geocode(query)
+            finally:
+                with self._lock:
+                    self._queued.discard(self._key(query))
+                self._jobs.task_done()
+            if self._jobs.empty():
+                self.save()
+
+    def locate(self, room: Room, context: str = '', wait: bool = True) -> Optional[Point]:
+        """(lon, lat) of a listing, or None if it cannot be placed (yet, when not waiting)"""
+        if room.lon is not None and room.lat is not None:
+            return room.lon, room.lat
+        if not room.location or room.location == room.region:
+            # Only the default area name: nothing specific to geocode
+            return None
+        query = f"{room.location} {context}".strip()
+        return self.geocode(query) if wait else self.geocode_later(query)
+
+
+class RegionRouter:
+    """Routes each listing to the chats whose regions contain it"""
+
+    def __init__(self, regions: List[Region], geocoder: Geocoder,
+                 all_chat_ids: Callable[[], List[str]], cell_size: float = 0.05):
+        self.geocoder = geocoder
+        self.all_chat_ids = all_chat_ids
+        self.cell_size = cell_size
+        self.set_regions(regions)
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], fetcher, all_chat_ids: Callable[[], List[str]]) -> 'RegionRouter':
+        geocoder = Geocoder(fetcher, settings['geocode_cache_file'] or None, enabled=settings['geocoding'])
+        return cls(parse_regions(settings['regions']), geocoder, all_chat_ids)
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        self.set_regions(parse_regions(settings['regions']))
+        self.geocoder.enabled = settings['geocoding'] and self.geocoder.fetcher is not None
+
+    def set_regions(self, regions: List[Region]) -> None:
+        self.index = GridIndex(regions, self.cell_size)
+
+    def route(self, rooms: List[Room], context: str = '',
+              hints: Optional[Dict[int, BBox]] = None) -> List[Tuple[str, List[Room], List[str]]]:
+        """
+        Group rooms into (area label, rooms, chat IDs) deliveries. `hints` maps
+        fingerprints to the search box a room was found in: a room that cannot
+        be placed goes to the regions overlapping that box, or to every
+        recipient one of whose region filters accepts it, rather than being
+        missed. Routing runs on the alert path, so it never waits for the
+        geocoder: a residence not geocoded yet counts as not placed, and is
+        looked up in the background.
+        """
+        per_chat: Dict[str, Dict[str, Any]] = {}
+        unplaced = []
+
+        def deliver(region: Region, room: Room) -> None:
+            if region.filter is not None and not region.filter.matches(room):
+                return
+            for chat_id in region.chat_ids or self.all_chat_ids():
+                entry = per_chat.setdefault(str(chat_id), {'names': [], 'rooms': {}})
+                if region.name not in entry['names']:
+                    entry['names'].append(region.name)
+                entry['rooms'][room.fingerprint] = room
+
+        for room in rooms:
+            point = self.geocoder.locate(room, context, wait=False)
+            if point is not None:
+                regions = self.index.query(*point)
+            elif hints and room.fingerprint in hints:
+                regions = [region for region in self.index.regions
+                           if region.bbox.intersects(hints[room.fingerprint])]
+            else:
+                regions = None
+            if not regions and point is None:
+                unplaced.append(room)
+                continue
+            for region in regions:
+                deliver(region, room)
+        if unplaced:
+            logger.info("%s room(s) could not be placed on the map, sending to every recipient", len(unplaced))
+            # Still through the filters of the chat's regions: it gets a room any of them accepts
+            shared = [region for region in self.index.regions if not region.chat_ids]
+            subscribed: Dict[str, List[Region]] = {}
+            for region in self.index.regions:
+                for chat_id in region.chat_ids:
+                    subscribed.setdefault(chat_id, []).append(region)
+            for chat_id in map(str, self.all_chat_ids()):
+                regions = subscribed.get(chat_id, []) + shared
+                accepted = [room for room in unplaced
+                            if not regions or any(region.filter is None or region.filter.matches(room)
+                                                  for region in regions)]
+                if not accepted:
+                    continue
+                entry = per_chat.setdefault(chat_id, {'names': [], 'rooms': {}})
+                entry['names'] = entry['names'] or [context or 'CROUS']
+                for room in accepted:
+                    entry['rooms'][room.fingerprint] = room
+
+        # Chats receiving the same rooms under the same label share one delivery
+        groups: Dict[Tuple[str, Tuple[int, ...]], Tuple[List[Room], List[str]]] = {}
+        for chat_id, entry in per_chat.items():
+            label = ' / '.join(entry['names'])
+            key = (label, tuple(entry['rooms']))
+            groups.setdefault(key, (list(entry['rooms'].values()), []))[1].append(chat_id)
+        return [(label, rooms, chat_ids) for (label, _), (rooms, chat_ids) in groups.items()]
@@ -0,0 +1,82 @@
+"""
+Signal-aware shutdown
+
+The first SIGTERM (sent by Render on every deploy) or Ctrl+C requests an
+orderly stop: registered callbacks stop the scheduler and cut retries short,
+the check in progress finishes, and the caller then drains deliveries and
+saves state before the grace period runs out. A second signal stops at once:
+it interrupts the check loop, or cuts the drain short so state is still saved.
+"""
+
+import logging
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """Turns the first stop signal into a graceful shutdown with a deadline"""
+
+    def __init__(self, grace_seconds: float = 25.0):
+        self.grace_seconds = grace_seconds
+        self.stop_requested = threading.Event()
+        self.deadline: Optional[float] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._force_callbacks: List[Callable[[], None]] = []
+        self._finishing = False
+
+    def on_stop(self, callback: Callable[[], None]) -> None:
+        self._callbacks.append(callback)
+
+    def on_force(self, callback: Callable[[], None]) -> None:
+        """Called on a second signal once finishing() has been entered"""
+        self._force_callbacks.append(callback)
+
+    def finishing(self) -> None:
+        """The loop is done; from now on a second signal only cuts the drain short"""
+        self._finishing = True
+
+    def install(self, signals=(signal.SIGTERM, signal.SIGINT)) -> None:
+        """Handle the given signals (call from the main thread)"""
+        for signum in signals:
+            signal.signal(signum, self._handle)
+
+    def _handle(self, signum, frame) -> None:
+        if self.stop_requested.is_set():
+            # Second signal: give up on the graceful path
+            if not self._finishing:
+                raise KeyboardInterrupt
+            logger.warning("🛑 Received %s again, skipping the rest of the drain", signal.Signals(signum).name)
+            self.deadline = time.monotonic()
+            self._run_in_thread(self._force_callbacks)
+            return
+        logger.info("🛑 Received %s, shutting down (%.0f s grace)...",
+                    signal.Signals(signum).name, self.grace_seconds)
+        self.request_stop()
+
+    def request_stop(self) -> None:
+        if self.stop_requested.is_set():
+            return
+        self.deadline = time.monotonic() + self.grace_seconds
+        self.stop_requested.set()
+        self._run_in_thread(self._callbacks)
+
+    def _run_in_thread(self, callbacks: List[Callable[[], None]]) -> None:
+        # Callbacks take locks the interrupted main thread may be holding, so run them elsewhere
+        threading.Thread(target=self._run_callbacks, args=(list(callbacks),), name='shutdown', daemon=True).start()
+
+    def _run_callbacks(self, callbacks: List[Callable[[], None]]) -> None:
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error("Shutdown callback failed: %s", e)
+
+    def remaining(self) -> float:
+        """Seconds left before the grace period ends (the full period if no stop was requested)"""
+        if self.deadline is None:
+            return self.grace_seconds
+        return max(0.0, self.deadline - time.monotonic())
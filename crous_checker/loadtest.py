@@ -0,0 +1,302 @@
+"""
+Synthetic load for the whole check pipeline
+
+How many regions and subscribers can one worker serve before a check takes
+longer than check_interval_minutes? `python -m crous_checker loadtest`
+builds synthetic subscriber regions (each subscriber with its own area and,
+for some, a room filter) and runs real check cycles against them: planned
+searches, fetch threads and parse processes, extraction, clustering, dedup,
+region matching, digests and the Telegram delivery queue. Only the network
+is stubbed: StubAdapter answers the CROUS search and the Telegram Bot API
+in-process, behind the same pooled ResilientFetcher as in production.
+
+Each search returns the synthetic listings inside its bounds; every cycle a
+`churn` share of each area's listings is replaced by new ones, so each
+cycle has rooms to match and alerts to send. For each regions x subscribers
+point it reports cycle p50/p99, cycles/s, rooms/s, CPU seconds per cycle
+(parse processes included), RSS and how long the delivery queue took to
+drain at the configured delivery rate. --json writes the same numbers for comparison with --baseline.
+"""
+
+import io
+import json
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from .clustering import ClusterIndex
+from .dedup import SeenStore
+from .delivery import ChannelDeliveries, DigestCoalescer
+from .engine import CrousChecker
+from .fetch import ResilientFetcher
+from .geo import BBox, RegionRouter, SEARCH_URL
+from .memory import rss_bytes
+from .normalization import RoomFilter
+from .notify import TelegramBot
+from .sources import CrousSource
+from .tracing import TRACER
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_API = 'https://api.telegram.org/'
+
+# Synthetic areas: AREA_SIZE degrees square, laid out on a grid AREA_SPACING apart
+# (some near enough to be merged into one search, as real neighbouring regions are)
+AREA_SIZE = 0.04
+AREA_SPACING = 0.06
+ORIGIN = (-1.75, 48.0)
+
+# A p99 this much above the baseline's is reported as a regression
+REGRESSION_TOLERANCE = 0.2
+
+
+def synthetic_card(number: int, box: Optional[BBox] = None) -> str:
+    """One room card; listing `number` always has the same text (and position inside `box`)"""
+    attributes = ''
+    if box is not None:
+        lon, lat = _position(number, box)
+        attributes = f' data-lat="{lat:.6f}" data-lng="{lon:.6f}"'
+    return (f'<div class="logement-card"{attributes}><h3>Résidence Test {number}</h3>'
+            f'<p>{"Studio" if number % 2 else "T1"} {15 + number % 10} m²</p><p>{300 + number % 250} €</p></div>')
+
+
+def synthetic_page(cards: int, numbers: Optional[List[Tuple[int, BBox]]] = None) -> bytes:
+    """A search results page with `cards` room cards, or the given (listing, area) cards"""
+    parts = ['<html><head><title>Trouver un logement</title></head><body>'
+             '<nav><a href="/">Accueil</a></nav><div class="results">']
+    if numbers is None:
+        parts.extend(synthetic_card(i) for i in range(cards))
+    else:
+        parts.extend(synthetic_card(number, box) for number, box in numbers)
+    parts.append('</div><footer>CROUS</footer></body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def _position(number: int, box: BBox) -> Tuple[float, float]:
+    # Golden-ratio sequences spread a box's listings evenly, without randomness
+    x = (number * 0.6180339887) % 1
+    y = (number * 0.7548776662) % 1
+    return box.west + x * box.width, box.south + y * box.height
+
+
+def synthetic_areas(count: int) -> List[BBox]:
+    """`count` area boxes on a square grid"""
+    side = max(1, int(count ** 0.5 + 0.999))
+    areas = []
+    for i in range(count):
+        west = ORIGIN[0] + (i % side) * AREA_SPACING
+        south = ORIGIN[1] + (i // side) * AREA_SPACING
+        areas.append(BBox(west, south, west + AREA_SIZE, south + AREA_SIZE))
+    return areas
+
+
+def synthetic_regions(areas: List[BBox], subscribers: int, rng: random.Random,
+                      filtered: float = 0.5) -> List[Dict[str, Any]]:
+    """
+    One region entry per subscriber (so each can have its own filter), spread
+    over the areas in turn; a `filtered` share of them get a random filter
+    """
+    regions = []
+    for i in range(subscribers):
+        area = areas[i % len(areas)]
+        region = {'name': f"Area {i % len(areas)}", 'chat_ids': [str(100000 + i)],
+                  'bbox': [area.west, area.south, area.east, area.north]}
+        if rng.random() < filtered:
+            region['filter'] = rng.choice([
+                {'max_rent': rng.randrange(350, 550, 10)},
+                {'types': ['Studio']},
+                {'min_area': rng.randrange(15, 22), 'max_rent': 500},
+            ])
+        regions.append(region)
+    return regions
+
+
+class SyntheticListings:
+    """The listings of every area: `cards` per area, `churn` of them new each cycle"""
+
+    def __init__(self, areas: List[BBox], cards: int, churn: float = 0.1, result_cap: int = 0):
+        self.areas = areas
+        self.cards = cards
+        self.new_per_cycle = max(1, round(cards * churn)) if churn > 0 else 0
+        self.result_cap = result_cap
+        self.cycle = 0
+        self._lock = threading.Lock()
+
+    def next_cycle(self) -> None:
+        with self._lock:
+            self.cycle += 1
+
+    def inside(self, bounds: BBox) -> List[Tuple[int, BBox]]:
+        """(listing, area) of the current listings inside the bounds, up to the site's result cap"""
+        first = self.cycle * self.new_per_cycle
+        found = []
+        for index, area in enumerate(self.areas):
+            if not area.intersects(bounds):
+                continue
+            # Listing numbers never repeat across areas
+            base = index * 10_000_000
+            for number in range(base + first, base + first + self.cards):
+                lon, lat = _position(number, area)
+                if bounds.west <= lon <= bounds.east and bounds.south <= lat <= bounds.north:
+                    found.append((number, area))
+        return found[:self.result_cap] if self.result_cap else found
+
+    def page(self, bounds: BBox) -> bytes:
+        return synthetic_page(0, self.inside(bounds))
+
+
+class StubAdapter(BaseAdapter):
+    """
+    requests transport answering the CROUS search with synthetic pages and
+    every Telegram Bot API call with success, after `latency` seconds
+    """
+
+    def __init__(self, listings: SyntheticListings, latency: float = 0.0):
+        super().__init__()
+        self.listings = listings
+        self.latency = latency
+        self.counters = {'pages': 0, 'page_bytes': 0, 'telegram_calls': 0}
+        self._lock = threading.Lock()
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if self.latency:
+            time.sleep(self.latency)
+        if request.url.startswith(TELEGRAM_API):
+            body = b'{"ok": true, "result": {}}'
+            content_type = 'application/json'
+            counter = 'telegram_calls'
+        else:
+            bounds = parse_qs(urlsplit(request.url).query).get('bounds', [''])[0]
+            body = self.listings.page(BBox.from_bounds(bounds)) if bounds else synthetic_page(0, [])
+            content_type = 'text/html; charset=utf-8'
+            counter = 'pages'
+        with self._lock:
+            self.counters[counter] += 1
+            if counter == 'pages':
+                self.counters['page_bytes'] += len(body)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.headers = CaseInsensitiveDict({'Content-Type': content_type, 'Content-Length': str(len(body))})
+        response.raw = io.BytesIO(body)
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+def cpu_seconds() -> float:
+    """User + system CPU time of this process and its reaped children (parse processes)"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def run_point(settings: Dict[str, Any], regions: int, subscribers: int, cycles: int, cards: int,
+              churn: float = 0.1, latency: float = 0.0, seed: int = 1, drain_timeout: float = 30.0) -> Dict[str, Any]:
+    """Run `cycles` checks for one regions x subscribers point; returns its measurements"""
+    rng = random.Random(seed)
+    areas = synthetic_areas(regions)
+    settings = dict(settings, regions=synthetic_regions(areas, subscribers, rng), crous_url=None,
+                    use_simulation=False, geocoding=False, geocode_cache_file='', pending_deliveries_file='',
+                    snapshot_file='', record_dir=None, channels={})
+    listings = SyntheticListings(areas, cards, churn, result_cap=settings['search_result_cap'])
+    adapter = StubAdapter(listings, latency)
+
+    fetcher = ResilientFetcher.from_settings(dict(settings, http_backend='requests'))
+    fetcher.session.mount(SEARCH_URL.rsplit('/tools', 1)[0] + '/', adapter)
+    fetcher.session.mount(TELEGRAM_API, adapter)
+    chat_ids = [chat_id for region in settings['regions'] for chat_id in region['chat_ids']]
+    deliveries = ChannelDeliveries.from_settings(TelegramBot('0:loadtest', chat_ids, fetcher),
+                                                 settings, fetcher).start()
+    digests = DigestCoalescer(deliveries, settings['coalesce_window_seconds']).start()
+    router = RegionRouter.from_settings(settings, fetcher, lambda: chat_ids)
+    source = CrousSource.from_settings(fetcher, settings)
+    checker = CrousChecker(source, digests, seen=SeenStore(max_size=settings['max_seen_rooms']),
+                           area_name=settings['area_name'], router=router,
+                           room_filter=RoomFilter.from_config(settings['room_filter']),
+                           clusters=ClusterIndex.from_settings(settings))
+    TRACER.apply_settings(dict(settings, trace_cycles=cycles, trace_log=False))
+    source.warm_up()
+
+    # The first cycle announces every listing at once; it is run but not timed
+    checker.check_and_notify()
+    listings.next_cycle()
+    cpu_start = cpu_seconds()
+    durations = []
+    rooms = 0
+    start = time.perf_counter()
+    for _ in range(cycles):
+        cycle_start = time.perf_counter()
+        rooms += checker.check_and_notify()['total_count']
+        durations.append((time.perf_counter() - cycle_start) * 1000)
+        listings.next_cycle()
+    elapsed = time.perf_counter() - start
+    rss = rss_bytes()
+
+    drain_start = time.perf_counter()
+    digests.close()
+    # The queue sends at the configured Telegram rate: past the timeout, report it as not drained
+    drained = deliveries.drain(drain_timeout)
+    drain_seconds = time.perf_counter() - drain_start
+    deliveries.close(timeout=1)
+    # Reaps the parse processes, so their CPU time is counted
+    source.close()
+    cpu = cpu_seconds() - cpu_start
+
+    stages: Dict[str, List[float]] = {}
+    for trace in TRACER.traces()[-cycles:]:
+        for name, ms in trace.stages().items():
+            stages.setdefault(name, []).append(ms)
+    return {
+        'regions': regions,
+        'subscribers': subscribers,
+        'searches': len(source.queries),
+        'cycles': cycles,
+        'rooms_per_cycle': rooms / cycles,
+        'p50_ms': round(statistics.median(durations), 2),
+        'p99_ms': round(_percentile(durations, 0.99), 2),
+        'cycles_per_second': round(cycles / elapsed, 2),
+        'rooms_per_second': round(rooms / elapsed, 1),
+        'cpu_ms_per_cycle': round(cpu / cycles * 1000, 2),
+        'rss_mb': round(rss / 1e6, 1),
+        'messages': deliveries.counters['sent'],
+        'drain_seconds': round(drain_seconds, 2),
+        'drained': drained,
+        'stages_ms': {name: round(statistics.median(samples), 3) for name, samples in stages.items()},
+    }
+
+
+def regressions(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]]) -> List[str]:
+    """Points whose p99 cycle time grew more than REGRESSION_TOLERANCE over the baseline's"""
+    previous = {(point['regions'], point['subscribers']): point for point in baseline}
+    found = []
+    for point in results:
+        before = previous.get((point['regions'], point['subscribers']))
+        if before and point['p99_ms'] > before['p99_ms'] * (1 + REGRESSION_TOLERANCE):
+            found.append(f"{point['regions']} region(s) x {point['subscribers']} subscriber(s): "
+                         f"p99 {before['p99_ms']:.1f} -> {point['p99_ms']:.1f} ms")
+    return found
+
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['results']
@@ -0,0 +1,129 @@
+"""
+Non-blocking logging for the checker
+
+Log calls only put the record on a queue; a QueueListener thread formats it
+and writes it to the console and the size-rotated log file, so slow disks or
+Render log draining never stall a check. Records can be emitted as JSON lines,
+and high-volume messages are sampled per stage (pass extra={'stage': ...}).
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime, timezone
+from typing import Optional, Dict
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class StageSampler(logging.Filter):
+    """
+    Keep only every Nth record below WARNING for each sampled stage, e.g.
+    {'extract': 10} logs one in ten per-room extraction messages.
+    """
+
+    def __init__(self, sample_every: Dict[str, int]):
+        super().__init__()
+        self.sample_every = {stage: max(1, int(n)) for stage, n in sample_every.items()}
+        self._counters = {stage: itertools.count() for stage in self.sample_every}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        stage = getattr(record, 'stage', None)
+        if stage not in self.sample_every or record.levelno >= logging.WARNING:
+            return True
+        return next(self._counters[stage]) % self.sample_every[stage] == 0
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that enqueues the record untouched. The stock prepare()
+    formats the message in the calling thread; here %-style arguments are
+    only merged by the listener, off the hot path.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def setup_logging(level: str = 'INFO', log_file: Optional[str] = None, json_format: bool = False,
+                  max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3,
+                  sample_every: Optional[Dict[str, int]] = None) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue to console (and optionally a rotating
+    file). Safe to call again to reconfigure; the previous listener is stopped.
+    """
+    global _listener
+    stop_logging()
+
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    if sample_every:
+        queue_handler.addFilter(StageSampler(sample_every))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+atexit.register(stop_logging)
+
+
+def configure_from_settings(settings: Dict, log_file: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Apply the logging options from the 'settings' section of the configuration"""
+    return setup_logging(
+        level=settings.get('log_level', 'INFO'),
+        log_file=log_file,
+        json_format=settings.get('json_logs', False),
+        max_bytes=int(settings.get('log_max_bytes', 5 * 1024 * 1024)),
+        backup_count=int(settings.get('log_backup_count', 3)),
+        sample_every=settings.get('log_sample_every', {'extract': 10}),
+    )
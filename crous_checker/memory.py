@@ -0,0 +1,127 @@
+"""
+Memory-bounded operation for small (512 MB) instances
+
+`low_memory: true` trades some speed for a smaller, steadier footprint:
+
+    streaming_parse     cards are extracted while the page downloads and
+                        everything outside them is dropped as it closes; a
+                        full DOM, when drift detection needs one, is
+                        decomposed as soon as it has been read
+    parse_processes 0   pages are parsed in the worker itself: each parse
+                        process is a whole interpreter with bs4 and lxml
+    fetch_workers <= 2  fewer pages held in memory at once
+    max_seen_rooms      notified rooms beyond this are forgotten, the ones
+                        not listed for the longest first (default 20000)
+    max_clusters <= 5000  near-duplicate signatures kept
+    trace_cycles <= 10  cycle traces kept for /traces
+    memory_budget_mb    MemoryWatch reports what allocates once RSS passes
+                        it (default 400)
+
+MemoryWatch costs nothing until RSS first exceeds the budget: it then
+starts tracemalloc, and at the next check logs the allocation sites that
+grew the most since, and stops tracing again.
+"""
+
+import gc
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+LOW_MEMORY_SETTINGS = {'streaming_parse': True, 'parse_processes': 0}
+LOW_MEMORY_CAPS = {'fetch_workers': 2, 'max_clusters': 5000, 'trace_cycles': 10}
+LOW_MEMORY_DEFAULTS = {'max_seen_rooms': 20000, 'memory_budget_mb': 400}
+
+
+def apply_low_memory(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """The settings low_memory implies (in place); limits left at 0 get the low-memory defaults"""
+    if settings.get('low_memory'):
+        settings.update(LOW_MEMORY_SETTINGS)
+        for name, cap in LOW_MEMORY_CAPS.items():
+            settings[name] = min(settings[name], cap)
+        for name, default in LOW_MEMORY_DEFAULTS.items():
+            settings[name] = settings[name] or default
+    return settings
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process now (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryWatch:
+    """
+    Checked after each cycle. Over the budget it collects garbage, starts
+    tracemalloc, and one check later logs the top allocation sites since
+    then; reports are at most one per `report_interval` seconds. A budget
+    of 0 turns it off.
+    """
+
+    def __init__(self, budget_mb: float, top: int = 10, report_interval: float = 3600.0):
+        self.budget_mb = budget_mb
+        self.top = top
+        self.report_interval = report_interval
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._reported_at: Optional[float] = None
+        self.over_budget = 0
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> 'MemoryWatch':
+        return cls(settings['memory_budget_mb'])
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        self.budget_mb = settings['memory_budget_mb']
+
+    def check(self) -> float:
+        """Compare RSS with the budget (and report if due); returns RSS in MB"""
+        rss_mb = rss_bytes() / 1e6
+        if not self.budget_mb or rss_mb <= self.budget_mb:
+            if self._baseline is not None:
+                self._stop_tracing()
+            return rss_mb
+
+        self.over_budget += 1
+        if self._baseline is not None:
+            self._report(rss_mb)
+        elif self._reported_at is None or time.monotonic() - self._reported_at >= self.report_interval:
+            # DOM trees are full of reference cycles: they go at the next full collection
+            freed = gc.collect()
+            logger.warning("🧠 RSS %.0f MB is over the %s MB budget (%s objects collected); "
+                           "tracing allocations until the next check", rss_mb, self.budget_mb, freed)
+            tracemalloc.start()
+            self._baseline = tracemalloc.take_snapshot()
+        return rss_mb
+
+    def _report(self, rss_mb: float) -> None:
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+        lines = []
+        for stat in snapshot.compare_to(self._baseline, 'lineno')[:self.top]:
+            frame = stat.traceback[0]
+            lines.append(f"  {stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                         f"{frame.filename}:{frame.lineno}")
+        logger.warning("🧠 RSS %.0f MB (budget %s MB); top allocations since the last check:\n%s",
+                       rss_mb, self.budget_mb, '\n'.join(lines) or '  (none)')
+        self._reported_at = time.monotonic()
+        self._stop_tracing()
+
+    def _stop_tracing(self) -> None:
+        self._baseline = None
+        tracemalloc.stop()
@@ -0,0 +1,168 @@
+"""
+Value objects shared by the scraper, dedup and notification code
+"""
+
+import hashlib
+import re
+import sys
+from dataclasses import dataclass
+from enum import Enum
+from typing import Optional, Dict, Any
+
+
+class RoomType(Enum):
+    """Canonical accommodation types found on CROUS listings"""
+
+    STUDIO = 'Studio'
+    CHAMBRE = 'Chambre'
+    T1 = 'T1'
+    T2 = 'T2'
+    T3 = 'T3'
+    T4 = 'T4'
+    T5 = 'T5+'
+    APPARTEMENT = 'Appartement'
+    LOGEMENT = 'Logement'
+
+    @property
+    def label(self) -> str:
+        return self.value
+
+    @classmethod
+    def from_text(cls, text: str) -> 'RoomType':
+        """Map a matched label ('Studio', 'T2', 'Type 3', '2 Pièces', ...) to a RoomType"""
+        text = text.strip().lower()
+        if text.startswith('studio'):
+            return cls.STUDIO
+        if text.startswith('chambre'):
+            return cls.CHAMBRE
+        if text.startswith('appartement'):
+            return cls.APPARTEMENT
+        match = re.match(r'(?:t|type)\s*([1-9])\+?$', text) or re.match(r'([1-9])\s*pi[eè]ces?$', text)
+        if match:
+            size = int(match.group(1))
+            return cls.T5 if size >= 5 else cls['T%d' % size]
+        return cls.LOGEMENT
+
+
+def make_fingerprint(text: str) -> int:
+    """Stable 64-bit fingerprint (unlike hash(), identical across processes and restarts)"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def parse_rent_cents(rent: str) -> int:
+    """Parse a rent string like '450€' or '450,50 €' into integer cents"""
+    match = re.search(r'(\d+)(?:[.,](\d{1,2}))?', rent)
+    if not match:
+        return 0
+    cents = (match.group(2) or '0').ljust(2, '0')
+    return int(match.group(1)) * 100 + int(cents)
+
+
+def format_cents(cents: int) -> str:
+    """'450€' or '450,50€'"""
+    euros, cents = divmod(cents, 100)
+    return f"{euros},{cents:02d}€" if cents else f"{euros}€"
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Room:
+    """
+    One room listing. Rent is stored in integer cents so it can be compared
+    and filtered numerically; equality and hashing use the fingerprint only.
+    rent_cents is the lowest rent of a range ("de 320 € à 345 €") and
+    rent_max_cents its highest (0: no range). The *_confidence fields say
+    how sure extraction was of each value (see normalization.py).
+    """
+
+    id: str
+    type: RoomType
+    location: str
+    rent_cents: int
+    available_date: str
+    url: str
+    fingerprint: int
+    region: str = ''
+    # Map position of the residence, when the page gives one (see geo.Geocoder otherwise)
+    lon: Optional[float] = None
+    lat: Optional[float] = None
+    rent_max_cents: int = 0
+    charges_included: Optional[bool] = None
+    area_m2: Optional[float] = None
+    rent_confidence: float = 1.0
+    area_confidence: float = 1.0
+    type_confidence: float = 1.0
+    # SimHash of the card text and fields, for near-duplicate clustering (0: not computed)
+    simhash: int = 0
+
+    def __post_init__(self):
+        # Locations, regions, dates and URLs repeat across rooms and cycles, so share one copy of each
+        object.__setattr__(self, 'location', sys.intern(self.location))
+        object.__setattr__(self, 'available_date', sys.intern(self.available_date))
+        object.__setattr__(self, 'region', sys.intern(self.region))
+        object.__setattr__(self, 'url', sys.intern(self.url))
+
+    def __eq__(self, other):
+        if not isinstance(other, Room):
+            return NotImplemented
+        return self.fingerprint == other.fingerprint
+
+    def __hash__(self):
+        return self.fingerprint
+
+    @property
+    def rent_max(self) -> int:
+        """Highest rent in cents (rent_cents when there is no range)"""
+        return max(self.rent_cents, self.rent_max_cents)
+
+    @property
+    def rent(self) -> str:
+        """Rent formatted for display, e.g. '450€' or '320€ - 345€'"""
+        text = format_cents(self.rent_cents)
+        if self.rent_max_cents > self.rent_cents:
+            text += f" - {format_cents(self.rent_max_cents)}"
+        return text
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The legacy dict shape rooms had before this model existed, plus the normalized fields"""
+        return {
+            'id': self.id,
+            'type': self.type.label,
+            'location': self.location,
+            'rent': self.rent,
+            'available_date': self.available_date,
+            'url': self.url,
+            'rent_cents': self.rent_cents,
+            'rent_max_cents': self.rent_max_cents,
+            'charges_included': self.charges_included,
+            'area_m2': self.area_m2,
+            'confidence': [self.rent_confidence, self.area_confidence, self.type_confidence],
+            'simhash': self.simhash,
+            'fingerprint': self.fingerprint,
+            'lon': self.lon,
+            'lat': self.lat,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], region: str = '') -> 'Room':
+        """Build a Room from the dict shape (legacy dicts have only the rent string)"""
+        rent_confidence, area_confidence, type_confidence = data.get('confidence', (1.0, 1.0, 1.0))
+        return cls(
+            id=data['id'],
+            type=RoomType.from_text(data.get('type', '')),
+            location=data.get('location', ''),
+            rent_cents=data['rent_cents'] if 'rent_cents' in data else parse_rent_cents(str(data.get('rent', ''))),
+            available_date=data.get('available_date', ''),
+            url=data.get('url', ''),
+            # Extraction fingerprints the card text, not the ID: legacy dicts fall back to the ID
+            fingerprint=data['fingerprint'] if 'fingerprint' in data else make_fingerprint(data['id']),
+            region=region,
+            rent_max_cents=data.get('rent_max_cents', 0),
+            charges_included=data.get('charges_included'),
+            area_m2=data.get('area_m2'),
+            rent_confidence=rent_confidence,
+            area_confidence=area_confidence,
+            type_confidence=type_confidence,
+            simhash=data.get('simhash', 0),
+            lon=data.get('lon'),
+            lat=data.get('lat')
+        )
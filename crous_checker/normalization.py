@@ -0,0 +1,219 @@
+"""
+Normalization of listing text into numeric fields, and numeric room filters
+
+A card's text says things like "T1 bis - 18,5 m² - de 320 € à 345 € charges
+comprises". normalize_card() turns it into the rent range in cents, whether
+charges are included, the surface in m² and the canonical RoomType, each with
+a confidence between 0 and 1:
+
+    rent   1.0 labelled amount ("Loyer : 345 €"), 0.95 range, 0.9 a lone
+           amount in €, 0.7 several different amounts, 0.5 labelled number
+           without a currency, 0.2 implausible value
+    area   1.0 "m²", 0.8 "m2"
+    type   1.0 Studio / T2 / Type 2 / F2, 0.9 Chambre, 0.8 "2 pièces",
+           0.6 Appartement, 0 nothing recognized (Logement)
+
+Years ("2025"), surfaces and charges amounts are never taken for the rent.
+RoomFilter compiles a subscriber's filter once and then only compares the
+numbers on Room; fields parsed with less than `min_confidence` count as
+unknown, and unknown values pass (better an extra alert than a missed room),
+except in strict matching, used for urgent alerts (see priority.py).
+"""
+
+import re
+from typing import Optional, Dict, Any, NamedTuple, Tuple
+
+from .models import Room, RoomType
+
+# Euros a month: anything outside is not a CROUS rent
+PLAUSIBLE_RENT = (50, 3000)
+PLAUSIBLE_AREA = (5, 250)
+
+_THOUSANDS = re.compile(r'\s')
+
+# "450", "450,50", "1 200" (four digits at most otherwise: "T2 350 €" is not 2350 €, and a
+# group of thousands never starts right after a word or "type": "Type 1 350 €" is 350 €)
+_AMOUNT = r'((?<![\w.,])(?<!type\s)\d{1,3}(?:[ \u00a0\u202f]\d{3})+|\d{1,4})(?:[.,](\d{1,2}))?'
+_CURRENCY = r'(?:€|eur(?:os?)?\b)'
+MONEY = re.compile(rf'{_AMOUNT}\s*{_CURRENCY}|€\s*{_AMOUNT}', re.IGNORECASE)
+RANGE = re.compile(rf'{_AMOUNT}\s*€?\s*(?:-|–|\bà\b|\bet\b|\bau\b)\s*{_AMOUNT}\s*{_CURRENCY}', re.IGNORECASE)
+LABELLED_NUMBER = re.compile(rf'(?:loyer|prix|redevance)\D{{0,15}}?{_AMOUNT}(?!\s*m)', re.IGNORECASE)
+RENT_LABEL = re.compile(r'(?:loyer|prix|redevance|à partir de)\W*$', re.IGNORECASE)
+CHARGES_LABEL = re.compile(r'charges?\s*(?:[:=]|de|:\s*de)?\s*$', re.IGNORECASE)
+CHARGES_INCLUDED = re.compile(r'\bcharges?\s+(?:comprises?|incluses?)\b|\bcc\b', re.IGNORECASE)
+CHARGES_EXCLUDED = re.compile(r'\bhors\s+charges?\b|\bhc\b|\+\s*charges?\b', re.IGNORECASE)
+AREA = re.compile(r'(\d{1,3})(?:[.,](\d{1,2}))?\s*m(²|2)(?![a-z0-9])', re.IGNORECASE)
+
+# (pattern, how to get the type from the match, confidence), most specific first
+TYPE_RULES = [
+    (re.compile(r'\bstudio(?:s|ette)?\b', re.IGNORECASE), lambda m: RoomType.STUDIO, 1.0),
+    (re.compile(r'\b(?:t|type|f)\s?([1-9])(?:\s?bis)?\b', re.IGNORECASE),
+     lambda m: RoomType.from_text(f"t{m.group(1)}"), 1.0),
+    (re.compile(r'\bchambres?\b', re.IGNORECASE), lambda m: RoomType.CHAMBRE, 0.9),
+    (re.compile(r'\b([1-9])\s*pi[eè]ces?\b', re.IGNORECASE), lambda m: RoomType.from_text(f"t{m.group(1)}"), 0.8),
+    (re.compile(r'\bappartements?\b', re.IGNORECASE), lambda m: RoomType.APPARTEMENT, 0.6),
+]
+
+
+class Normalized(NamedTuple):
+    rent_min_cents: int
+    rent_max_cents: int
+    charges_included: Optional[bool]
+    area_m2: Optional[float]
+    type: RoomType
+    rent_confidence: float
+    area_confidence: float
+    type_confidence: float
+
+
+def _cents(whole: str, decimals: Optional[str]) -> int:
+    return int(_THOUSANDS.sub('', whole)) * 100 + int((decimals or '0').ljust(2, '0'))
+
+
+def _plausible_rent(cents: int) -> bool:
+    return PLAUSIBLE_RENT[0] * 100 <= cents <= PLAUSIBLE_RENT[1] * 100
+
+
+def _money_cents(match: 're.Match') -> int:
+    groups = match.groups()
+    return _cents(*groups[:2]) if groups[0] is not None else _cents(*groups[2:4])
+
+
+def extract_rent(text: str) -> Tuple[int, int, float]:
+    """(min cents, max cents, confidence); (0, 0, 0.0) when the text has no rent"""
+    for match in RANGE.finditer(text):
+        low, high = _cents(*match.groups()[:2]), _cents(*match.groups()[2:])
+        if _plausible_rent(low) and _plausible_rent(high) and low < high:
+            return low, high, 0.95
+
+    candidates = []
+    for match in MONEY.finditer(text):
+        before = text[max(0, match.start() - 25):match.start()]
+        if CHARGES_LABEL.search(before):
+            continue
+        cents = _money_cents(match)
+        if _plausible_rent(cents):
+            candidates.append((cents, bool(RENT_LABEL.search(before))))
+    if candidates:
+        labelled = [cents for cents, has_label in candidates if has_label]
+        if labelled:
+            return labelled[0], labelled[0], 1.0
+        confidence = 0.9 if len({cents for cents, _ in candidates}) == 1 else 0.7
+        return candidates[0][0], candidates[0][0], confidence
+
+    match = LABELLED_NUMBER.search(text)
+    if match:
+        cents = _cents(*match.groups())
+        year = 1900 <= cents // 100 <= 2100 and not cents % 100
+        confidence = 0.5 if _plausible_rent(cents) and not year else 0.2
+        return cents, cents, confidence
+    return 0, 0, 0.0
+
+
+def extract_area(text: str) -> Tuple[Optional[float], float]:
+    for match in AREA.finditer(text):
+        area = int(match.group(1)) + int((match.group(2) or '0').ljust(2, '0')) / 100
+        if PLAUSIBLE_AREA[0] <= area <= PLAUSIBLE_AREA[1]:
+            return area, 1.0 if match.group(3) == '²' else 0.8
+    return None, 0.0
+
+
+def extract_type(text: str) -> Tuple[RoomType, float]:
+    for pattern, to_type, confidence in TYPE_RULES:
+        match = pattern.search(text)
+        if match:
+            return to_type(match), confidence
+    return RoomType.LOGEMENT, 0.0
+
+
+def charges_included(text: str) -> Optional[bool]:
+    if CHARGES_INCLUDED.search(text):
+        return True
+    if CHARGES_EXCLUDED.search(text):
+        return False
+    return None
+
+
+def normalize_card(text: str) -> Normalized:
+    """Numeric fields and their confidence from a card's text"""
+    rent_min, rent_max, rent_confidence = extract_rent(text)
+    area, area_confidence = extract_area(text)
+    room_type, type_confidence = extract_type(text)
+    return Normalized(rent_min, rent_max, charges_included(text), area, room_type,
+                      rent_confidence, area_confidence, type_confidence)
+
+
+class RoomFilter:
+    """
+    A subscriber's filter, e.g. {"max_rent": 450, "min_area": 15, "types":
+    ["Studio", "T1"], "charges_included": true}. Rents in euros; a range
+    matches if any rent in it does.
+    """
+
+    KEYS = ('min_rent', 'max_rent', 'min_area', 'max_area', 'types', 'charges_included', 'min_confidence')
+
+    __slots__ = ('min_rent_cents', 'max_rent_cents', 'min_area', 'max_area', 'types', 'charges_included',
+                 'min_confidence')
+
+    def __init__(self, min_rent_cents: Optional[int] = None, max_rent_cents: Optional[int] = None,
+                 min_area: Optional[float] = None, max_area: Optional[float] = None,
+                 types: Optional[frozenset] = None, charges_included: Optional[bool] = None,
+                 min_confidence: float = 0.5):
+        self.min_rent_cents = min_rent_cents
+        self.max_rent_cents = max_rent_cents
+        self.min_area = min_area
+        self.max_area = max_area
+        self.types = types
+        self.charges_included = charges_included
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def from_config(cls, data: Optional[Dict[str, Any]]) -> Optional['RoomFilter']:
+        """A filter, or None for an empty one; raises ValueError for unknown keys or types"""
+        if not data:
+            return None
+        unknown = set(data) - set(cls.KEYS)
+        if unknown:
+            raise ValueError(f"unknown filter keys: {', '.join(sorted(unknown))}")
+        for key in ('min_rent', 'max_rent', 'min_area', 'max_area', 'min_confidence'):
+            if key in data and (isinstance(data[key], bool) or not isinstance(data[key], (int, float))):
+                raise ValueError(f"filter {key} must be a number")
+        types = None
+        if 'types' in data:
+            labels = {room_type.label.lower(): room_type for room_type in RoomType}
+            unknown_types = [label for label in data['types'] if str(label).lower() not in labels]
+            if unknown_types:
+                raise ValueError(f"unknown room type(s): {', '.join(map(str, unknown_types))}")
+            types = frozenset(labels[str(label).lower()] for label in data['types'])
+        euros = lambda key: round(data[key] * 100) if key in data else None  # noqa: E731
+        return cls(euros('min_rent'), euros('max_rent'), data.get('min_area'), data.get('max_area'), types,
+                   data.get('charges_included'), float(data.get('min_confidence', 0.5)))
+
+    def matches(self, room: Room, strict: bool = False) -> bool:
+        """Whether the room passes; with `strict`, unknown values fail the clauses that need them"""
+        if room.rent_confidence >= self.min_confidence:
+            if self.max_rent_cents is not None and room.rent_cents > self.max_rent_cents:
+                return False
+            if self.min_rent_cents is not None and room.rent_max < self.min_rent_cents:
+                return False
+        elif strict and (self.max_rent_cents is not None or self.min_rent_cents is not None):
+            return False
+        if room.area_m2 is not None and room.area_confidence >= self.min_confidence:
+            if self.min_area is not None and room.area_m2 < self.min_area:
+                return False
+            if self.max_area is not None and room.area_m2 > self.max_area:
+                return False
+        elif strict and (self.min_area is not None or self.max_area is not None):
+            return False
+        if self.types is not None:
+            if room.type_confidence >= self.min_confidence:
+                if room.type not in self.types:
+                    return False
+            elif strict:
+                return False
+        if self.charges_included is not None:
+            if room.charges_included is not None and room.charges_included != self.charges_included:
+                return False
+            if strict and room.charges_included is None:
+                return False
+        return True
@@ -0,0 +1,145 @@
+"""
+Telegram notifications and message formatting
+"""
+
+import logging
+from datetime import datetime
+from typing import Optional, List, Any
+
+import requests
+
+from . import tracing
+from .fetch import ResilientFetcher
+from .models import Room
+
+logger = logging.getLogger(__name__)
+
+# Limit the number of rooms in a single message to avoid Telegram length limits
+MAX_ROOMS_PER_MESSAGE = 5
+
+SEARCH_PAGE_URL = 'https://trouverunlogement.lescrous.fr/tools/41/search'
+
+
+class TelegramBot:
+    """Handle Telegram bot notifications"""
+
+    def __init__(self, bot_token: str, chat_ids: list, fetcher: Optional[ResilientFetcher] = None):
+        self.bot_token = bot_token
+        self.fetcher = fetcher or ResilientFetcher()
+        self.chat_ids = chat_ids if isinstance(chat_ids, list) else [chat_ids]
+        self.base_url = f"https://api.telegram.org/bot{bot_token}"
+
+    def set_credentials(self, bot_token: str, chat_ids: list) -> None:
+        """Switch token/recipients (hot reload); each attribute is swapped in one assignment"""
+        self.base_url = f"https://api.telegram.org/bot{bot_token}"
+        self.chat_ids = list(chat_ids)
+        self.bot_token = bot_token
+
+    def send_to(self, chat_id: str, message: str) -> bool:
+        """Send a message to one chat"""
+        try:
+            url = f"{self.base_url}/sendMessage"
+            payload = {
+                'chat_id': chat_id,
+                'text': message,
+                'parse_mode': 'HTML'
+            }
+
+            with tracing.span('telegram'):
+                response = self.fetcher.post(url, json=payload, budget=30)
+            response.raise_for_status()
+
+            logger.info("Telegram notification sent successfully to %s", chat_id, extra={'stage': 'deliver'})
+            return True
+
+        except requests.exceptions.RequestException as e:
+            logger.error("Failed to send Telegram message to %s: %s", chat_id, e)
+            return False
+
+    def _call(self, method: str, **params) -> Any:
+        """Call a Bot API method; raises RequestException on HTTP errors and ValueError if it is refused"""
+        response = self.fetcher.post(f"{self.base_url}/{method}", json=params, budget=30)
+        response.raise_for_status()
+        data = response.json()
+        if not data.get('ok'):
+            raise ValueError(data.get('description', f"{method} failed"))
+        return data.get('result')
+
+    def warm_up(self) -> bool:
+        """Open a pooled connection to the Bot API ahead of time (getMe), so the next send skips the handshake"""
+        try:
+            self._call('getMe')
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.debug("Telegram warm-up failed: %s", e)
+            return False
+        return True
+
+    def set_webhook(self, url: str, secret_token: str, allowed_updates: Optional[list] = None) -> bool:
+        """Have Telegram POST updates to `url`, with `secret_token` in the secret header"""
+        try:
+            self._call('setWebhook', url=url, secret_token=secret_token,
+                       allowed_updates=allowed_updates or ['message'])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error("Failed to register Telegram webhook %s: %s", url, e)
+            return False
+        logger.info("🪝 Telegram webhook registered: %s", url)
+        return True
+
+    def send_message(self, message: str, chat_ids: Optional[list] = None) -> bool:
+        """Send a message to all configured chat IDs (or only to the given ones)"""
+        chat_ids = chat_ids or self.chat_ids
+        success_count = sum(self.send_to(chat_id, message) for chat_id in chat_ids)
+
+        if success_count > 0:
+            logger.info("Message sent to %s/%s recipients", success_count, len(chat_ids))
+            return True
+        else:
+            logger.error("Failed to send message to any recipient")
+            return False
+
+
+class ConsoleNotifier:
+    """Notifier that prints messages instead of sending them (dry runs, replay, benchmarks)"""
+
+    def __init__(self, quiet: bool = False):
+        self.quiet = quiet
+        self.sent: List[str] = []
+
+    def send_message(self, message: str, chat_ids: Optional[list] = None) -> bool:
+        self.sent.append(message)
+        if not self.quiet:
+            print(message)
+            print('-' * 40)
+        return True
+
+
+def format_room_message(rooms: List[Room], area_name: str = 'Rennes', digest: bool = False,
+                        urgent: bool = False) -> str:
+    """
+    Format room information for Telegram message (digest: rooms found since
+    the last alert; urgent: a room matching an urgent filter, named area_name)
+    """
+    limited_rooms = rooms[:MAX_ROOMS_PER_MESSAGE]
+
+    if urgent:
+        message = f"🚨 <b>Priority Room - {area_name}</b>\n\n"
+    elif digest:
+        message = f"📬 <b>CROUS {area_name} Area - {len(rooms)} More Rooms Since Last Alert</b>\n\n"
+    else:
+        message = f"🏠 <b>CROUS {area_name} Area - {len(rooms)} Rooms Available!</b>\n\n"
+
+    for i, room in enumerate(limited_rooms, 1):
+        message += f"<b>Room {i}:</b>\n"
+        message += f"📍 {room.location}\n"
+        message += f"🏡 {room.type.label}\n"
+        message += f"💰 {room.rent}\n"
+        message += f"🆔 {room.id[:20]}...\n\n"
+
+    if len(rooms) > MAX_ROOMS_PER_MESSAGE:
+        message += f"... and {len(rooms) - MAX_ROOMS_PER_MESSAGE} more rooms!\n\n"
+
+    message += f"📊 Total: {len(rooms)} rooms found\n"
+    message += f"⏰ {datetime.now().strftime('%H:%M:%S')}\n"
+    message += f"🔗 <a href='{SEARCH_PAGE_URL}'>View all on CROUS</a>"
+
+    return message
@@ -0,0 +1,209 @@
+"""
+Pipelined fetch and parse of several search pages
+
+With several planned searches per cycle, running them one after the other
+makes the rooms of the first search wait for every other download and parse.
+PagePipeline runs the stages side by side:
+
+    fetch   I/O threads download pages
+            a bounded buffer: at most `buffer_size` pages fetched but not parsed
+    parse   worker processes build the DOM and extract rooms, off the GIL
+    results come back in completion order, so the engine dedups and hands the
+    rooms of each search to the (already asynchronous) delivery queue while
+    the others are still in flight
+
+The time from a room's publication to its alert is then the fetch and parse
+of its own search only.
+"""
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, Callable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker() -> None:
+    """Parse worker start-up: pay for the imports once, log warnings only"""
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - [parse] %(message)s')
+    import bs4  # noqa: F401
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        pass
+
+
+def parse_page(body: bytes, url: str, area_name: str = 'Rennes', selector: Optional[str] = None,
+               streaming: bool = False, encoding: str = 'utf-8', drift: bool = True) -> Dict[str, Any]:
+    """
+    Extract the rooms of one page (runs in a worker process). Returns the
+    rooms and extraction stats, plus what the drift detector needs: the page
+    frame fingerprint and, if the page was not recognized, a relearned card
+    selector.
+    """
+    from .drift import frame_fingerprint, learn_selector
+    from .extraction import iter_rooms_from_soup, iter_rooms_streaming
+
+    start = time.perf_counter_ns()
+    stats: Dict[str, Any] = {}
+    rooms = []
+    if streaming:
+        rooms = list(iter_rooms_streaming([body], url, stats, default_location=area_name,
+                                          encoding=encoding, selector=selector))
+    parsed = {'frame': None, 'learned': None}
+    if not streaming or (not rooms and not stats['no_results'] and drift):
+        from bs4 import BeautifulSoup
+        stats = {}
+        soup = BeautifulSoup(body, 'html.parser')
+        rooms = list(iter_rooms_from_soup(soup, url, stats, default_location=area_name, selector=selector))
+        if drift:
+            if not rooms and not stats['no_results']:
+                learned = learn_selector(soup)
+                if learned and learned != selector:
+                    rooms = list(iter_rooms_from_soup(soup, url, {}, default_location=area_name, selector=learned))
+                parsed['learned'] = learned
+            parsed['frame'] = frame_fingerprint(soup)
+        # The tree is full of parent/child cycles: break them now rather than at the next collection
+        soup.decompose()
+    parsed.update(rooms=rooms, stats=stats, parse_ns=time.perf_counter_ns() - start)
+    return parsed
+
+
+class PipelineRun:
+    """One batch of jobs going through the pipeline; more jobs can be added while iterating"""
+
+    def __init__(self, pipeline: 'PagePipeline', fetch: Callable, parse: Callable):
+        self.pipeline = pipeline
+        self.fetch = fetch
+        self.parse = parse
+        self._results: 'queue.Queue[Tuple[Any, Any, Any, Optional[BaseException]]]' = queue.Queue()
+        self._outstanding = 0
+
+    def add(self, job: Any) -> None:
+        self._outstanding += 1
+        try:
+            future = self.pipeline._fetch_pool.submit(self._fetch_stage, job)
+        except RuntimeError as e:
+            # The pipeline was closed (shutdown or reconfiguration)
+            self._results.put((job, None, None, e))
+            return
+        future.add_done_callback(
+            lambda f: f.cancelled() and self._results.put((job, None, None, CancelledError())))
+
+    def _fetch_stage(self, job: Any) -> None:
+        # Wait for room in the buffer before downloading another page
+        self.pipeline._slots.acquire()
+        try:
+            start = time.perf_counter_ns()
+            fetched = self.fetch(job)
+            fetched['fetch_ns'] = time.perf_counter_ns() - start
+        except BaseException as e:
+            self.pipeline._slots.release()
+            self._results.put((job, None, None, e))
+            return
+
+        pool = self.pipeline._parse_pool
+        if pool is None:
+            self._parse_inline(job, fetched)
+            return
+        args, kwargs = fetched['parse_args']
+        try:
+            future = pool.submit(self.parse, *args, **kwargs)
+        except BrokenProcessPool:
+            self.pipeline._replace_parse_pool(pool)
+            self._parse_inline(job, fetched)
+            return
+        except BaseException as e:
+            self._done(job, fetched, None, e)
+            return
+        future.add_done_callback(lambda f: self._parsed(job, fetched, f, pool))
+
+    def _parse_inline(self, job: Any, fetched: Any) -> None:
+        args, kwargs = fetched['parse_args']
+        try:
+            self._done(job, fetched, self.parse(*args, **kwargs), None)
+        except BaseException as e:
+            self._done(job, fetched, None, e)
+
+    def _parsed(self, job: Any, fetched: Any, future: Future, pool: ProcessPoolExecutor) -> None:
+        if future.cancelled():
+            self._done(job, fetched, None, CancelledError())
+        elif isinstance(future.exception(), BrokenProcessPool):
+            # A worker died (OOM killer, crash in a C extension): the page itself is fine
+            self.pipeline._replace_parse_pool(pool)
+            self._parse_inline(job, fetched)
+        elif future.exception() is not None:
+            self._done(job, fetched, None, future.exception())
+        else:
+            self._done(job, fetched, future.result(), None)
+
+    def _done(self, job: Any, fetched: Any, parsed: Any, error: Optional[BaseException]) -> None:
+        self.pipeline._slots.release()
+        self._results.put((job, fetched, parsed, error))
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any, Any, Optional[BaseException]]]:
+        """(job, fetched, parsed, error) as each job finishes"""
+        while self._outstanding:
+            item = self._results.get()
+            self._outstanding -= 1
+            yield item
+
+
+class PagePipeline:
+    """
+    Thread pool for downloads and process pool for parsing, joined by a
+    bounded buffer. `parse_processes=0` parses in the fetch threads instead.
+    A parse pool broken by a dying worker is replaced, and the pages it had
+    are parsed in the calling thread.
+    """
+
+    def __init__(self, fetch_workers: int = 4, parse_processes: int = 2, buffer_size: int = 4):
+        self.fetch_workers = fetch_workers
+        self.parse_processes = parse_processes
+        self.buffer_size = buffer_size
+        self._fetch_pool = ThreadPoolExecutor(fetch_workers, thread_name_prefix='fetch')
+        # Fetched pages waiting for (or in) the parse stage
+        self._slots = threading.BoundedSemaphore(buffer_size)
+        self._parse_lock = threading.Lock()
+        self._closed = False
+        self._parse_pool = self._new_parse_pool() if parse_processes else None
+
+    def _new_parse_pool(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that runs logging and delivery threads can copy held locks
+        return ProcessPoolExecutor(self.parse_processes, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker)
+
+    def _replace_parse_pool(self, broken: ProcessPoolExecutor) -> None:
+        """Start a new parse pool in place of `broken` (once, however many of its jobs failed)"""
+        with self._parse_lock:
+            if self._closed or self._parse_pool is not broken:
+                return
+            logger.warning("⚠️ A parse worker died, restarting the parse pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._parse_pool = self._new_parse_pool()
+
+    def warm_up(self) -> None:
+        """Start the parse workers now rather than on the first (time-critical) check"""
+        if self._parse_pool is not None:
+            for _ in range(self.parse_processes):
+                self._parse_pool.submit(time.sleep, 0)
+
+    def run(self, fetch: Callable[[Any], Dict[str, Any]], parse: Callable) -> PipelineRun:
+        """
+        Start a batch: `fetch(job)` runs in a thread and returns a dict with
+        'parse_args' ((args, kwargs) for `parse`, a picklable module-level
+        function). Add jobs with run.add() and iterate over run for results.
+        """
+        return PipelineRun(self, fetch, parse)
+
+    def close(self) -> None:
+        self._fetch_pool.shutdown(wait=False, cancel_futures=True)
+        with self._parse_lock:
+            self._closed = True
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(wait=False, cancel_futures=True)
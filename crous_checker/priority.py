@@ -0,0 +1,177 @@
+"""
+Priority alerts for rooms some subscribers cannot afford to hear about late
+
+`urgent_alerts` lists filters, e.g. [{"name": "Cheap studios", "chat_ids":
+["123"], "filter": {"max_rent": 350, "types": ["Studio"]}}]. Each room is
+checked against them as soon as extraction yields it, while the rest of
+the page is still being read, and a match is sent to those chats at once:
+ahead of the delivery queue and of the cycle's regular alert or digest,
+which then leaves it out for them.
+
+Urgent filters match strictly: a room whose type, rent or surface could
+not be read does not pass a clause on it (it still comes with the regular
+alert). UrgentIndex buckets the filters by room type and sorts each bucket
+by maximum rent, so a room is only compared with the filters of its type
+whose rent ceiling it is under. PriorityLane sends from its own thread on
+the bot's pooled connection, which it opens before each check (getMe) so
+an urgent alert never waits for a TLS handshake.
+"""
+
+import logging
+import queue
+import threading
+from bisect import bisect_left
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+from .channels import split_address
+from .models import Room, RoomType
+from .normalization import RoomFilter
+from .notify import format_room_message
+
+logger = logging.getLogger(__name__)
+
+NO_CEILING = float('inf')
+
+
+class UrgentAlert:
+    """A named urgent filter and the chats it alerts (empty: every recipient)"""
+
+    __slots__ = ('name', 'chat_ids', 'filter')
+
+    def __init__(self, name: str, chat_ids: Optional[List[str]], filter: RoomFilter):
+        self.name = name
+        self.chat_ids = [str(id) for id in chat_ids or []]
+        self.filter = filter
+
+    @classmethod
+    def from_config(cls, data: Dict[str, Any]) -> 'UrgentAlert':
+        """{"name": ..., "chat_ids": [...], "filter": {...}}; the filter must not be empty"""
+        room_filter = RoomFilter.from_config(data['filter'])
+        if room_filter is None:
+            raise ValueError("an urgent alert needs a filter")
+        return cls(str(data.get('name', 'Priority')), data.get('chat_ids'), room_filter)
+
+
+def parse_urgent_alerts(items: List[Any]) -> List[UrgentAlert]:
+    return [UrgentAlert.from_config(item) for item in items]
+
+
+class UrgentIndex:
+    """Predicate index of urgent filters: by room type, then by rent ceiling"""
+
+    def __init__(self, alerts: List[UrgentAlert]):
+        self.alerts = list(alerts)
+        # room type (None: any type) -> ([rent ceilings, ascending], [alerts])
+        self._buckets: Dict[Optional[RoomType], Tuple[List[float], List[UrgentAlert]]] = {}
+        for alert in sorted(self.alerts, key=self._ceiling):
+            for room_type in alert.filter.types or (None,):
+                ceilings, bucket = self._buckets.setdefault(room_type, ([], []))
+                ceilings.append(self._ceiling(alert))
+                bucket.append(alert)
+
+    @staticmethod
+    def _ceiling(alert: UrgentAlert) -> float:
+        return NO_CEILING if alert.filter.max_rent_cents is None else alert.filter.max_rent_cents
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def match(self, room: Room) -> List[UrgentAlert]:
+        """The urgent alerts whose filter the room passes (strictly, so the buckets always hold)"""
+        matched = []
+        for room_type in (room.type, None):
+            ceilings, bucket = self._buckets.get(room_type, ((), ()))
+            for alert in bucket[bisect_left(ceilings, room.rent_cents):]:
+                if alert.filter.matches(room, strict=True):
+                    matched.append(alert)
+        return matched
+
+
+class PriorityLane:
+    """
+    Sends urgent alerts from its own thread: Telegram chats straight through
+    `bot` (on a connection warmed before each check), other addresses
+    through `notifier`, ahead of whatever it has queued.
+    """
+
+    def __init__(self, index: UrgentIndex, notifier, bot=None,
+                 all_chat_ids: Optional[Callable[[], List[str]]] = None):
+        self.index = index
+        self.notifier = notifier
+        self.bot = bot
+        self.all_chat_ids = all_chat_ids or (lambda: getattr(notifier, 'chat_ids', None) or [])
+        self.counters = {'matched': 0, 'sent': 0, 'queued': 0, 'failed': 0}
+        self._jobs: 'queue.Queue[Optional[Tuple[str, List[str]]]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any], notifier, bot=None,
+                      all_chat_ids: Optional[Callable[[], List[str]]] = None) -> 'PriorityLane':
+        lane = cls(UrgentIndex(parse_urgent_alerts(settings['urgent_alerts'])), notifier, bot, all_chat_ids)
+        if len(lane.index):
+            logger.info("🚨 %s urgent alert filter(s)", len(lane.index))
+        return lane
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        self.index = UrgentIndex(parse_urgent_alerts(settings['urgent_alerts']))
+
+    def start(self) -> 'PriorityLane':
+        self._thread = threading.Thread(target=self._run, name='priority', daemon=True)
+        self._thread.start()
+        return self
+
+    def warm_up(self) -> None:
+        """Open (or refresh) the Telegram connection in the lane's thread, if there are urgent filters"""
+        if self.bot is not None and self._thread is not None and len(self.index):
+            self._jobs.put(None)
+
+    def recipients(self, room: Room) -> Dict[str, List[str]]:
+        """Chat ID -> names of the urgent alerts the room matches for it"""
+        chats: Dict[str, List[str]] = {}
+        for alert in self.index.match(room):
+            for chat_id in alert.chat_ids or self.all_chat_ids():
+                chats.setdefault(str(chat_id), []).append(alert.name)
+        return chats
+
+    def send(self, room: Room, chats: Dict[str, List[str]]) -> None:
+        """Queue one alert per distinct set of matching filters"""
+        self.counters['matched'] += 1
+        groups: Dict[str, List[str]] = {}
+        for chat_id, names in chats.items():
+            groups.setdefault(' / '.join(names), []).append(chat_id)
+        for label, chat_ids in groups.items():
+            message = format_room_message([room], label, urgent=True)
+            if self._thread is None:
+                self._deliver(message, chat_ids)
+            else:
+                self._jobs.put((message, chat_ids))
+
+    def _deliver(self, message: str, chat_ids: List[str]) -> None:
+        # Other channels, and chats the direct send failed for, go through the notifier's queue
+        # (retried, and kept across a restart): the regular alert leaves the room out for them
+        queued = []
+        for chat_id in chat_ids:
+            if self.bot is not None and split_address(chat_id)[0] == 'telegram' and self.bot.send_to(chat_id, message):
+                self.counters['sent'] += 1
+            else:
+                queued.append(chat_id)
+        if queued:
+            sent = self.notifier.send_message(message, chat_ids=queued)
+            self.counters['queued' if sent else 'failed'] += len(queued)
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                self.bot.warm_up()
+            elif job == ():
+                return
+            else:
+                self._deliver(*job)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Send what is queued, then stop"""
+        if self._thread is not None:
+            self._jobs.put(())
+            self._thread.join(timeout)
+            self._thread = None
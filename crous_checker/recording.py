@@ -0,0 +1,127 @@
+"""
+Recording of fetched pages for offline replay
+
+Each check cycle is appended as one JSON line to a gzip-compressed file in
+the recording directory: the raw response body, the rooms extracted from it
+and the check result. Files rotate at a size cap and only the newest ones are
+kept. `python -m crous_checker replay` feeds recordings back through the
+pipeline, so a missed or duplicate alert can be reproduced after the page is
+gone.
+"""
+
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Optional, Dict, Any, Iterator, List, Set
+
+logger = logging.getLogger(__name__)
+
+RECORDING_PATTERN = 'cycles-*.jsonl.gz'
+
+
+class Recorder:
+    """Appends check cycles to size-capped, rotated gzip JSON-lines files"""
+
+    def __init__(self, directory: str, max_bytes: int = 20 * 1024 * 1024, max_files: int = 5):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.cycles = 0
+        self._file = None
+        self._path = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> Optional['Recorder']:
+        """A recorder if settings.record_dir is set, None otherwise"""
+        if not settings.get('record_dir'):
+            return None
+        return cls(settings['record_dir'], max_bytes=int(settings['record_max_bytes']),
+                   max_files=int(settings['record_max_files']))
+
+    def _open(self) -> None:
+        name = datetime.now().strftime('cycles-%Y%m%d-%H%M%S-%f.jsonl.gz')
+        self._path = os.path.join(self.directory, name)
+        self._file = gzip.open(self._path, 'wt', encoding='utf-8', errors='surrogateescape')
+        logger.info("📼 Recording check cycles to %s", self._path)
+        # Keep only the newest files (including the one just opened)
+        for old in sorted(glob.glob(os.path.join(self.directory, RECORDING_PATTERN)))[:-self.max_files]:
+            os.remove(old)
+
+    def record(self, url: str, body: Optional[bytes], result: Dict[str, Any],
+               status: Optional[int] = None, encoding: str = 'utf-8', streaming: bool = False) -> None:
+        """Append one cycle; body is None when the fetch itself failed"""
+        entry = {
+            'ts': datetime.now().isoformat(timespec='seconds'),
+            'url': url,
+            'status': status,
+            'encoding': encoding,
+            'streaming': streaming,
+            # surrogateescape (here and on the file) keeps undecodable bytes so the body round-trips exactly
+            'body': body.decode('utf-8', 'surrogateescape') if body is not None else None,
+            'rooms': [room.to_dict() for room in result.get('rooms', [])],
+            'result': {key: value for key, value in result.items() if key != 'rooms'},
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._open()
+                self._file.write(line)
+                # Flush each cycle so a crash loses at most the cycle in progress
+                self._file.flush()
+                self.cycles += 1
+                if os.path.getsize(self._path) >= self.max_bytes:
+                    self._close()
+            except OSError as e:
+                logger.error("Failed to record check cycle: %s", e)
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+def recording_files(path: str) -> List[str]:
+    """The recording files in a directory (oldest first), or the path itself"""
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, RECORDING_PATTERN)))
+    return [path]
+
+
+def is_recording(path: str) -> bool:
+    return os.path.isdir(path) or path.endswith('.jsonl.gz') or path.endswith('.jsonl')
+
+
+def iter_recording(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yield recorded cycles with the body as bytes. A file cut short by a crash
+    yields every complete cycle before the cut.
+    """
+    for file_path in recording_files(path):
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'rt', encoding='utf-8', errors='surrogateescape') as f:
+            try:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    entry = json.loads(line)
+                    if entry['body'] is not None:
+                        entry['body'] = entry['body'].encode('utf-8', 'surrogateescape')
+                    yield entry
+            except EOFError:
+                logger.warning("Recording %s is truncated; replayed the complete cycles", file_path)
+
+
+def recorded_fingerprints(entry: Dict[str, Any]) -> Set[int]:
+    """Fingerprints of the rooms extracted when the cycle was recorded"""
+    return {data['fingerprint'] for data in entry['rooms']}
@@ -0,0 +1,79 @@
+"""
+Scheduling of the check loop
+
+Unlike time.sleep(), the wait can be shortened or extended while it is in
+progress (after a configuration reload changes the interval), cut short to
+run a check immediately, or stopped.
+"""
+
+import threading
+import time
+
+
+class IntervalScheduler:
+    """Waits `interval_seconds` between checks, measured from the start of the last check"""
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.last_tick = None
+        # Wall-clock time of the last check, which (unlike last_tick) survives a restart
+        self.last_check = None
+        self._changed = threading.Event()
+        self._trigger = False
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    @property
+    def next_tick(self) -> float:
+        """Monotonic time of the next check"""
+        if self.last_tick is None:
+            return time.monotonic()
+        return self.last_tick + self.interval_seconds
+
+    def resume(self, last_check: float) -> None:
+        """Continue the schedule of a previous process whose last check was at `last_check` (epoch seconds)"""
+        elapsed = max(0.0, time.time() - last_check)
+        with self._lock:
+            self.last_check = last_check
+            self.last_tick = time.monotonic() - elapsed
+        self._changed.set()
+
+    def set_interval(self, interval_seconds: float) -> None:
+        """Change the interval; a wait in progress is re-timed from the last check"""
+        with self._lock:
+            self.interval_seconds = interval_seconds
+        self._changed.set()
+
+    def trigger(self) -> None:
+        """Run the next check now"""
+        with self._lock:
+            self._trigger = True
+        self._changed.set()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped = True
+        self._changed.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def wait_next(self) -> bool:
+        """Block until the next check is due; returns False once stopped"""
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return False
+                if self._trigger:
+                    self._trigger = False
+                    break
+                remaining = self.next_tick - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.clear()
+            self._changed.wait(remaining)
+
+        self.last_tick = time.monotonic()
+        self.last_check = time.time()
+        return True
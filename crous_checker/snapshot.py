@@ -0,0 +1,217 @@
+"""
+Snapshots of the checker state for instant warm restarts
+
+Render restarts the worker at least daily. The snapshot holds the sorted
+fingerprints of every notified room, the near-duplicate clusters and some
+metadata (last check time, drift state), so the first check after a restart neither
+re-announces old rooms nor waits for a full scrape to rebuild them. The fingerprint array is memory
+mapped on load and searched in place, so loading takes the same time however
+many rooms have been seen.
+
+File layout:
+
+    8s   magic  b'CRSNAP02'
+    I    metadata length (JSON, padded with spaces to a multiple of 8), little-endian
+    I    number of fingerprints, little-endian
+    I    number of cluster records, little-endian
+    I    padding
+    ...  metadata
+    Q*n  fingerprints, sorted ascending, in the byte order named in the metadata
+    ...  cluster records (CLUSTER_RECORD, little-endian), sorted by signature;
+         the type index points into the metadata's 'cluster_types'
+
+Version 1 files (no cluster section, clusters in the metadata) still load.
+
+On Windows a mapped file cannot be replaced: saving first moves the dedup
+store onto the array it writes and closes the mapping.
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Optional, Dict, Any, List, Sequence, Tuple
+
+from .dedup import SeenStore
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CRSNAP02'
+HEADER = struct.Struct('<8sIIII')
+MAGIC_V1 = b'CRSNAP01'
+HEADER_V1 = struct.Struct('<8sII')
+# signature, cluster, rent cents, type index, age (0: oldest)
+CLUSTER_RECORD = struct.Struct('<QQqII')
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is truncated or not a snapshot"""
+
+
+class Snapshot:
+    """A loaded snapshot: metadata, cluster rows and a read-only view of the fingerprint array"""
+
+    def __init__(self, path: str, metadata: Dict[str, Any], fingerprints: Sequence[int],
+                 clusters: Optional[List[list]] = None, mapped: Optional[mmap.mmap] = None):
+        self.path = path
+        self.metadata = metadata
+        self.fingerprints = fingerprints
+        # [signature, cluster, rent cents, type] rows, oldest first (ClusterIndex.restore)
+        self.clusters = clusters or []
+        self._mapped = mapped
+
+    @classmethod
+    def load(cls, path: str) -> Optional['Snapshot']:
+        """Map a snapshot file; None if there is none or it is unusable"""
+        try:
+            with open(path, 'rb') as f:
+                # The mapping stays valid after the file is closed (and after it is replaced)
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable snapshot %s: %s", path, e)
+            return None
+        try:
+            return cls._parse(path, mapped)
+        except (SnapshotError, ValueError, struct.error) as e:
+            logger.warning("Ignoring corrupt snapshot %s: %s", path, e)
+            return None
+
+    @classmethod
+    def _parse(cls, path: str, mapped: mmap.mmap) -> 'Snapshot':
+        magic = mapped[:8]
+        if magic == MAGIC:
+            _, meta_length, count, cluster_count, _ = HEADER.unpack_from(mapped, 0)
+            start = HEADER.size + meta_length
+        elif magic == MAGIC_V1:
+            _, meta_length, count = HEADER_V1.unpack_from(mapped, 0)
+            cluster_count = 0
+            start = HEADER_V1.size + meta_length
+        else:
+            raise SnapshotError("not a checker snapshot")
+        end = start + count * 8
+        if len(mapped) != end + cluster_count * CLUSTER_RECORD.size:
+            raise SnapshotError("truncated")
+        metadata = json.loads(mapped[start - meta_length:start])
+
+        if count == 0:
+            fingerprints: Sequence[int] = ()
+        elif metadata.get('byteorder', 'little') == sys.byteorder:
+            fingerprints = memoryview(mapped)[start:end].cast('Q')
+        else:
+            # Written on a machine with the other byte order: copy and swap once
+            fingerprints = array('Q', mapped[start:end])
+            fingerprints.byteswap()
+
+        if magic == MAGIC_V1:
+            clusters = metadata.pop('clusters', None) or []
+        else:
+            types = metadata.get('cluster_types', [])
+            records = sorted(CLUSTER_RECORD.iter_unpack(mapped[end:]), key=lambda record: record[4])
+            clusters = [[signature, cluster, rent_cents, types[type_index]]
+                        for signature, cluster, rent_cents, type_index, _ in records]
+        return cls(path, metadata, fingerprints, clusters, mapped)
+
+    def close(self) -> None:
+        """Unmap the file (the fingerprints can no longer be read)"""
+        if isinstance(self.fingerprints, memoryview):
+            self.fingerprints.release()
+        self.fingerprints = ()
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+
+    def restore(self, scheduler=None, drift=None, max_seen: int = 0) -> SeenStore:
+        """
+        The dedup store backed by this snapshot (copied and capped to the
+        last `max_seen` rooms if set); also restores scheduler and drift state
+        """
+        if scheduler is not None and self.metadata.get('last_check'):
+            scheduler.resume(self.metadata['last_check'])
+        if drift is not None and self.metadata.get('drift'):
+            drift.restore_state(self.metadata['drift'])
+        if max_seen:
+            # The store copied what it keeps: the mapping is no longer needed
+            store = SeenStore(base=self.fingerprints, max_size=max_seen)
+            self.close()
+            return store
+        return SeenStore(base=self.fingerprints)
+
+
+def _cluster_section(rows: List[list]) -> Tuple[bytes, List[str]]:
+    """Cluster records sorted by signature, and the type labels they index"""
+    types: Dict[str, int] = {}
+    records = sorted((signature, cluster, rent_cents, types.setdefault(type_label, len(types)), age)
+                     for age, (signature, cluster, rent_cents, type_label) in enumerate(rows))
+    return b''.join(CLUSTER_RECORD.pack(*record) for record in records), list(types)
+
+
+def save_snapshot(path: str, seen: SeenStore, scheduler=None, drift=None, clusters=None,
+                  mapped: Optional[Snapshot] = None) -> None:
+    """
+    Write the state atomically (write to a temporary file, then rename).
+    `mapped`, the loaded snapshot `seen` may be reading from, is closed first.
+    """
+    fingerprints = array('Q', seen.fingerprints())
+    if mapped is not None:
+        seen.rebase(fingerprints)
+        mapped.close()
+    cluster_records, cluster_types = _cluster_section(clusters.state() if clusters is not None else [])
+    metadata = {
+        'saved_at': time.time(),
+        'byteorder': sys.byteorder,
+        'last_check': scheduler.last_check if scheduler is not None else None,
+        'drift': drift.snapshot_state() if drift is not None else None,
+        'cluster_types': cluster_types,
+    }
+    meta = json.dumps(metadata).encode('utf-8')
+    meta += b' ' * (-len(meta) % 8)
+
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(meta), len(fingerprints), len(cluster_records) // CLUSTER_RECORD.size, 0))
+            f.write(meta)
+            fingerprints.tofile(f)
+            f.write(cluster_records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error("Could not save state snapshot %s: %s", path, e)
+        return
+    logger.debug("Saved state snapshot: %s fingerprint(s)", len(fingerprints))
+
+
+class StateSaver:
+    """Saves a snapshot when the dedup state changed, and at least every `interval_seconds`"""
+
+    def __init__(self, path: str, seen: SeenStore, scheduler=None, drift=None, interval_seconds: float = 300,
+                 clusters=None, snapshot: Optional[Snapshot] = None):
+        self.path = path
+        self.seen = seen
+        # The loaded snapshot, unmapped before the first save replaces its file
+        self.snapshot = snapshot
+        self.scheduler = scheduler
+        self.drift = drift
+        self.clusters = clusters
+        self.interval_seconds = interval_seconds
+        self._saved_version = seen.version
+        self._saved_at = time.monotonic()
+
+    def save(self) -> None:
+        save_snapshot(self.path, self.seen, self.scheduler, self.drift, self.clusters, self.snapshot)
+        self.snapshot = None
+        self._saved_version = self.seen.version
+        self._saved_at = time.monotonic()
+
+    def maybe_save(self) -> None:
+        """Save if new rooms were marked (so a restart never re-announces them) or the interval passed"""
+        if (self.seen.version != self._saved_version
+                or time.monotonic() - self._saved_at >= self.interval_seconds):
+            self.save()
@@ -0,0 +1,492 @@
+"""
+Room sources: the CROUS website scraper and the random simulation
+"""
+
+import logging
+import random
+import threading
+from typing import Optional, Dict, Any, List, Callable, Iterable, Iterator, Tuple
+
+import requests
+
+from . import tracing
+from .drift import DriftDetector
+from .extraction import iter_rooms_from_soup, iter_rooms_streaming
+from .fetch import ResilientFetcher, BROWSER_USER_AGENT
+from .geo import BBox, parse_regions, plan_queries, search_url
+from .models import Room, RoomType, make_fingerprint
+from .pipeline import PagePipeline, parse_page
+from .recording import Recorder, iter_recording, is_recording, recorded_fingerprints
+
+logger = logging.getLogger(__name__)
+
+# CROUS URL for Nice area with geographic bounds
+DEFAULT_CROUS_URL = "https://trouverunlogement.lescrous.fr/tools/41/search?bounds=7.1819535_43.7607635_7.323912_43.6454189"
+
+
+# A search box that keeps hitting the result cap is split at most this many times
+MAX_SPLIT_DEPTH = 3
+
+
+def pipeline_options(settings: Dict[str, Any]) -> Dict[str, int]:
+    return {'fetch_workers': settings['fetch_workers'], 'parse_processes': settings['parse_processes'],
+            'buffer_size': settings['pipeline_buffer']}
+
+
+def merge_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """One result for several searches: distinct rooms, smallest search box per room"""
+    if len(results) == 1:
+        return results[0]
+    rooms: Dict[int, Room] = {}
+    query_boxes: Dict[int, BBox] = {}
+    errors = [result['error'] for result in results if 'error' in result]
+    notes = [result['note'] for result in results if result.get('note')]
+    for result in results:
+        for room in result['rooms']:
+            rooms.setdefault(room.fingerprint, room)
+        for fingerprint, box in result.get('query_boxes', {}).items():
+            if fingerprint not in query_boxes or box.area < query_boxes[fingerprint].area:
+                query_boxes[fingerprint] = box
+    if rooms:
+        merged = rooms_result(list(rooms.values()))
+        merged['query_boxes'] = query_boxes
+        if errors:
+            merged['note'] = f"{len(errors)} of {len(results)} searches failed"
+        return merged
+    if errors and len(errors) == len(results):
+        return empty_result(error=errors[0])
+    if errors or notes:
+        return empty_result(note=notes[0] if notes else f"{len(errors)} of {len(results)} searches failed")
+    return empty_result()
+
+
+def planned_queries(settings: Dict[str, Any]) -> List[BBox]:
+    """Search boxes covering the subscriber regions (none when an explicit crous_url is set)"""
+    if settings['crous_url'] or not settings['regions']:
+        return []
+    return plan_queries(parse_regions(settings['regions']), max_span=float(settings['max_query_span_degrees']))
+
+
+def empty_result(**extra: Any) -> Dict[str, Any]:
+    result = {'available': False, 'rooms': [], 'total_count': 0}
+    result.update(extra)
+    return result
+
+
+def rooms_result(rooms: List[Room]) -> Dict[str, Any]:
+    return {'available': True, 'rooms': rooms, 'total_count': len(rooms)}
+
+
+class CrousSource:
+    """Scrapes the CROUS search page for available rooms"""
+
+    def __init__(self, fetcher: ResilientFetcher, url: Optional[str] = None,
+                 retry_budget: float = 60.0, streaming: bool = False,
+                 drift: Optional[DriftDetector] = None, area_name: str = 'Rennes',
+                 recorder: Optional[Recorder] = None, queries: Optional[List[BBox]] = None,
+                 result_cap: int = 0, pipeline_options: Optional[Dict[str, int]] = None):
+        self.fetcher = fetcher
+        # The page being checked; set per search when there is a query plan
+        self.url = url or DEFAULT_CROUS_URL
+        # Search boxes planned from the subscriber regions (replace `url` when set)
+        self.queries = list(queries or [])
+        # A search returning this many rooms is assumed truncated and split
+        self.result_cap = result_cap
+        # Fetch threads and parse processes for the planned searches, started on first use
+        self.pipeline_options = pipeline_options or {}
+        self.pipeline: Optional[PagePipeline] = None
+        # Guards swapping the pipeline (on a reload) against the cycles using it
+        self._pipeline_lock = threading.Lock()
+        self._pipeline_runs = 0
+        self.retry_budget = retry_budget
+        self.streaming = streaming
+        self.drift = drift
+        self.area_name = area_name
+        self.recorder = recorder
+        # Body and status of the last response, kept only while recording
+        self._body: Optional[bytes] = None
+        self._status: Optional[int] = None
+        # Called with each room as extraction yields it (the engine's priority alerts)
+        self.on_room: Optional[Callable[[Room], None]] = None
+        # Set a realistic user agent
+        self.fetcher.session.headers.update({
+            'User-Agent': BROWSER_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'fr-FR,fr;q=0.9,en;q=0.8'
+        })
+
+    @classmethod
+    def from_settings(cls, fetcher: ResilientFetcher, settings: Dict[str, Any],
+                      drift: Optional[DriftDetector] = None,
+                      recorder: Optional[Recorder] = None) -> 'CrousSource':
+        source = cls(fetcher, url=settings['crous_url'], retry_budget=float(settings['retry_budget_seconds']),
+                     streaming=settings['streaming_parse'], drift=drift, area_name=settings['area_name'],
+                     recorder=recorder, queries=planned_queries(settings),
+                     result_cap=settings['search_result_cap'], pipeline_options=pipeline_options(settings))
+        source._log_plan(len(settings['regions']))
+        return source
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        """Apply reloaded settings to the running source"""
+        self.retry_budget = float(settings['retry_budget_seconds'])
+        self.streaming = settings['streaming_parse']
+        self.area_name = settings['area_name']
+        self.result_cap = settings['search_result_cap']
+        if settings.get('crous_url'):
+            self.url = settings['crous_url']
+        if pipeline_options(settings) != self.pipeline_options:
+            # The next search starts a new pipeline; a search running now finishes on the old one
+            with self._pipeline_lock:
+                self.pipeline_options = pipeline_options(settings)
+                old, self.pipeline = self.pipeline, None
+                if old is not None and not self._pipeline_runs:
+                    old.close()
+        queries = planned_queries(settings)
+        if queries != self.queries:
+            self.queries = queries
+            self._log_plan(len(settings['regions']))
+
+    def _log_plan(self, region_count: int) -> None:
+        if self.queries:
+            logger.info("🗺️ %s region(s) covered by %s search(es): %s", region_count, len(self.queries),
+                        ', '.join(box.to_bounds() for box in self.queries))
+
+    def _fetch_rooms_streaming(self, stats: Dict[str, Any]) -> List[Room]:
+        """Parse the body incrementally and stop once the results container closes"""
+        selector = self.drift.selector if self.drift else None
+        with tracing.span('http'):
+            response = self.fetcher.get(self.url, budget=self.retry_budget, stream=True)
+        self._status = getattr(response, 'status_code', None)
+        try:
+            # Inside the try: an error response is closed (and its connection released) too
+            response.raise_for_status()
+            chunks = response.iter_content(chunk_size=16384)
+            if self.recorder:
+                chunks = self._captured(chunks)
+            with tracing.span('stream'):
+                rooms = list(self._watched(iter_rooms_streaming(chunks, self.url, stats,
+                                                                default_location=self.area_name,
+                                                                selector=selector)))
+        finally:
+            response.close()
+        logger.info("Streamed %s bytes%s", stats['bytes_read'],
+                    ' (stopped after results container)' if stats['stopped_early'] else '')
+        return rooms
+
+    def _fetch_rooms_dom(self, stats: Dict[str, Any]) -> List[Room]:
+        """Download the whole page, parse it with BeautifulSoup and check it for layout drift"""
+        with tracing.span('http'):
+            response = self.fetcher.get(self.url, budget=self.retry_budget)
+            content = response.content
+        self._status = getattr(response, 'status_code', None)
+        if self.recorder:
+            self._body = content
+        response.raise_for_status()
+
+        logger.info("Response received: %s bytes", len(content))
+
+        from bs4 import BeautifulSoup
+        with tracing.span('parse'):
+            soup = BeautifulSoup(content, 'html.parser')
+        del content, response
+        rooms = self.rooms_from_soup(soup, stats)
+        # The tree is full of parent/child cycles: break them now rather than at the next collection
+        soup.decompose()
+        return rooms
+
+    def rooms_from_soup(self, soup, stats: Dict[str, Any]) -> List[Room]:
+        """Extract rooms from a parsed page, relearning the card selector if the layout drifted"""
+        selector = self.drift.selector if self.drift else None
+        with tracing.span('extract'):
+            rooms = list(self._watched(iter_rooms_from_soup(soup, self.url, stats, default_location=self.area_name,
+                                                            selector=selector)))
+
+        # Log page info for debugging
+        logger.info("Page text length: %s characters", stats['page_text_length'])
+
+        if stats['page_text_length'] < 1000:  # Very short page might indicate no results
+            logger.info("Very short page detected - might be no results for %s area", self.area_name)
+
+        if self.drift:
+            if not rooms and not stats['no_results']:
+                # Neither rooms nor "no results": try to relearn the card selector
+                learned = self.drift.relearn(soup)
+                if learned and learned != selector:
+                    rooms = list(iter_rooms_from_soup(soup, self.url, {}, default_location=self.area_name,
+                                                      selector=learned))
+                    logger.info("Learned selector %s recovered %s room(s)", learned, len(rooms))
+            with tracing.span('drift'):
+                self.drift.observe(soup, recognized=bool(rooms) or stats['no_results'])
+
+        return rooms
+
+    def _watched(self, rooms: Iterable[Room]) -> Iterator[Room]:
+        """Pass rooms through, handing each to on_room first"""
+        on_room = self.on_room
+        for room in rooms:
+            if on_room is not None:
+                on_room(room)
+            yield room
+
+    def _captured(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass chunks through, keeping a copy of what was read for the recorder"""
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            self._body = b''.join(parts)
+
+    def fetch(self) -> Dict[str, Any]:
+        """Check the website (every planned search, if any)"""
+        return merge_results(list(self.fetch_iter()))
+
+    def fetch_iter(self) -> Iterator[Dict[str, Any]]:
+        """Check the website, yielding each planned search's result as soon as it is ready"""
+        if self.queries:
+            yield from self._fetch_planned()
+        else:
+            yield self._fetch_page()
+
+    def _fetch_page(self) -> Dict[str, Any]:
+        """Check self.url, recording the response if a recorder is attached"""
+        self._body = self._status = None
+        result = self._check()
+        if self.recorder:
+            with tracing.span('record'):
+                self.recorder.record(self.url, self._body, result, status=self._status, streaming=self.streaming)
+            self._body = None
+        return result
+
+    def _pipeline(self) -> PagePipeline:
+        with self._pipeline_lock:
+            if self.pipeline is None:
+                self.pipeline = PagePipeline(**self.pipeline_options)
+            return self.pipeline
+
+    def warm_up(self) -> None:
+        """Start the fetch/parse pipeline now if there are planned searches"""
+        if self.queries:
+            self._pipeline().warm_up()
+
+    def close(self) -> None:
+        with self._pipeline_lock:
+            if self.pipeline is not None:
+                self.pipeline.close()
+                self.pipeline = None
+
+    def _download(self, job: Tuple[BBox, int]) -> Dict[str, Any]:
+        """Fetch stage (runs in a pipeline thread)"""
+        url = search_url(job[0])
+        response = self.fetcher.get(url, budget=self.retry_budget)
+        body = response.content
+        response.raise_for_status()
+        return {
+            'url': url,
+            'body': body if self.recorder else None,
+            'status': getattr(response, 'status_code', None),
+            'parse_args': ((body, url), {'area_name': self.area_name,
+                                         'selector': self.drift.selector if self.drift else None,
+                                         'streaming': self.streaming, 'drift': self.drift is not None}),
+        }
+
+    def _fetch_planned(self) -> Iterator[Dict[str, Any]]:
+        """
+        Run the planned searches through the fetch/parse pipeline and yield
+        each one's result as soon as it is parsed. A search that hits the
+        result cap is split into quadrants. Each result's 'query_boxes' maps
+        its rooms to the search box, for routing.
+        """
+        with self._pipeline_lock:
+            if self.pipeline is None:
+                self.pipeline = PagePipeline(**self.pipeline_options)
+            pipeline = self.pipeline
+            self._pipeline_runs += 1
+        try:
+            yield from self._run_planned(pipeline)
+        finally:
+            with self._pipeline_lock:
+                self._pipeline_runs -= 1
+                # Replaced by a reload while the searches ran
+                if pipeline is not self.pipeline:
+                    pipeline.close()
+
+    def _run_planned(self, pipeline: PagePipeline) -> Iterator[Dict[str, Any]]:
+        run = pipeline.run(self._download, parse_page)
+        for box in self.queries:
+            run.add((box, 0))
+        searches = failures = 0
+        for (box, depth), fetched, parsed, error in run:
+            searches += 1
+            url = search_url(box)
+            if error is not None:
+                failures += 1
+                logger.error("Error checking CROUS search %s: %s", box.to_bounds(), error)
+                result = empty_result(error=str(error))
+                if self.recorder:
+                    self.recorder.record(url, None, result, streaming=self.streaming)
+                yield result
+                continue
+
+            tracing.add('fetch_page', fetched['fetch_ns'])
+            tracing.add('parse_page', parsed['parse_ns'])
+            rooms, stats = parsed['rooms'], parsed['stats']
+            if self.drift:
+                self.drift.adopt_selector(parsed['learned'])
+                if parsed['frame'] is not None:
+                    self.drift.observe_frame(parsed['frame'], recognized=bool(rooms) or stats['no_results'])
+
+            if rooms:
+                result = rooms_result(rooms)
+                result['query_boxes'] = {room.fingerprint: box for room in rooms}
+            elif stats['no_results']:
+                result = empty_result()
+            else:
+                result = empty_result(note='Website structure may have changed')
+            if self.recorder:
+                self.recorder.record(url, fetched['body'], result, status=fetched['status'],
+                                     streaming=self.streaming)
+
+            if self.result_cap and len(rooms) >= self.result_cap and depth < MAX_SPLIT_DEPTH:
+                logger.info("Search %s hit the result cap (%s), splitting it", box.to_bounds(), self.result_cap)
+                for quadrant in box.quadrants():
+                    run.add((quadrant, depth + 1))
+            logger.info("Search %s: %s room(s) (fetch %.0f ms, parse %.0f ms)", box.to_bounds(), len(rooms),
+                        fetched['fetch_ns'] / 1e6, parsed['parse_ns'] / 1e6)
+            yield result
+        logger.info("Ran %s search(es), %s failed", searches, failures)
+
+    def _check(self) -> Dict[str, Any]:
+        """
+        Real CROUS website scraping
+        Scrapes https://trouverunlogement.lescrous.fr/tools/41/search
+        """
+        try:
+            logger.info("Checking CROUS %s website...", self.area_name)
+            stats = {}
+
+            if self.streaming:
+                rooms = self._fetch_rooms_streaming(stats)
+                if not rooms and not stats['no_results'] and self.drift:
+                    # Unrecognized page: the drift detector needs the full DOM
+                    logger.info("Streamed page not recognized, re-fetching full page for layout check")
+                    stats = {}
+                    rooms = self._fetch_rooms_dom(stats)
+            else:
+                rooms = self._fetch_rooms_dom(stats)
+
+            if rooms:
+                logger.info("Successfully found %s rooms on CROUS website", len(rooms))
+                return rooms_result(rooms)
+            elif stats['no_results']:
+                logger.info("CROUS website explicitly shows no results")
+                return empty_result()
+            else:
+                logger.warning("Could not find room listings or no results message")
+                return empty_result(note='Website structure may have changed')
+
+        except requests.exceptions.RequestException as e:
+            logger.error("Error checking CROUS website: %s", e)
+            return empty_result(error=str(e))
+        except Exception as e:
+            logger.error("Unexpected error parsing CROUS website: %s", e)
+            return empty_result(error=str(e))
+
+
+class SimulatedSource:
+    """Random availability, for trying the bot without hitting the CROUS website"""
+
+    def __init__(self, probability: float = 0.3, rng: Optional[random.Random] = None):
+        self.probability = probability
+        self.rng = rng or random.Random()
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        pass
+
+    def fetch(self) -> Dict[str, Any]:
+        """Simulate a check (30% chance of finding 1-5 rooms)"""
+        if self.rng.random() >= self.probability:
+            return empty_result()
+
+        rooms = []
+        for _ in range(self.rng.randint(1, 5)):
+            room_id = f"ROOM_{self.rng.randint(1000, 9999)}"
+            rooms.append(Room(
+                id=room_id,
+                type=self.rng.choice([RoomType.STUDIO, RoomType.T1, RoomType.T2, RoomType.CHAMBRE]),
+                location=self.rng.choice(['Paris 13e', 'Paris 5e', 'Créteil', 'Antony']),
+                rent_cents=self.rng.randint(300, 600) * 100,
+                available_date='2025-09-15',
+                url='',
+                fingerprint=make_fingerprint(room_id),
+                area_m2=float(self.rng.randint(9, 40))
+            ))
+        return rooms_result(rooms)
+
+
+class ReplaySource:
+    """
+    Serves saved pages one per check, for replaying offline: plain HTML files
+    (one cycle each) and recordings (every recorded cycle, in order)
+    """
+
+    def __init__(self, paths: List[str], url: str = DEFAULT_CROUS_URL, area_name: str = 'Rennes',
+                 streaming: bool = False):
+        self.paths = list(paths)
+        self.url = url
+        self.area_name = area_name
+        self.streaming = streaming
+        self.stats = {'cycles': 0, 'bytes': 0, 'rooms': 0, 'failed_fetches': 0, 'mismatches': 0}
+        self._cycles = self._iter_cycles()
+        self._next = next(self._cycles, None)
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        self.area_name = settings['area_name']
+
+    def _iter_cycles(self) -> Iterator[Dict[str, Any]]:
+        for path in self.paths:
+            if is_recording(path):
+                yield from iter_recording(path)
+            else:
+                with open(path, 'rb') as f:
+                    yield {'ts': path, 'url': self.url, 'body': f.read(), 'rooms': None, 'result': {}}
+
+    def exhausted(self) -> bool:
+        return self._next is None
+
+    def fetch(self) -> Dict[str, Any]:
+        """Extract rooms from the next saved page"""
+        entry = self._next
+        if entry is None:
+            return empty_result(note='Replay finished')
+        self._next = next(self._cycles, None)
+        self.stats['cycles'] += 1
+
+        body = entry['body']
+        if body is None:
+            # The recorded fetch failed: replay the failure
+            self.stats['failed_fetches'] += 1
+            return empty_result(**entry['result'])
+        self.stats['bytes'] += len(body)
+
+        stats = {}
+        url = entry['url'] or self.url
+        if self.streaming:
+            with tracing.span('stream'):
+                rooms = list(iter_rooms_streaming([body], url, stats, default_location=self.area_name))
+        else:
+            from bs4 import BeautifulSoup
+            with tracing.span('parse'):
+                soup = BeautifulSoup(body, 'html.parser')
+            with tracing.span('extract'):
+                rooms = list(iter_rooms_from_soup(soup, url, stats, default_location=self.area_name))
+            soup.decompose()
+        self.stats['rooms'] += len(rooms)
+
+        if entry['rooms'] is not None and recorded_fingerprints(entry) != {room.fingerprint for room in rooms}:
+            self.stats['mismatches'] += 1
+            logger.warning("Cycle %s: %s room(s) recorded, %s extracted on replay",
+                           entry['ts'], len(entry['rooms']), len(rooms))
+        logger.info("Replayed cycle %s: %s room(s)", entry['ts'], len(rooms))
+        return rooms_result(rooms) if rooms else empty_result()
@@ -0,0 +1,85 @@
+"""
+Fast cold start helpers for the checker
+
+Render restarts the worker daily and the free tier wakes it up from sleep, so
+the first check should not pay for importing and initialising the parser.
+Preloader imports the heavy parsing modules in a background thread while the
+main thread loads configuration, then warms them with a tiny sample page.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from typing import Optional
+
+# Reference point for time-to-first-check (as close to process start as the import allows)
+PROCESS_START = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_MODULES = ('bs4', 'lxml.etree', 'soupsieve', 'crous_checker.extraction')
+
+SAMPLE_PAGE = (
+    b'<html><body><div class="results"><div class="logement-card">'
+    b'<h3>R\xc3\xa9sidence Exemple</h3><p>Studio 18 m\xc2\xb2</p><p>350 \xe2\x82\xac</p>'
+    b'</div></div></body></html>'
+)
+
+
+def elapsed_ms() -> float:
+    """Milliseconds since the process started importing the checker"""
+    return (time.perf_counter() - PROCESS_START) * 1000
+
+
+def warm_up(selector: Optional[str] = None) -> None:
+    """Run the parsers and extraction patterns once so their lazy setup happens now"""
+    from bs4 import BeautifulSoup
+    from lxml import etree
+    from .extraction import find_room_elements, parse_room_text, soup_card
+
+    soup = BeautifulSoup(SAMPLE_PAGE, 'html.parser')
+    for elem in find_room_elements(soup, selector):
+        text, _, key = soup_card(elem)
+        parse_room_text(text, '', key=key)
+
+    parser = etree.HTMLPullParser(events=('end',), encoding='utf-8')
+    parser.feed(SAMPLE_PAGE)
+    list(parser.read_events())
+    parser.close()
+
+
+class Preloader:
+    """Imports and warms the heavy modules in a background thread"""
+
+    def __init__(self, modules=PRELOAD_MODULES):
+        self.modules = modules
+        self.duration_ms: Optional[float] = None
+        self.error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name='preloader', daemon=True)
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        try:
+            for name in self.modules:
+                importlib.import_module(name)
+            warm_up()
+        except Exception as e:
+            self.error = e
+        self.duration_ms = (time.perf_counter() - start) * 1000
+
+    def start(self) -> 'Preloader':
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: float = 10.0) -> bool:
+        """Block until preloading is done; returns False on timeout"""
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Preloading still running after %ss, continuing anyway", timeout)
+            return False
+        if self.error:
+            logger.warning("Preloading failed, modules will load on first use: %s", self.error)
+        else:
+            logger.info("Parser preloaded and warmed in %.0f ms", self.duration_ms)
+        return self.error is None
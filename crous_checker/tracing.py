@@ -0,0 +1,204 @@
+"""
+Per-stage timing of check cycles, and a sampling profiler
+
+Each check_and_notify call is one cycle; code on the way wraps its stages in
+`span('fetch')`, `span('parse')` and so on, and hot loops add their time to a
+per-cycle total with `add('regex', ns)`. The last N cycle traces are kept in a
+ring buffer that can be dumped to the log (SIGUSR1) or served as JSON. Outside
+a cycle, and with tracing disabled, spans only check for a current trace.
+
+StackSampler backs the `profile` command: it samples the main thread's stack
+and writes folded stacks ("a;b;c 12" lines) that flamegraph.pl, speedscope
+or inferno render directly.
+"""
+
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterator
+
+logger = logging.getLogger(__name__)
+
+
+class CycleTrace:
+    """Stage timings of one check cycle"""
+
+    __slots__ = ('started_at', 'start_ns', 'total_ns', 'spans', 'totals', '_depth')
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.total_ns = 0
+        # (name, depth, offset from cycle start, duration), in start order
+        self.spans: List[tuple] = []
+        # Accumulated stages: name -> [total ns, count]
+        self.totals: Dict[str, List[int]] = {}
+        self._depth = 0
+
+    def stages(self) -> Dict[str, float]:
+        """Milliseconds per stage name (spans and accumulated stages)"""
+        result: Dict[str, float] = {}
+        for name, _, _, duration in self.spans:
+            result[name] = result.get(name, 0.0) + duration / 1e6
+        for name, (total, _) in self.totals.items():
+            result[name] = result.get(name, 0.0) + total / 1e6
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'started_at': self.started_at,
+            'total_ms': round(self.total_ns / 1e6, 3),
+            'spans': [{'name': name, 'depth': depth, 'offset_ms': round(offset / 1e6, 3),
+                       'ms': round(duration / 1e6, 3)} for name, depth, offset, duration in self.spans],
+            'totals': {name: {'ms': round(total / 1e6, 3), 'count': count}
+                       for name, (total, count) in self.totals.items()},
+        }
+
+    def summary(self) -> str:
+        """One line: total and the top-level stages"""
+        top: Dict[str, List[int]] = {}
+        for name, depth, _, duration in self.spans:
+            if depth == 0:
+                entry = top.setdefault(name, [0, 0])
+                entry[0] += duration
+                entry[1] += 1
+        parts = [f"{name} {total / 1e6:.1f}" + (f" (x{count})" if count > 1 else '')
+                 for name, (total, count) in top.items()]
+        parts += [f"{name} {total / 1e6:.1f} (x{count})" for name, (total, count) in self.totals.items()]
+        return f"{self.total_ns / 1e6:.1f} ms: " + ', '.join(parts)
+
+
+class Tracer:
+    """Ring buffer of the last `capacity` cycle traces (0 disables tracing)"""
+
+    def __init__(self, capacity: int = 50, log_cycles: bool = False):
+        self.capacity = capacity
+        self.log_cycles = log_cycles
+        self._traces = collections.deque(maxlen=max(1, capacity))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def apply_settings(self, settings: Dict[str, Any]) -> None:
+        self.log_cycles = settings['trace_log']
+        if settings['trace_cycles'] != self.capacity:
+            self.capacity = settings['trace_cycles']
+            with self._lock:
+                self._traces = collections.deque(self._traces, maxlen=max(1, self.capacity))
+
+    @property
+    def current(self) -> Optional[CycleTrace]:
+        return getattr(self._local, 'trace', None)
+
+    @contextmanager
+    def cycle(self) -> Iterator[Optional[CycleTrace]]:
+        """Trace one check cycle on this thread"""
+        if not self.capacity or self.current is not None:
+            yield None
+            return
+        trace = self._local.trace = CycleTrace()
+        try:
+            yield trace
+        finally:
+            trace.total_ns = time.perf_counter_ns() - trace.start_ns
+            self._local.trace = None
+            with self._lock:
+                self._traces.append(trace)
+            if self.log_cycles:
+                logger.info("⏱️ Cycle %s", trace.summary())
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a stage of the current cycle (nested spans are indented in dumps)"""
+        trace = self.current
+        if trace is None:
+            yield
+            return
+        start = time.perf_counter_ns()
+        index = len(trace.spans)
+        trace.spans.append(None)
+        trace._depth += 1
+        try:
+            yield
+        finally:
+            trace._depth -= 1
+            end = time.perf_counter_ns()
+            trace.spans[index] = (name, trace._depth, start - trace.start_ns, end - start)
+
+    def add(self, name: str, duration_ns: int) -> None:
+        """Add time to an accumulated stage of the current cycle (for per-item work)"""
+        trace = self.current
+        if trace is not None:
+            entry = trace.totals.setdefault(name, [0, 0])
+            entry[0] += duration_ns
+            entry[1] += 1
+
+    def traces(self) -> List[CycleTrace]:
+        with self._lock:
+            return list(self._traces)
+
+    def dump(self) -> List[Dict[str, Any]]:
+        """The buffered traces as JSON-ready dicts, oldest first"""
+        return [trace.to_dict() for trace in self.traces()]
+
+    def log_dump(self) -> None:
+        traces = self.traces()
+        logger.info("⏱️ Last %s cycle trace(s):", len(traces))
+        for trace in traces:
+            logger.info("  %s %s", time.strftime('%H:%M:%S', time.localtime(trace.started_at)), trace.summary())
+            for name, depth, offset, duration in trace.spans:
+                logger.info("    %s%-10s +%8.1f ms %8.1f ms", '  ' * depth, name, offset / 1e6, duration / 1e6)
+
+
+# Process-wide tracer used by the engine and the sources
+TRACER = Tracer()
+span = TRACER.span
+add = TRACER.add
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval and counts folded stacks"""
+
+    def __init__(self, interval: float = 0.001, thread_id: Optional[int] = None):
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.samples: collections.Counter = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+        self._switch_interval = sys.getswitchinterval()
+
+    def start(self) -> 'StackSampler':
+        # The sampler needs the GIL to take a sample: let it in as often as it wants to sample
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        sys.setswitchinterval(self._switch_interval)
+
+    @staticmethod
+    def _fold(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.samples[self._fold(frame)] += 1
+
+    def write_folded(self, path: str) -> int:
+        """Write 'frame;frame;frame count' lines; returns the number of samples"""
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return sum(self.samples.values())
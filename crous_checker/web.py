@@ -0,0 +1,298 @@
+"""
+Small HTTP service for health checks, status and manual triggers
+
+Render runs the Procfile's `web:` process as a web service: it must bind
+$PORT or it is restarted, and on the free tier it is spun down after 15
+minutes without inbound requests. StatusServer binds the port with an
+asyncio server on its own thread (idle, it only waits in select(), so the
+check loop keeps the CPU) and serves:
+
+    GET  /healthz   200 while checks run on schedule, 503 when they are late
+    GET  /status    JSON: last check, rooms tracked, next check, deliveries
+    POST /trigger   run a check now
+    GET  /traces    recent per-stage cycle timings
+
+KeepAlive requests /healthz through the public URL every few minutes so the
+free tier never sees the service as idle.
+
+    curl localhost:8080/status
+    curl -X POST localhost:8080/trigger
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import threading
+import time
+from typing import Optional, Dict, Any, Callable, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+from . import tracing
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+
+REASONS = {200: 'OK', 202: 'Accepted', 400: 'Bad Request', 401: 'Unauthorized', 403: 'Forbidden',
+           404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large', 429: 'Too Many Requests',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class Request:
+    """A parsed HTTP request"""
+
+    __slots__ = ('method', 'path', 'query', 'headers', 'body')
+
+    def __init__(self, method: str, target: str, headers: Dict[str, str], body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body or b'null')
+
+
+# A handler returns (status, body); dict and list bodies are sent as JSON
+Handler = Callable[[Request], Tuple[int, Any]]
+
+
+class StatusServer:
+    """Minimal asyncio HTTP/1.1 server (one request per connection) on a background thread"""
+
+    def __init__(self, port: int, host: str = '0.0.0.0'):
+        self.host = host
+        self.port = port
+        self._routes: Dict[str, Dict[str, Handler]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='http', daemon=True)
+
+    def route(self, method: str, path: str, handler: Handler) -> None:
+        self._routes.setdefault(path, {})[method] = handler
+
+    def start(self) -> 'StatusServer':
+        """Bind and serve; raises OSError if the port cannot be bound"""
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        logger.info("🌐 HTTP service listening on http://%s:%s", self.host, self.port)
+        return self
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port, limit=MAX_HEADER_BYTES))
+            # Port 0 picks a free port (tests)
+            self.port = self._server.sockets[0].getsockname()[1]
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            self._loop.close()
+            return
+        self._ready.set()
+        try:
+            self._loop.run_until_complete(self._server.serve_forever())
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._loop.close()
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._server.close)
+            self._thread.join(timeout=2)
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[Optional[Request], int]:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+        except asyncio.LimitOverrunError:
+            return None, 413
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None, 0
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            return None, 400
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            return None, 400
+        if length > MAX_BODY_BYTES:
+            return None, 413
+        body = await asyncio.wait_for(reader.readexactly(length), timeout=10) if length else b''
+        return Request(method.upper(), target, headers, body), 200
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request, status = await self._read_request(reader)
+            if request is None:
+                if status:
+                    await self._respond(writer, status, {'error': REASONS[status]})
+                return
+            methods = self._routes.get(request.path)
+            if methods is None:
+                status, body = 404, {'error': 'Not Found'}
+            elif request.method not in methods and not (request.method == 'HEAD' and 'GET' in methods):
+                status, body = 405, {'error': 'Method Not Allowed', 'allowed': sorted(methods)}
+            else:
+                handler = methods.get(request.method) or methods['GET']
+                try:
+                    # Handlers may take locks or do I/O: keep them off the event loop
+                    status, body = await asyncio.get_running_loop().run_in_executor(None, handler, request)
+                except Exception as e:
+                    logger.error("HTTP handler for %s %s failed: %s", request.method, request.path, e)
+                    status, body = 500, {'error': 'Internal Server Error'}
+            await self._respond(writer, status, body, head_only=request.method == 'HEAD')
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, body: Any, head_only: bool = False) -> None:
+        if isinstance(body, (dict, list)):
+            payload = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            payload = str(body).encode('utf-8')
+            content_type = 'text/plain; charset=utf-8'
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Cache-Control: no-store\r\n"
+                f"Connection: close\r\n\r\n").encode('latin-1')
+        writer.write(head if head_only else head + payload)
+        await writer.drain()
+
+
+# /trigger is public on Render: at most one manual check per this many seconds
+TRIGGER_MIN_SECONDS = 30
+
+
+class ManualTrigger:
+    """Runs a check now on request, at most once per `min_seconds` (shared by /trigger and /check)"""
+
+    def __init__(self, scheduler, min_seconds: float = TRIGGER_MIN_SECONDS):
+        self.scheduler = scheduler
+        self.min_seconds = min_seconds
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, origin: str) -> bool:
+        """Trigger a check; False if one was triggered less than min_seconds ago"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last < self.min_seconds:
+                return False
+            self._last = now
+        logger.info("🔔 Check triggered %s", origin)
+        self.scheduler.trigger()
+        return True
+
+
+def checker_status(checker, scheduler, deliveries=None, started_at: Optional[float] = None) -> Dict[str, Any]:
+    """Last check, rooms tracked, next check and counters of a running checker"""
+    stats = checker.stats
+    next_in = max(0.0, scheduler.next_tick - time.monotonic()) if not scheduler.stopped else None
+    status = {
+        'started_at': started_at,
+        'uptime_seconds': round(time.time() - started_at) if started_at else None,
+        'cycles': stats['cycles'],
+        'last_check_at': scheduler.last_check,
+        'last_cycle_ms': stats['last_duration_ms'],
+        'last_rooms': stats['last_rooms'],
+        'last_error': stats['last_error'],
+        'notified_rooms': stats['notified_rooms'],
+        'urgent_rooms': stats['urgent_rooms'],
+        'rooms_tracked': len(checker.seen),
+        'next_check_in_seconds': round(next_in, 1) if next_in is not None else None,
+        'interval_seconds': scheduler.interval_seconds,
+        'searches': len(getattr(checker.source, 'queries', ())) or 1,
+    }
+    if deliveries is not None:
+        status['deliveries'] = dict(deliveries.counters, pending=deliveries.pending())
+        if hasattr(deliveries, 'channel_stats'):
+            status['deliveries']['channels'] = deliveries.channel_stats()
+    fetcher = getattr(checker.source, 'fetcher', None)
+    if fetcher is not None:
+        status['fetch'] = fetcher.stats()
+    return status
+
+
+def add_checker_routes(server: StatusServer, checker, scheduler, deliveries=None, lifecycle=None,
+                       settings: Callable[[], Dict[str, Any]] = dict,
+                       trigger: Optional[ManualTrigger] = None) -> None:
+    """Serve /healthz, /status, /trigger and /traces for a running checker"""
+    started_at = time.time()
+    trigger_check = trigger or ManualTrigger(scheduler)
+
+    def late_after() -> float:
+        # A check is overdue after three intervals (and never sooner than 15 minutes)
+        return max(3 * scheduler.interval_seconds, 15 * 60)
+
+    def healthz(request: Request) -> Tuple[int, Any]:
+        if lifecycle is not None and lifecycle.stop_requested.is_set():
+            return 503, {'status': 'stopping'}
+        last = scheduler.last_check
+        if last is not None and time.time() - last > late_after():
+            return 503, {'status': 'late', 'last_check_at': last}
+        return 200, {'status': 'ok'}
+
+    def status(request: Request) -> Tuple[int, Any]:
+        return 200, checker_status(checker, scheduler, deliveries, started_at)
+
+    def trigger(request: Request) -> Tuple[int, Any]:
+        token = settings().get('trigger_token')
+        if token:
+            given = request.headers.get('authorization', '').removeprefix('Bearer ').strip() \
+                or request.query.get('token', '')
+            if not hmac.compare_digest(given.encode(), token.encode()):
+                return 401, {'error': 'Unauthorized'}
+        if not trigger_check('over HTTP'):
+            return 429, {'error': f"At most one manual check per {trigger_check.min_seconds:g} s"}
+        return 202, {'status': 'triggered'}
+
+    server.route('GET', '/healthz', healthz)
+    server.route('GET', '/status', status)
+    server.route('POST', '/trigger', trigger)
+    server.route('GET', '/traces', lambda request: (200, tracing.TRACER.dump()))
+
+
+class KeepAlive:
+    """Requests `url` every `interval_seconds` so a free-tier web service is never idle"""
+
+    def __init__(self, fetcher, url: str, interval_seconds: float = 600):
+        self.fetcher = fetcher
+        self.url = url
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='keepalive', daemon=True)
+
+    def start(self) -> 'KeepAlive':
+        self._thread.start()
+        logger.info("💓 Keep-alive: %s every %.0f minutes", self.url, self.interval_seconds / 60)
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.fetcher.get(self.url, budget=30).close()
+            except Exception as e:
+                logger.warning("Keep-alive request to %s failed: %s", self.url, e)
+
+    def stop(self) -> None:
+        self._stop.set()
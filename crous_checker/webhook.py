@@ -0,0 +1,173 @@
+"""
+Telegram bot commands over a webhook
+
+Polling getUpdates keeps a long-poll connection open around the clock for
+a handful of commands a day. In webhook mode Telegram POSTs each update to
+the worker's own HTTP service (web.StatusServer) instead, so between
+updates nothing runs and nothing is connected:
+
+    /start, /id   reply with the sender's chat ID (to add to chat_ids)
+    /status       last check, rooms tracked, next check (recipients only)
+    /check        run a check now (recipients only)
+
+setWebhook registers a secret that Telegram sends back in the
+X-Telegram-Bot-Api-Secret-Token header of every update; requests without
+it are refused. FakeTelegram posts updates the same way, for trying the
+commands against a local checker:
+
+    python -m crous_checker fake-update /status --chat-id 123 --port 8080
+"""
+
+import collections
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+from typing import Optional, Dict, Any, Callable, Tuple
+
+from .web import Request, StatusServer, ManualTrigger, checker_status
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = '/telegram/webhook'
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+# Telegram re-sends an update until it gets a 2xx: remember this many to answer each once
+SEEN_UPDATES = 256
+
+
+def webhook_secret(settings: Dict[str, Any], bot_token: str) -> str:
+    """The configured secret, or one derived from the bot token (stable across restarts)"""
+    if settings.get('webhook_secret'):
+        return settings['webhook_secret']
+    return hmac.new(bot_token.encode(), b'crous-checker-webhook', hashlib.sha256).hexdigest()
+
+
+class BotCommands:
+    """Answers commands sent to the bot; replies go through the delivery queue"""
+
+    def __init__(self, checker, scheduler, deliveries, recipients: Callable[[], list],
+                 trigger: Optional[ManualTrigger] = None):
+        self.checker = checker
+        self.scheduler = scheduler
+        self.deliveries = deliveries
+        self.recipients = recipients
+        self.trigger = trigger or ManualTrigger(scheduler)
+        self._seen = collections.deque(maxlen=SEEN_UPDATES)
+        self._lock = threading.Lock()
+
+    def handle(self, update: Dict[str, Any]) -> Optional[str]:
+        """Handle one update; returns the command it carried, if any"""
+        with self._lock:
+            if update.get('update_id') in self._seen:
+                return None
+            self._seen.append(update.get('update_id'))
+
+        message = update.get('message') or {}
+        text = (message.get('text') or '').strip()
+        chat_id = str((message.get('chat') or {}).get('id', ''))
+        if not chat_id or not text.startswith('/'):
+            return None
+        # "/status@SomeBot args" -> "status"
+        command = text.split()[0][1:].split('@')[0].lower()
+
+        if command in ('start', 'id'):
+            reply = f"🆔 Your chat ID: <code>{chat_id}</code>"
+        elif chat_id not in self.recipients():
+            logger.info("Ignoring /%s from unknown chat %s", command, chat_id)
+            return command
+        elif command == 'status':
+            reply = self._status()
+        elif command == 'check':
+            reply = "🔍 Checking now..." if self.trigger(f"by chat {chat_id}") else \
+                f"⏳ A check was just triggered, try again in {self.trigger.min_seconds:g} s"
+        else:
+            reply = "Commands: /status, /check, /id"
+        self.deliveries.submit(reply, chat_ids=[chat_id])
+        return command
+
+    def _status(self) -> str:
+        status = checker_status(self.checker, self.scheduler)
+        lines = ["📊 <b>CROUS Checker Status</b>", ""]
+        lines.append(f"🔄 Checks: {status['cycles']}")
+        if status['last_cycle_ms'] is not None:
+            lines.append(f"⏱️ Last check: {status['last_rooms']} room(s) in {status['last_cycle_ms']:.0f} ms")
+        if status['last_error']:
+            lines.append(f"⚠️ Last error: {status['last_error']}")
+        lines.append(f"🏠 Rooms tracked: {status['rooms_tracked']}")
+        if status['next_check_in_seconds'] is not None:
+            lines.append(f"⏰ Next check in {status['next_check_in_seconds'] / 60:.1f} minutes")
+        return '\n'.join(lines)
+
+
+class TelegramWebhook:
+    """Receives Telegram updates on a StatusServer route and hands them to a BotCommands"""
+
+    def __init__(self, server: StatusServer, commands: BotCommands, secret: Callable[[], str],
+                 path: str = WEBHOOK_PATH):
+        self.commands = commands
+        # A callable, so a hot-reloaded bot token or secret applies to the next update
+        self.secret = secret
+        self.path = path
+        self.counters = {'received': 0, 'refused': 0}
+        server.route('POST', path, self._receive)
+
+    def _receive(self, request: Request) -> Tuple[int, Any]:
+        given = request.headers.get(SECRET_HEADER.lower(), '')
+        if not hmac.compare_digest(given.encode(), self.secret().encode()):
+            self.counters['refused'] += 1
+            logger.warning("Refused a webhook request without the Telegram secret")
+            return 403, {'error': 'Forbidden'}
+        try:
+            update = request.json()
+        except ValueError:
+            return 400, {'error': 'Bad Request'}
+        if not isinstance(update, dict):
+            return 400, {'error': 'Bad Request'}
+        self.counters['received'] += 1
+        try:
+            self.commands.handle(update)
+        except Exception as e:
+            # Answer 200 anyway: a non-2xx makes Telegram re-send the same update
+            logger.error("Error handling Telegram update %s: %s", update.get('update_id'), e)
+        return 200, {'ok': True}
+
+    def register(self, bot, public_url: str) -> bool:
+        """setWebhook to <public_url><path>; the registration outlives this process"""
+        return bot.set_webhook(public_url.rstrip('/') + self.path, self.secret())
+
+
+class FakeTelegram:
+    """Posts Telegram-shaped updates to a local webhook, as Telegram would"""
+
+    def __init__(self, url: str, secret: str):
+        self.url = url
+        self.secret = secret
+        self.update_id = 0
+
+    def message(self, text: str, chat_id: str = '123456789', first_name: str = 'Test') -> Dict[str, Any]:
+        self.update_id += 1
+        chat = {'id': int(chat_id) if chat_id.lstrip('-').isdigit() else chat_id,
+                'type': 'private', 'first_name': first_name}
+        return {'update_id': self.update_id,
+                'message': {'message_id': self.update_id, 'date': 0, 'chat': chat,
+                            'from': {'id': chat['id'], 'is_bot': False, 'first_name': first_name},
+                            'text': text}}
+
+    def post(self, update: Dict[str, Any], secret: Optional[str] = None) -> int:
+        """POST an update; returns the HTTP status"""
+        request = urllib.request.Request(
+            self.url, data=json.dumps(update).encode('utf-8'), method='POST',
+            headers={'Content-Type': 'application/json',
+                     SECRET_HEADER: self.secret if secret is None else secret})
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def send(self, text: str, chat_id: str = '123456789') -> int:
+        return self.post(self.message(text, chat_id))
@@ -2,68 +2,102 @@
 """
 Quick script to get your Telegram Chat ID
 Run this script and then send a message to your bot to get your chat ID
+
+(With the checker's Telegram webhook enabled, send /id to the bot instead:
+Telegram does not serve getUpdates while a webhook is set.)
 """
 
+import os
 import requests
 import json
 import time
 
-# Your bot token
-BOT_TOKEN = "8465766993:AAGpWR_LPuCFtEq3RdmvO733x3O7bOAwg2A"
+# Long polling: Telegram holds the request open until a message arrives (or this many seconds pass)
+POLL_SECONDS = 30
+
+
+def load_bot_token():
+    """Bot token from TELEGRAM_BOT_TOKEN or config.json"""
+    if os.getenv('TELEGRAM_BOT_TOKEN'):
+        return os.getenv('TELEGRAM_BOT_TOKEN')
+    try:
+        with open('config.json', 'r') as f:
+            return json.load(f)['telegram']['bot_token']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_chat_id(chat_id):
+    """Add the chat ID to config.json's chat_ids"""
+    with open('config.json', 'r') as f:
+        config = json.load(f)
 
-def get_chat_id():
+    telegram = config.setdefault('telegram', {})
+    chat_ids = telegram.get('chat_ids') or ([telegram['chat_id']] if telegram.get('chat_id') else [])
+    chat_ids = [str(id) for id in chat_ids if id not in ('YOUR_CHAT_ID_HERE', '')]
+    if str(chat_id) not in chat_ids:
+        chat_ids.append(str(chat_id))
+    telegram.pop('chat_id', None)
+    telegram['chat_ids'] = chat_ids
+
+    with open('config.json', 'w') as f:
+        json.dump(config, f, indent=4)
+
+
+def get_chat_id(bot_token):
     """Get chat ID from recent messages to your bot"""
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getUpdates"
-    
+    url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
+
     print("🤖 Getting your Chat ID...")
-    print(f"📱 Go to your bot: https://t.me/KatibCrousBot")
     print("📝 Send any message to your bot (like 'hello')")
     print("⏳ Waiting for your message...")
     print()
-    
-    # Wait for a message
+
+    # Updates up to offset - 1 are confirmed: Telegram does not send them again
+    offset = None
     while True:
         try:
-            response = requests.get(url)
+            params = {'timeout': POLL_SECONDS, 'allowed_updates': '["message"]'}
+            if offset is not None:
+                params['offset'] = offset
+            response = requests.get(url, params=params, timeout=POLL_SECONDS + 10)
+            if response.status_code == 409:
+                print("❌ This bot has a webhook set, so Telegram does not answer getUpdates")
+                print("💡 Send /id to the bot while the checker runs, or delete the webhook:")
+                print("   https://api.telegram.org/bot<token>/deleteWebhook")
+                return None
             response.raise_for_status()
             data = response.json()
-            
-            if data.get('ok') and data.get('result'):
-                for update in data['result']:
-                    if 'message' in update:
-                        chat_id = update['message']['chat']['id']
-                        username = update['message']['chat'].get('username', 'N/A')
-                        first_name = update['message']['chat'].get('first_name', 'N/A')
-                        
-                        print("✅ Found your message!")
-                        print(f"🆔 Your Chat ID: {chat_id}")
-                        print(f"👤 Name: {first_name}")
-                        print(f"📛 Username: @{username}" if username != 'N/A' else "📛 Username: Not set")
-                        print()
-                        print("🔧 Updating your config.json file...")
-                        
-                        # Update config.json
-                        try:
-                            with open('config.json', 'r') as f:
-                                config = json.load(f)
-                            
-                            config['telegram']['chat_id'] = str(chat_id)
-                            
-                            with open('config.json', 'w') as f:
-                                json.dump(config, f, indent=4)
-                            
-                            print("✅ Config updated successfully!")
-                            print("🚀 You can now run: python crous-checker.py")
-                            return chat_id
-                            
-                        except Exception as e:
-                            print(f"❌ Error updating config: {e}")
-                            print(f"💡 Manually add this Chat ID to config.json: {chat_id}")
-                            return chat_id
-            
-            print("⏳ Still waiting for your message... (send any message to your bot)")
-            time.sleep(2)
-            
+
+            for update in data.get('result', []):
+                offset = update['update_id'] + 1
+                if 'message' in update:
+                    chat_id = update['message']['chat']['id']
+                    username = update['message']['chat'].get('username', 'N/A')
+                    first_name = update['message']['chat'].get('first_name', 'N/A')
+
+                    print("✅ Found your message!")
+                    print(f"🆔 Your Chat ID: {chat_id}")
+                    print(f"👤 Name: {first_name}")
+                    print(f"📛 Username: @{username}" if username != 'N/A' else "📛 Username: Not set")
+                    print()
+                    print("🔧 Updating your config.json file...")
+
+                    # Confirm the update so the next run does not see it again
+                    requests.get(url, params={'offset': offset, 'timeout': 0}, timeout=10)
+
+                    try:
+                        save_chat_id(chat_id)
+                        print("✅ Config updated successfully!")
+                        print("🚀 You can now run: python crous-checker.py")
+                    except Exception as e:
+                        print(f"❌ Error updating config: {e}")
+                        print(f"💡 Manually add this Chat ID to config.json: {chat_id}")
+                    return chat_id
+
+            if not data.get('result'):
+                print("⏳ Still waiting for your message... (send any message to your bot)")
+
         except requests.exceptions.RequestException as e:
             print(f"❌ Error: {e}")
             time.sleep(5)
@@ -71,13 +105,19 @@ def get_chat_id():
             print("\n⚠️ Cancelled by user")
             return None
 
+
 if __name__ == "__main__":
     print("=" * 60)
     print("🆔 Telegram Chat ID Finder")
     print("=" * 60)
-    
-    chat_id = get_chat_id()
-    
+
+    bot_token = load_bot_token()
+    chat_id = None
+    if not bot_token or bot_token == 'YOUR_BOT_TOKEN_HERE':
+        print("❌ No bot token: set TELEGRAM_BOT_TOKEN or telegram.bot_token in config.json")
+    else:
+        chat_id = get_chat_id(bot_token)
+
     if chat_id:
         print()
         print("=" * 60)
@@ -86,5 +126,5 @@ if __name__ == "__main__":
         print("Next steps:")
         print("1. Run the test: python test_setup.py")
         print("2. Start the checker: python crous-checker.py")
-    
+
     input("\nPress Enter to exit...")
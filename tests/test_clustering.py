@@ -0,0 +1,94 @@
+"""SimHash near-duplicate clustering thresholds"""
+
+import pytest
+
+from crous_checker.clustering import ClusterIndex
+from crous_checker.engine import CrousChecker
+from crous_checker.extraction import parse_room_text
+from crous_checker.loadtest import synthetic_card, synthetic_page
+from crous_checker.models import Room, RoomType
+from crous_checker.notify import ConsoleNotifier
+from crous_checker.priority import PriorityLane
+from crous_checker.sources import ReplaySource
+
+CARD = "Résidence Les Lilas - Studio 18 m² - 350,00 € - Disponible le 15/09/2025 - Rennes Beaulieu, proche métro"
+
+
+def _room(text):
+    return parse_room_text(text, 'https://example.org/')
+
+
+def _signed(fingerprint, signature, rent_cents=35000, room_type=RoomType.STUDIO):
+    return Room(id=str(fingerprint), type=room_type, location='X', rent_cents=rent_cents, available_date='',
+                url='', fingerprint=fingerprint, simhash=signature)
+
+
+def test_date_only_variant_joins_the_cluster():
+    index = ClusterIndex()
+    first, later = _room(CARD), _room(CARD.replace('15/09', '16/09'))
+    assert first.fingerprint != later.fingerprint
+    assert index.cluster_of(first) == first.fingerprint
+    assert index.cluster_of(later) == first.fingerprint
+    assert index.merged == 1
+
+
+@pytest.mark.parametrize('variant', [
+    CARD.replace('350,00', '420,00'),
+    CARD.replace('Studio', 'T2'),
+    CARD.replace('Les Lilas', 'Patton').replace('Beaulieu', 'Villejean'),
+])
+def test_other_rent_type_or_residence_starts_a_cluster(variant):
+    index = ClusterIndex()
+    index.cluster_of(_room(CARD))
+    other = _room(variant)
+    assert index.cluster_of(other) == other.fingerprint
+    assert index.merged == 0
+
+
+@pytest.mark.parametrize('max_distance', [0, 3, 6])
+def test_signatures_merge_up_to_max_distance_bits(max_distance):
+    base = 0x5A5A5A5A5A5A5A5A
+    # Flip bits spread over the bands, so no band alone decides
+    flips = [i * 9 for i in range(max_distance + 1)]
+    for distance, cluster in ((max_distance, 1), (max_distance + 1, 2)):
+        index = ClusterIndex(max_distance=max_distance)
+        index.cluster_of(_signed(1, base))
+        assert index.cluster_of(_signed(2, base ^ sum(1 << bit for bit in flips[:distance]))) == cluster
+
+
+def test_same_signature_at_another_rent_is_another_room():
+    index = ClusterIndex()
+    index.cluster_of(_signed(1, 0x1234))
+    assert index.cluster_of(_signed(2, 0x1234, rent_cents=36000)) == 2
+    # ... with a cluster of its own
+    assert index.cluster_of(_signed(3, 0x1234, rent_cents=36000)) == 2
+    assert len(index) == 2
+
+
+def test_collapse_reuses_clusters_found_this_cycle():
+    index = ClusterIndex()
+    rooms = [_room(CARD), _room(CARD.replace('15/09', '16/09'))]
+    assert [index.cluster_of(room) for room in rooms] == [rooms[0].fingerprint] * 2
+    known = {room.fingerprint: rooms[0].fingerprint for room in rooms}
+    collapsed = index.collapse(rooms, known)
+    assert [room.fingerprint for room in collapsed] == [rooms[0].fingerprint]
+    assert index.merged == 1
+
+
+def test_urgent_check_and_collapse_index_each_room_once(tmp_path):
+    # Each listing twice, with availability dates a day apart
+    cards = ''.join(synthetic_card(i).replace('</h3>', f'</h3><p>Disponible le {day}/09</p>')
+                    for i in range(100) for day in (15, 16))
+    page = tmp_path / 'page.html'
+    page.write_bytes(synthetic_page(0).replace(b'</div><footer>', cards.encode('utf-8') + b'</div><footer>'))
+    reference = ClusterIndex()
+    reference.collapse(ReplaySource([str(page)]).fetch()['rooms'])
+    assert reference.merged == 100
+
+    notifier = ConsoleNotifier(quiet=True)
+    lane = PriorityLane.from_settings({'urgent_alerts': [{'filter': {'max_rent': 10000}}]}, notifier,
+                                      all_chat_ids=lambda: ['1'])
+    clusters = ClusterIndex()
+    CrousChecker(ReplaySource([str(page)]), notifier, priority=lane, clusters=clusters).check_and_notify()
+    assert lane.counters['matched']
+    assert clusters.merged == reference.merged
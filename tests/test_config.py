@@ -0,0 +1,59 @@
+"""Configuration profiles and hot reload"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from crous_checker.config import ConfigWatcher, load_config
+
+CREDENTIALS = {'telegram': {'bot_token': '123:abc', 'chat_ids': ['1']}}
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    for name in ('TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_IDS', 'TELEGRAM_CHAT_ID'):
+        monkeypatch.delenv(name, raising=False)
+    path = tmp_path / 'config.json'
+
+    def write(settings, mtime):
+        path.write_text(json.dumps({**CREDENTIALS, 'settings': settings}))
+        os.utime(path, ns=(mtime, mtime))
+        return str(path)
+    return write
+
+
+def test_cloud_profile_checks_the_real_site_by_default(config_file):
+    path = config_file({}, 1)
+    assert load_config(path)['settings']['use_simulation'] is True
+    assert load_config(path, profile='cloud')['settings']['use_simulation'] is False
+    path = config_file({'use_simulation': True}, 2)
+    assert load_config(path, profile='cloud')['settings']['use_simulation'] is True
+
+
+def test_reloads_wait_for_apply_pending(config_file):
+    path = config_file({'check_interval_minutes': 5}, 1)
+    watcher = ConfigWatcher(load_config(path), path=path)
+    applied = []
+    watcher.subscribe(lambda new, old: applied.append((old['settings']['check_interval_minutes'],
+                                                      new['settings']['check_interval_minutes'])))
+    config_file({'check_interval_minutes': 7}, 2)
+    assert watcher.poll()
+    config_file({'check_interval_minutes': 9}, 3)
+    assert watcher.poll()
+    assert applied == [] and watcher.current['settings']['check_interval_minutes'] == 5
+
+    assert watcher.apply_pending()
+    assert applied == [(5, 9)] and watcher.current['settings']['check_interval_minutes'] == 9
+    assert not watcher.apply_pending()
+
+
+def test_cli_and_config_import_without_requests():
+    # The run command starts the preloader first: nothing heavy may load before it
+    code = ("import sys, crous_checker.cli; "
+            "print(sorted(name for name in ('requests', 'bs4', 'crous_checker.channels') if name in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == '[]'
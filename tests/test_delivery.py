@@ -0,0 +1,96 @@
+"""Delivery queue retries"""
+
+import json
+import time
+
+from crous_checker.config import normalize
+from crous_checker.delivery import ChannelDeliveries, DeliveryQueue
+
+
+class FlakyBot:
+    """Fails the first `failures` sends"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.chat_ids = ['1', '2']
+        self.sent = []
+
+    def send_to(self, chat_id, message):
+        if self.failures:
+            self.failures -= 1
+            return False
+        self.sent.append((chat_id, message))
+        return True
+
+
+def _queue(bot, **kwargs):
+    return DeliveryQueue(bot, rate_per_second=1000, per_chat_interval=0, retry_base=0.01, **kwargs)
+
+
+def test_failed_sends_are_retried_until_delivered():
+    bot = FlakyBot(failures=3)
+    queue = _queue(bot).start()
+    queue.submit('room')
+    assert queue.drain(5)
+    queue.close(0)
+    assert sorted(bot.sent) == [('1', 'room'), ('2', 'room')]
+    assert queue.counters == {'queued': 2, 'sent': 2, 'retried': 3, 'failed': 0}
+
+
+def test_messages_are_given_up_after_max_attempts():
+    bot = FlakyBot(failures=10)
+    queue = _queue(bot, max_attempts=3).start()
+    queue.submit('room', chat_ids=['1'])
+    assert queue.drain(5)
+    queue.close(0)
+    assert bot.sent == []
+    assert (queue.counters['retried'], queue.counters['failed']) == (2, 1)
+
+
+def test_retries_pending_at_shutdown_are_saved(tmp_path):
+    pending = tmp_path / 'pending.json'
+    bot = FlakyBot(failures=1)
+    queue = DeliveryQueue(bot, rate_per_second=1000, per_chat_interval=0, retry_base=60,
+                          pending_file=str(pending)).start()
+    queue.submit('room', chat_ids=['1'])
+    deadline = time.monotonic() + 5
+    while not queue.counters['retried'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert queue.close(0) == 1
+    assert json.loads(pending.read_text()) == [{'chat_id': '1', 'message': 'room'}]
+
+
+class FlakyChannel(FlakyBot):
+    """A batching channel (email) that fails its first batch"""
+
+    max_batch = 5
+
+    def __init__(self):
+        super().__init__(failures=1)
+        self.batches = []
+
+    def send_batch(self, address, messages):
+        if self.failures:
+            self.failures -= 1
+            return False
+        self.batches.append((address, list(messages)))
+        return True
+
+
+def test_a_failed_batch_is_queued_again_as_a_batch():
+    channel = FlakyChannel()
+    queue = DeliveryQueue(channel, rate_per_second=1000, per_chat_interval=0.05, retry_base=0.01)
+    for message in ('a', 'b', 'c'):
+        queue.submit(message, chat_ids=['mailto:me@example.org'])
+    queue.start()
+    assert queue.drain(5)
+    queue.close(0)
+    assert channel.batches == [('mailto:me@example.org', ['a', 'b', 'c'])]
+    assert queue.counters['retried'] == 3
+
+
+def test_every_channel_queue_retries():
+    settings = normalize({})['settings']
+    settings.update(channels={'ntfy': {'recipients': ['crous']}}, delivery_max_attempts=3)
+    deliveries = ChannelDeliveries.from_settings(FlakyBot(0), settings, fetcher=None)
+    assert {name: queue.max_attempts for name, queue in deliveries.queues.items()} == {'telegram': 3, 'ntfy': 3}
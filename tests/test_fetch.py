@@ -0,0 +1,107 @@
+"""Retries and circuit breakers of the fetch layer"""
+
+import threading
+
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NameResolutionError, NewConnectionError, ProtocolError
+
+from crous_checker.fetch import CircuitBreaker, ResilientFetcher
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """Answers each request with the next outcome: a status code or an exception to raise"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.responses = []
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        self.responses.append(FakeResponse(outcome))
+        return self.responses[-1]
+
+
+def _fetcher(session):
+    return ResilientFetcher(session, max_retries=3, backoff_base=0.0)
+
+
+def test_post_is_not_sent_again_after_a_read_timeout():
+    session = FakeSession(requests.exceptions.ReadTimeout('read'), 200)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        _fetcher(session).post('https://api.example.org/sendMessage')
+    assert session.calls == 1
+
+
+def test_post_is_retried_when_the_connection_never_opened():
+    session = FakeSession(requests.exceptions.ConnectTimeout('connect'), 200)
+    assert _fetcher(session).post('https://api.example.org/sendMessage').status_code == 200
+    assert session.calls == 2
+
+
+def test_get_is_retried_after_a_read_timeout():
+    session = FakeSession(requests.exceptions.ReadTimeout('read'), 200)
+    assert _fetcher(session).get('https://example.org/').status_code == 200
+    assert session.calls == 2
+
+
+def test_responses_are_closed_before_a_retry():
+    session = FakeSession(503, 503, 200)
+    response = _fetcher(session).get('https://example.org/', stream=True)
+    assert response.status_code == 200 and not response.closed
+    assert [r.closed for r in session.responses[:2]] == [True, True]
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker('example.org', failure_threshold=1, reset_timeout=60.0)
+    breaker.record_failure()
+    breaker.opened_at -= 60.0
+    allowed = []
+    threads = [threading.Thread(target=lambda: allowed.append(breaker.allow())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(allowed) == [False] * 7 + [True]
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def _wrapped(cause):
+    """A ConnectionError the way requests raises it: MaxRetryError(reason=cause)"""
+    return requests.exceptions.ConnectionError(MaxRetryError(None, 'https://api.example.org/', cause))
+
+
+def test_post_is_retried_after_a_dns_failure():
+    session = FakeSession(_wrapped(NameResolutionError('api.example.org', None, 'Name or service not known')), 200)
+    assert _fetcher(session).post('https://api.example.org/sendMessage').status_code == 200
+    assert session.calls == 2
+
+
+def test_post_is_retried_when_the_connection_is_refused():
+    session = FakeSession(_wrapped(NewConnectionError(None, 'Connection refused')), 200)
+    assert _fetcher(session).post('https://api.example.org/sendMessage').status_code == 200
+    assert session.calls == 2
+
+
+def test_post_is_not_sent_again_after_a_dropped_connection():
+    session = FakeSession(requests.exceptions.ConnectionError(ProtocolError('Connection aborted.')), 200)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        _fetcher(session).post('https://api.example.org/sendMessage')
+    assert session.calls == 1
@@ -0,0 +1,68 @@
+"""Routing rooms to regions"""
+
+import threading
+
+from crous_checker.geo import Geocoder, RegionRouter, parse_regions
+from crous_checker.models import Room, RoomType
+
+REGIONS = [{'name': 'Beaulieu', 'bbox': [-1.65, 48.11, -1.62, 48.13], 'chat_ids': ['10']},
+           {'name': 'Villejean', 'bbox': [-1.71, 48.11, -1.68, 48.13], 'chat_ids': ['20']}]
+
+
+class GeocoderResponse:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'features': [{'properties': {'score': 0.9}, 'geometry': {'coordinates': [-1.64, 48.12]}}]}
+
+
+class SlowFetcher:
+    """Answers geocoding requests once released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        self.release.wait(5)
+        return GeocoderResponse()
+
+
+def _room():
+    return Room(id='1', type=RoomType.STUDIO, location='Résidence Les Lilas', rent_cents=35000,
+                available_date='', url='', fingerprint=1)
+
+
+def test_routing_does_not_wait_for_the_geocoder():
+    fetcher = SlowFetcher()
+    router = RegionRouter(parse_regions(REGIONS), Geocoder(fetcher, cache_file=None), lambda: ['10', '20'])
+
+    # Not geocoded yet: every recipient, without waiting
+    [(_, rooms, chat_ids)] = router.route([_room()], 'Rennes')
+    assert sorted(chat_ids) == ['10', '20'] and rooms == [_room()]
+    router.route([_room()], 'Rennes')
+
+    fetcher.release.set()
+    router.geocoder._jobs.join()
+    assert fetcher.calls == 1
+    [(label, _, chat_ids)] = router.route([_room()], 'Rennes')
+    assert (label, chat_ids) == ('Beaulieu', ['10'])
+
+
+def test_unplaced_rooms_still_pass_the_region_filters():
+    regions = parse_regions([dict(REGIONS[0], filter={'max_rent': 300}), REGIONS[1],
+                             {'name': 'Everywhere', 'bbox': [-2, 47, -1, 49], 'filter': {'types': ['T2']}}])
+    router = RegionRouter(regions, Geocoder(None, cache_file=None), lambda: ['10', '20', '30'])
+    # 10 only wants rooms under 300 €, 30 (shared region only) T2s, 20 has an unfiltered region
+    [(_, rooms, chat_ids)] = router.route([_room()], 'Rennes')
+    assert chat_ids == ['20'] and rooms == [_room()]
+
+
+def test_routing_leaves_saving_the_geocode_cache_to_the_geocoder_thread(tmp_path):
+    cache = tmp_path / 'geocode.json'
+    router = RegionRouter(parse_regions(REGIONS), Geocoder(None, cache_file=str(cache)), lambda: ['10'])
+    router.geocoder._dirty = True
+    router.route([_room()], 'Rennes')
+    assert not cache.exists()
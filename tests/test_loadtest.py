@@ -0,0 +1,29 @@
+"""Synthetic load-test inputs"""
+
+import random
+
+from bs4 import BeautifulSoup
+
+from crous_checker.config import normalize
+from crous_checker.extraction import iter_rooms_from_soup
+from crous_checker.loadtest import run_point, synthetic_areas, synthetic_page, synthetic_regions
+from crous_checker.normalization import RoomFilter
+
+
+def test_synthetic_filters_reject_part_of_the_cards():
+    # Rents cycle through 300-549 €, past the highest random max_rent
+    rooms = list(iter_rooms_from_soup(BeautifulSoup(synthetic_page(250), 'html.parser'), 'https://example.org/'))
+    regions = synthetic_regions(synthetic_areas(4), 200, random.Random(1), filtered=1.0)
+    filters = {tuple(sorted(region['filter'])): region['filter'] for region in regions}
+    assert set(filters) == {('max_rent',), ('types',), ('max_rent', 'min_area')}
+    for config in filters.values():
+        room_filter = RoomFilter.from_config(config)
+        passed = sum(1 for room in rooms if room_filter.matches(room))
+        assert 0 < passed < len(rooms), config
+
+
+def test_a_point_drives_the_whole_pipeline_against_the_stubs():
+    point = run_point(normalize({})['settings'], regions=2, subscribers=5, cycles=3, cards=20, drain_timeout=10)
+    assert point['searches'] >= 1 and point['rooms_per_cycle'] > 0
+    assert point['drained'] and point['messages'] > 0
+    assert {'fetch', 'route', 'notify'} <= set(point['stages_ms'])
@@ -0,0 +1,93 @@
+"""Rent, surface and type parsing of extracted room cards"""
+
+import dataclasses
+import json
+
+import pytest
+from bs4 import BeautifulSoup
+
+from crous_checker.extraction import iter_rooms_from_soup, iter_rooms_streaming, find_room_elements, soup_card
+from crous_checker.loadtest import synthetic_page
+from crous_checker.models import Room, RoomType, make_fingerprint
+from crous_checker.normalization import normalize_card
+
+URL = 'https://trouverunlogement.lescrous.fr/'
+
+
+def _dom_rooms(body):
+    return list(iter_rooms_from_soup(BeautifulSoup(body, 'html.parser'), URL))
+
+
+def _streamed_rooms(body):
+    return list(iter_rooms_streaming([body[i:i + 512] for i in range(0, len(body), 512)], URL))
+
+
+@pytest.mark.parametrize('extract', [_dom_rooms, _streamed_rooms])
+def test_synthetic_cards_are_normalized(extract):
+    rooms = extract(synthetic_page(20))
+    assert len(rooms) == 20
+    for number, room in enumerate(rooms):
+        assert room.type == (RoomType.STUDIO if number % 2 else RoomType.T1)
+        assert room.type_confidence == 1.0
+        assert room.area_m2 == 15 + number % 10
+        assert room.rent_cents == (300 + number) * 100
+
+
+def test_card_nodes_are_kept_apart_for_parsing():
+    soup = BeautifulSoup('<div class="logement"><h3>Résidence Test 1</h3><p>Studio 16 m²</p><p>301 €</p></div>',
+                         'html.parser')
+    text, _, key = soup_card(soup.div)
+    assert text == 'Résidence Test 1 Studio 16 m² 301 €'
+    assert key == 'Résidence Test 1Studio 16 m²301 €'
+    fields = normalize_card(text)
+    assert (fields.type, fields.area_m2, fields.rent_min_cents) == (RoomType.STUDIO, 16.0, 30100)
+
+
+def test_fingerprints_still_use_the_joined_text():
+    body = synthetic_page(3)
+    soup = BeautifulSoup(body, 'html.parser')
+    expected = [make_fingerprint(elem.get_text(strip=True)[:100]) for elem in find_room_elements(soup)]
+    assert [room.fingerprint for room in _dom_rooms(body)] == expected
+    assert [room.fingerprint for room in _streamed_rooms(body)] == expected
+
+
+@pytest.mark.parametrize('text, rent_min, rent_max', [
+    ('Studio 1 200 €', 120000, 120000),
+    ('Loyer 1 050 € CC', 105000, 105000),
+    ('T2 350 €', 35000, 35000),
+    ('Type 1 350 €', 35000, 35000),
+    ('T2 a 350 €', 35000, 35000),
+    ('de 320 € à 345 € charges comprises', 32000, 34500),
+    ('Studio 300 - 345 €', 30000, 34500),
+    ('Loyer : 345,50 €', 34550, 34550),
+])
+def test_rents(text, rent_min, rent_max):
+    fields = normalize_card(text)
+    assert (fields.rent_min_cents, fields.rent_max_cents) == (rent_min, rent_max)
+
+
+@pytest.mark.parametrize('text, room_type, area', [
+    ('T1 bis 18,5 m² 400 €', RoomType.T1, 18.5),
+    ('Studios 12 m2 290 €', RoomType.STUDIO, 12.0),
+    ('Chambre 9 m² 250 €', RoomType.CHAMBRE, 9.0),
+    ('Appartement 2 pièces 40 m² 500 €', RoomType.T2, 40.0),
+    ('Résidence Gare 450 €', RoomType.LOGEMENT, None),
+])
+def test_types_and_areas(text, room_type, area):
+    fields = normalize_card(text)
+    assert (fields.type, fields.area_m2) == (room_type, area)
+
+
+def test_no_results_message_split_inside_a_character():
+    body = '<html><body><p>Aucun résultat pour cette recherche</p></body></html>'.encode('utf-8')
+    split = body.index('é'.encode('utf-8')) + 1
+    stats = {}
+    assert list(iter_rooms_streaming([body[:split], body[split:]], 'https://example.org/', stats)) == []
+    assert stats['no_results']
+
+
+def test_rooms_round_trip_through_their_dict():
+    room = dataclasses.replace(_dom_rooms(synthetic_page(1))[0], lon=-1.6429, lat=48.1173)
+    restored = Room.from_dict(json.loads(json.dumps(room.to_dict())), region=room.region)
+    assert restored.fingerprint != make_fingerprint(room.id)
+    assert dataclasses.asdict(restored) == dataclasses.asdict(room)
@@ -0,0 +1,53 @@
+"""Fetch/parse pipeline"""
+
+import multiprocessing
+import os
+import time
+
+from crous_checker.engine import CrousChecker
+from crous_checker.notify import ConsoleNotifier
+from crous_checker.pipeline import PagePipeline
+from crous_checker.sources import empty_result
+from crous_checker.tracing import TRACER
+
+
+def _fetch(job):
+    return {'parse_args': ((job,), {})}
+
+
+def _parse_or_die(job):
+    # A parse worker killed mid-page (out of memory, say); the page parses fine in the parent
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return {'job': job, 'pid': os.getpid()}
+
+
+def test_pages_of_a_broken_parse_pool_are_parsed_inline():
+    pipeline = PagePipeline(fetch_workers=2, parse_processes=1, buffer_size=2)
+    try:
+        broken = pipeline._parse_pool
+        run = pipeline.run(_fetch, _parse_or_die)
+        for job in range(3):
+            run.add(job)
+        results = sorted((job, parsed, error) for job, _, parsed, error in run)
+        assert [error for _, _, error in results] == [None] * 3
+        assert [parsed['job'] for _, parsed, _ in results] == [0, 1, 2]
+        assert all(parsed['pid'] == os.getpid() for _, parsed, _ in results)
+        assert pipeline._parse_pool is not broken
+    finally:
+        pipeline.close()
+
+
+class SlowSource:
+    """A single-search source (no fetch_iter) whose fetch takes 50 ms"""
+
+    def fetch(self):
+        time.sleep(0.05)
+        return empty_result()
+
+
+def test_fetch_of_a_single_search_source_is_timed_in_the_fetch_span():
+    CrousChecker(SlowSource(), ConsoleNotifier(quiet=True)).check_and_notify()
+    trace = TRACER.traces()[-1]
+    assert trace.stages()['fetch'] >= 50
+    assert trace.spans[0][0] == 'fetch'
@@ -0,0 +1,64 @@
+"""Urgent filters on extracted cards"""
+
+from bs4 import BeautifulSoup
+
+from crous_checker.engine import CrousChecker
+from crous_checker.extraction import iter_rooms_from_soup
+from crous_checker.loadtest import synthetic_page
+from crous_checker.models import Room, RoomType
+from crous_checker.notify import ConsoleNotifier
+from crous_checker.priority import PriorityLane, UrgentIndex, parse_urgent_alerts
+from crous_checker.sources import ReplaySource
+
+CHEAP_STUDIOS = {'name': 'Cheap studios', 'filter': {'max_rent': 350, 'types': ['Studio']}}
+
+
+def _rooms(cards=100):
+    return list(iter_rooms_from_soup(BeautifulSoup(synthetic_page(cards), 'html.parser'), 'https://example.org/'))
+
+
+def test_urgent_filter_rejects_other_types():
+    index = UrgentIndex(parse_urgent_alerts([CHEAP_STUDIOS]))
+    rooms = _rooms()
+    matched = [room for room in rooms if index.match(room)]
+    assert matched
+    assert all(room.type == RoomType.STUDIO and room.rent_cents <= 35000 for room in matched)
+    assert len(matched) == sum(1 for room in rooms if room.type == RoomType.STUDIO and room.rent_cents <= 35000)
+
+
+def test_index_agrees_with_a_scan():
+    alerts = parse_urgent_alerts([
+        CHEAP_STUDIOS,
+        {'name': 'T1', 'filter': {'types': ['T1'], 'min_area': 20}},
+        {'name': 'Any', 'filter': {'max_rent': 320}},
+        {'name': 'Dear', 'filter': {'min_rent': 380, 'types': ['Studio', 'T1']}},
+    ])
+    index = UrgentIndex(alerts)
+    for room in _rooms():
+        expected = {alert.name for alert in alerts if alert.filter.matches(room, strict=True)}
+        assert {alert.name for alert in index.match(room)} == expected
+
+
+def test_unknown_type_does_not_pass_an_urgent_type_filter():
+    room = Room(id='1', type=RoomType.LOGEMENT, location='X', rent_cents=30000, available_date='',
+                url='', fingerprint=1, type_confidence=0.0)
+    index = UrgentIndex(parse_urgent_alerts([CHEAP_STUDIOS]))
+    assert index.match(room) == []
+    # The regular filters still let unknown values through
+    assert index.alerts[0].filter.matches(room)
+
+
+def test_urgent_rooms_are_left_out_of_the_regular_alert(tmp_path):
+    page = tmp_path / 'page.html'
+    page.write_bytes(synthetic_page(100))
+    notifier = ConsoleNotifier(quiet=True)
+    lane = PriorityLane.from_settings({'urgent_alerts': [CHEAP_STUDIOS]}, notifier, all_chat_ids=lambda: ['1'])
+    checker = CrousChecker(ReplaySource([str(page)]), notifier, priority=lane, clusters=None)
+    checker.check_and_notify()
+
+    urgent = [message for message in notifier.sent if 'Priority Room' in message]
+    regular = [message for message in notifier.sent if 'Priority Room' not in message]
+    studios = [room for room in _rooms() if room.type == RoomType.STUDIO and room.rent_cents <= 35000]
+    assert len(urgent) == len(studios) == checker.stats['urgent_rooms']
+    assert all('Studio' in message for message in urgent)
+    assert len(regular) == 1 and f"{100 - len(studios)} Rooms Available" in regular[0]
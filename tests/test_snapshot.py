@@ -0,0 +1,59 @@
+"""State snapshots"""
+
+import json
+import struct
+import sys
+from array import array
+
+from crous_checker.clustering import ClusterIndex
+from crous_checker.dedup import SeenStore
+from crous_checker.models import Room, RoomType
+from crous_checker.snapshot import Snapshot, StateSaver, save_snapshot
+
+ROWS = [[0xFFFF000011112222, 7, 35000, 'Studio'], [0x0000FFFF33334444, 8, 42000, 'T1'],
+        [0x1234, 7, 35000, 'Studio']]
+
+
+def _room(fingerprint):
+    return Room(id=str(fingerprint), type=RoomType.STUDIO, location='X', rent_cents=35000, available_date='',
+                url='', fingerprint=fingerprint)
+
+
+def test_clusters_round_trip_oldest_first(tmp_path):
+    path = str(tmp_path / 'state.snap')
+    clusters = ClusterIndex()
+    clusters.restore(ROWS)
+    save_snapshot(path, SeenStore([3, 1, 2]), clusters=clusters)
+
+    snapshot = Snapshot.load(path)
+    assert snapshot.clusters == ROWS
+    assert 'clusters' not in snapshot.metadata
+    assert list(snapshot.fingerprints) == [1, 2, 3]
+    snapshot.close()
+
+
+def test_version_1_snapshots_still_load(tmp_path):
+    path = tmp_path / 'state.snap'
+    meta = json.dumps({'byteorder': sys.byteorder, 'clusters': ROWS}).encode('utf-8')
+    meta += b' ' * (-len(meta) % 8)
+    path.write_bytes(struct.pack('<8sII', b'CRSNAP01', len(meta), 2) + meta + array('Q', [5, 9]).tobytes())
+
+    snapshot = Snapshot.load(str(path))
+    assert snapshot.clusters == ROWS
+    assert list(snapshot.restore().fingerprints()) == [5, 9]
+
+
+def test_saving_over_the_mapped_snapshot_unmaps_it_first(tmp_path):
+    path = str(tmp_path / 'state.snap')
+    save_snapshot(path, SeenStore([1, 2, 3]))
+    snapshot = Snapshot.load(path)
+    seen = snapshot.restore()
+    seen.mark([_room(4)])
+
+    saver = StateSaver(path, seen, snapshot=snapshot)
+    saver.save()
+    assert snapshot._mapped is None
+    assert all(seen.has_fingerprint(fingerprint) for fingerprint in (1, 2, 3, 4))
+    seen.mark([_room(5)])
+    saver.save()
+    assert list(Snapshot.load(path).restore().fingerprints()) == [1, 2, 3, 4, 5]